@@ -52,10 +52,20 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     await hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS)
     await async_setup_services(hass, config_entry)
     await async_setup_endpoint_for_image_proxy(hass, config_entry.data)
+    config_entry.async_on_unload(
+        config_entry.add_update_listener(_async_options_updated)
+    )
 
     return True
 
 
+async def _async_options_updated(hass: HomeAssistant, config_entry: ConfigEntry):
+    """Apply changed refresh tiers without reloading the entry."""
+    coordinator: GrocyDataUpdateCoordinator = hass.data[DOMAIN]
+    coordinator.apply_options()
+    await coordinator.async_request_refresh()
+
+
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     await async_unload_services(hass)
@@ -4,7 +4,8 @@ from collections import OrderedDict
 
 import voluptuous as vol
 from homeassistant import config_entries
-from pygrocy2.grocy import Grocy
+from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
 from .const import (
     CONF_API_KEY,
@@ -12,9 +13,12 @@ from .const import (
     CONF_URL,
     CONF_VERIFY_SSL,
     DEFAULT_PORT,
+    DEFAULT_REFRESH_TIERS,
     DOMAIN,
     NAME,
+    REFRESH_TIERS,
 )
+from .grocy_api import GrocyApi
 from .helpers import extract_base_url_and_path
 
 _LOGGER = logging.getLogger(__name__)
@@ -30,6 +34,12 @@ class GrocyFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         """Initialize."""
         self._errors = {}
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return GrocyOptionsFlowHandler()
+
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user."""
         self._errors = {}
@@ -79,18 +89,43 @@ class GrocyFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         """Return true if credentials is valid."""
         try:
             (base_url, path) = extract_base_url_and_path(url)
-            client = Grocy(
-                base_url, api_key, port=port, path=path, verify_ssl=verify_ssl
+            client = GrocyApi(
+                async_get_clientsession(self.hass, verify_ssl=verify_ssl),
+                base_url,
+                api_key,
+                port=port,
+                path=path,
             )
 
             _LOGGER.debug("Testing credentials")
-
-            def system_info():
-                """Get system information from Grocy."""
-                return client.get_system_info()
-
-            await self.hass.async_add_executor_job(system_info)
+            await client.get_system_info()
             return True
         except Exception as error:  # pylint: disable=broad-except
             _LOGGER.error(error)
         return False
+
+
+class GrocyOptionsFlowHandler(config_entries.OptionsFlow):
+    """Options flow for the refresh tier of each Grocy entity."""
+
+    async def async_step_init(self, user_input=None):
+        """Manage the refresh tiers."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        # Only offer the entities of the Grocy features that are enabled
+        coordinator = self.hass.data.get(DOMAIN)
+        keys = [
+            key
+            for key in DEFAULT_REFRESH_TIERS
+            if coordinator is None or key in coordinator.available_entities
+        ]
+
+        data_schema = OrderedDict()
+        for key in keys:
+            tier = self.config_entry.options.get(key)
+            if tier not in REFRESH_TIERS:
+                tier = DEFAULT_REFRESH_TIERS[key]
+            data_schema[vol.Optional(key, default=tier)] = vol.In(list(REFRESH_TIERS))
+
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(data_schema))
@@ -12,6 +12,29 @@ PLATFORMS: Final = ["binary_sensor", "sensor"]
 
 SCAN_INTERVAL = timedelta(seconds=30)
 
+# Refresh tiers selectable per entity key in the options flow
+REFRESH_TIER_FAST: Final = "fast"
+REFRESH_TIER_NORMAL: Final = "normal"
+REFRESH_TIER_SLOW: Final = "slow"
+REFRESH_TIER_DAILY: Final = "daily"
+REFRESH_TIERS: Final = {
+    REFRESH_TIER_FAST: SCAN_INTERVAL,
+    REFRESH_TIER_NORMAL: timedelta(minutes=5),
+    REFRESH_TIER_SLOW: timedelta(hours=1),
+    REFRESH_TIER_DAILY: timedelta(days=1),
+}
+# Seconds a key may come due early, so it is not pushed back a whole tick by jitter
+REFRESH_TIER_SLACK: Final = 1
+
+# Endpoints fetched at the same time during a refresh
+UPDATE_PARALLELISM: Final = 4
+# Requests to Grocy in flight at the same time, detail requests included
+REQUEST_PARALLELISM: Final = 8
+# Seconds a single request to Grocy may take, service calls included
+REQUEST_TIMEOUT: Final = 15
+# Seconds an endpoint may take before its entities become unavailable
+UPDATE_TIMEOUT: Final = 20
+
 DEFAULT_PORT: Final = 9192
 CONF_URL: Final = "url"
 CONF_PORT: Final = "port"
@@ -47,3 +70,19 @@ ATTR_OVERDUE_TASKS: Final = "overdue_tasks"
 ATTR_SHOPPING_LIST: Final = "shopping_list"
 ATTR_STOCK: Final = "stock"
 ATTR_TASKS: Final = "tasks"
+
+DEFAULT_REFRESH_TIERS: Final = {
+    ATTR_SHOPPING_LIST: REFRESH_TIER_FAST,
+    ATTR_CHORES: REFRESH_TIER_FAST,
+    ATTR_OVERDUE_CHORES: REFRESH_TIER_FAST,
+    ATTR_TASKS: REFRESH_TIER_FAST,
+    ATTR_OVERDUE_TASKS: REFRESH_TIER_FAST,
+    ATTR_STOCK: REFRESH_TIER_NORMAL,
+    ATTR_EXPIRING_PRODUCTS: REFRESH_TIER_NORMAL,
+    ATTR_EXPIRED_PRODUCTS: REFRESH_TIER_NORMAL,
+    ATTR_OVERDUE_PRODUCTS: REFRESH_TIER_NORMAL,
+    ATTR_MISSING_PRODUCTS: REFRESH_TIER_NORMAL,
+    ATTR_MEAL_PLAN: REFRESH_TIER_SLOW,
+    ATTR_BATTERIES: REFRESH_TIER_SLOW,
+    ATTR_OVERDUE_BATTERIES: REFRESH_TIER_SLOW,
+}
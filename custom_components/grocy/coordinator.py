@@ -1,22 +1,31 @@
 """Data update coordinator for Grocy."""
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any, Dict, List
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Set
 
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
-from pygrocy2.grocy import Grocy
 
 from .const import (
     CONF_API_KEY,
     CONF_PORT,
     CONF_URL,
     CONF_VERIFY_SSL,
+    DEFAULT_REFRESH_TIERS,
     DOMAIN,
+    REFRESH_TIER_SLACK,
+    REFRESH_TIERS,
     SCAN_INTERVAL,
+    UPDATE_PARALLELISM,
+    UPDATE_TIMEOUT,
 )
+from .grocy_api import GrocyApi
 from .grocy_data import GrocyData
 from .helpers import extract_base_url_and_path
 
@@ -45,30 +54,111 @@ class GrocyDataUpdateCoordinator(DataUpdateCoordinator[Dict[str, Any]]):
 
         (base_url, path) = extract_base_url_and_path(url)
 
-        self.grocy_api = Grocy(
-            base_url, api_key, path=path, port=port, verify_ssl=verify_ssl
+        self.grocy_api = GrocyApi(
+            async_get_clientsession(hass, verify_ssl=verify_ssl),
+            base_url,
+            api_key,
+            path=path,
+            port=port,
         )
         self.grocy_data = GrocyData(hass, self.grocy_api)
 
         self.available_entities: List[str] = []
         self.entities: List[Entity] = []
+        # Keys whose endpoint failed in the last refresh
+        self.failed_keys: Set[str] = set()
+        self._update_semaphore = asyncio.Semaphore(UPDATE_PARALLELISM)
+        self.refresh_intervals: Dict[str, timedelta] = {}
+        # Monotonic time of the last successful fetch of each key
+        self._last_fetch: Dict[str, float] = {}
+        self.apply_options()
+
+    def apply_options(self) -> None:
+        """Read the refresh tier of each entity key from the options."""
+        options = self.config_entry.options
+        self.refresh_intervals = {
+            key: REFRESH_TIERS.get(options.get(key), REFRESH_TIERS[tier])
+            for key, tier in DEFAULT_REFRESH_TIERS.items()
+        }
+        # Tick as often as the fastest tier needs, slower keys skip ticks
+        self.update_interval = min(self.refresh_intervals.values())
+
+    def invalidate(self, *keys: str) -> None:
+        """Fetch the keys in the next refresh, whatever their tier."""
+        for key in keys:
+            self._last_fetch.pop(key, None)
+
+    def _is_due(self, key: str, now: float) -> bool:
+        """Return whether the tier of a key asks for a fetch."""
+        last_fetch = self._last_fetch.get(key)
+        # A key enabled again has no cached data to keep
+        if last_fetch is None or key not in (self.data or {}):
+            return True
+        interval = self.refresh_intervals.get(key, SCAN_INTERVAL).total_seconds()
+        return now - last_fetch >= interval - REFRESH_TIER_SLACK
+
+    async def _async_update_source(self, source: str, keys: List[str]) -> Any:
+        """Fetch the data of the keys of one source, bounded in parallelism and time."""
+        async with self._update_semaphore:
+            async with asyncio.timeout(UPDATE_TIMEOUT):
+                return await self.grocy_data.async_update_source(source, keys)
 
     async def _async_update_data(self) -> dict[str, Any]:
         """Fetch data."""
-        data: dict[str, Any] = {}
-
+        keys: List[str] = []
         for entity in self.entities:
             if not entity.enabled:
                 _LOGGER.debug("Entity %s is disabled.", entity.entity_id)
                 continue
+            if entity.entity_description.key not in keys:
+                keys.append(entity.entity_description.key)
+
+        # Sibling keys of one endpoint share a single request, so a due key
+        # brings its siblings along
+        now = time.monotonic()
+        plan = {
+            source: source_keys
+            for source, source_keys in self.grocy_data.plan_fetches(keys).items()
+            if any(self._is_due(key, now) for key in source_keys)
+        }
+        results = await asyncio.gather(
+            *(
+                self._async_update_source(source, source_keys)
+                for source, source_keys in plan.items()
+            ),
+            return_exceptions=True,
+        )
+
+        # Keys whose tier is not due keep their cached data and status
+        fetched_keys = {key for source_keys in plan.values() for key in source_keys}
+        data: dict[str, Any] = {
+            key: value
+            for key, value in (self.data or {}).items()
+            if key in keys and key not in fetched_keys
+        }
+        failed_keys: Set[str] = self.failed_keys.intersection(keys) - fetched_keys
+        for source_keys, result in zip(plan.values(), results):
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                failed_keys.update(source_keys)
+                if not self.failed_keys.issuperset(source_keys):
+                    _LOGGER.warning(
+                        "Update of %s failed: %s",
+                        ", ".join(source_keys),
+                        "timeout" if isinstance(result, TimeoutError) else result,
+                    )
+                continue
+            data.update(result)
+            for key in source_keys:
+                self._last_fetch[key] = now
+
+        for key in self.failed_keys - failed_keys:
+            _LOGGER.info("Update of %s succeeded again", key)
+        self.failed_keys = failed_keys
 
-            try:
-                data[
-                    entity.entity_description.key
-                ] = await self.grocy_data.async_update_data(
-                    entity.entity_description.key
-                )
-            except Exception as error:  # pylint: disable=broad-except
-                raise UpdateFailed(f"Update failed: {error}") from error
+        # Only entities of the failing endpoints become unavailable, unless all fail
+        if failed_keys and len(failed_keys) == len(keys):
+            raise UpdateFailed(f"Update failed for {', '.join(keys)}")
 
         return data
@@ -1,7 +1,6 @@
 """Entity for Grocy."""
 from __future__ import annotations
 
-import json
 from collections.abc import Mapping
 from typing import Any
 
@@ -12,7 +11,9 @@ from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN, NAME, VERSION
 from .coordinator import GrocyDataUpdateCoordinator
-from .json_encoder import CustomJSONEncoder
+from .json_encoder import to_json_compatible
+
+_UNSET = object()
 
 
 class GrocyEntity(CoordinatorEntity[GrocyDataUpdateCoordinator]):
@@ -29,6 +30,9 @@ class GrocyEntity(CoordinatorEntity[GrocyDataUpdateCoordinator]):
         self._attr_name = description.name
         self._attr_unique_id = f"{config_entry.entry_id}{description.key.lower()}"
         self.entity_description = description
+        # Attributes of the coordinator data they were computed from
+        self._attributes_data: Any = _UNSET
+        self._attributes: Mapping[str, Any] | None = None
 
     @property
     def device_info(self) -> DeviceInfo:
@@ -41,16 +45,25 @@ class GrocyEntity(CoordinatorEntity[GrocyDataUpdateCoordinator]):
             entry_type=DeviceEntryType.SERVICE,
         )
 
+    @property
+    def available(self) -> bool:
+        """Return False while the endpoint of this entity is failing."""
+        return (
+            super().available
+            and self.entity_description.key not in self.coordinator.failed_keys
+        )
+
     @property
     def extra_state_attributes(self) -> Mapping[str, Any] | None:
         """Return the extra state attributes."""
         data = self.coordinator.data.get(self.entity_description.key)
-        if data and hasattr(self.entity_description, "attributes_fn"):
-            return json.loads(
-                json.dumps(
-                    self.entity_description.attributes_fn(data),
-                    cls=CustomJSONEncoder,
+        # A refresh replaces the data object, unchanged data keeps its attributes
+        if data is not self._attributes_data:
+            self._attributes_data = data
+            self._attributes = None
+            if data and hasattr(self.entity_description, "attributes_fn"):
+                self._attributes = to_json_compatible(
+                    self.entity_description.attributes_fn(data)
                 )
-            )
 
-        return None
+        return self._attributes
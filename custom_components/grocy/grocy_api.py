@@ -0,0 +1,556 @@
+"""Async Grocy API client on the Home Assistant client session."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urljoin
+
+from aiohttp import ClientSession, ClientTimeout
+from pygrocy2.data_models.battery import Battery
+from pygrocy2.data_models.chore import Chore
+from pygrocy2.data_models.generic import EntityType
+from pygrocy2.data_models.meal_items import MealPlanItem
+from pygrocy2.data_models.product import Product, ShoppingListProduct
+from pygrocy2.data_models.system import SystemConfig, SystemInfo
+from pygrocy2.data_models.task import Task
+from pygrocy2.errors import GrocyError
+from pygrocy2.grocy_api_client import (
+    DEFAULT_PORT_NUMBER,
+    BatteryDetailsResponse,
+    ChoreDetailsResponse,
+    CurrentBatteryResponse,
+    CurrentChoreResponse,
+    CurrentStockResponse,
+    CurrentVolatilStockResponse,
+    MealPlanResponse,
+    MealPlanSectionResponse,
+    ProductDetailsResponse,
+    RecipeDetailsResponse,
+    ShoppingListItem,
+    SystemConfigDto,
+    SystemInfoDto,
+    TaskResponse,
+    TransactionType,
+)
+from pygrocy2.utils import grocy_datetime_str, localize_datetime
+
+from .const import REQUEST_PARALLELISM, REQUEST_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _ErrorResponse:
+    """The parts of a requests response GrocyError reads."""
+
+    def __init__(self, status_code: int, text: str):
+        """Initialize the error response."""
+        self.status_code = status_code
+        self.text = text
+
+    def json(self) -> Any:
+        """Return the error body, wrapping a body without an error message."""
+        try:
+            body = json.loads(self.text)
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and "error_message" in body:
+            return body
+        return {"error_message": self.text}
+
+
+class GrocyApiClient:
+    """Async counterpart of the pygrocy2 API client for the endpoints used here."""
+
+    def __init__(
+        self,
+        session: ClientSession,
+        base_url: str,
+        api_key: str,
+        port: int = DEFAULT_PORT_NUMBER,
+        path: Optional[str] = None,
+    ):
+        """Initialize the API client, the session decides about SSL verification."""
+        self._session = session
+        if path:
+            self._base_url = f"{base_url}:{port}/{path}/api/"
+        else:
+            self._base_url = f"{base_url}:{port}/api/"
+        if api_key == "demo_mode":
+            self._headers = {"accept": "application/json"}
+        else:
+            self._headers = {"accept": "application/json", "GROCY-API-KEY": api_key}
+        self._semaphore = asyncio.Semaphore(REQUEST_PARALLELISM)
+        # Refreshes are also bounded by the coordinator, service calls only by this
+        self._timeout = ClientTimeout(total=REQUEST_TIMEOUT)
+
+    async def _request(
+        self,
+        method: str,
+        end_url: str,
+        query_filters: Optional[List[str]] = None,
+        data: Any = None,
+    ) -> Any:
+        """Send a request and return the decoded JSON body, if any."""
+        params = [("query[]", query) for query in query_filters or []]
+        async with self._semaphore, self._session.request(
+            method,
+            urljoin(self._base_url, end_url),
+            headers=self._headers,
+            params=params or None,
+            json=data,
+            timeout=self._timeout,
+        ) as resp:
+            body = await resp.read()
+            _LOGGER.debug("%s /%s: %d", method, end_url, resp.status)
+
+        if resp.status >= 400:
+            raise GrocyError(_ErrorResponse(resp.status, body.decode(errors="replace")))
+        if body:
+            return json.loads(body)
+        return None
+
+    async def _get(self, end_url: str, query_filters: Optional[List[str]] = None):
+        return await self._request("GET", end_url, query_filters)
+
+    async def _post(self, end_url: str, data: Any = None):
+        return await self._request("POST", end_url, data=data)
+
+    async def get_stock(self) -> List[CurrentStockResponse]:
+        """Get the current stock."""
+        return [CurrentStockResponse(**item) for item in await self._get("stock") or []]
+
+    async def get_volatile_stock(self) -> CurrentVolatilStockResponse:
+        """Get the due, overdue, expired and missing products."""
+        return CurrentVolatilStockResponse(**await self._get("stock/volatile"))
+
+    async def get_product(self, product_id: int) -> Optional[ProductDetailsResponse]:
+        """Get the details of a product."""
+        parsed_json = await self._get(f"stock/products/{product_id}")
+        return ProductDetailsResponse(**parsed_json) if parsed_json else None
+
+    async def get_chores(
+        self, query_filters: Optional[List[str]] = None
+    ) -> List[CurrentChoreResponse]:
+        """Get the chores."""
+        parsed_json = await self._get("chores", query_filters)
+        return [CurrentChoreResponse(**chore) for chore in parsed_json or []]
+
+    async def get_chore(self, chore_id: int) -> Optional[ChoreDetailsResponse]:
+        """Get the details of a chore."""
+        parsed_json = await self._get(f"chores/{chore_id}")
+        return ChoreDetailsResponse(**parsed_json) if parsed_json else None
+
+    async def get_tasks(
+        self, query_filters: Optional[List[str]] = None
+    ) -> List[TaskResponse]:
+        """Get the tasks that are not done."""
+        parsed_json = await self._get("tasks", query_filters)
+        return [TaskResponse(**task) for task in parsed_json or []]
+
+    async def get_shopping_list(
+        self, query_filters: Optional[List[str]] = None
+    ) -> List[ShoppingListItem]:
+        """Get the shopping list items."""
+        parsed_json = await self._get("objects/shopping_list", query_filters)
+        return [ShoppingListItem(**item) for item in parsed_json or []]
+
+    async def get_meal_plan(
+        self, query_filters: Optional[List[str]] = None
+    ) -> List[MealPlanResponse]:
+        """Get the meal plan items."""
+        parsed_json = await self._get("objects/meal_plan", query_filters)
+        return [MealPlanResponse(**item) for item in parsed_json or []]
+
+    async def get_recipe(self, recipe_id: int) -> Optional[RecipeDetailsResponse]:
+        """Get a recipe."""
+        parsed_json = await self._get(f"objects/recipes/{recipe_id}")
+        return RecipeDetailsResponse(**parsed_json) if parsed_json else None
+
+    async def get_meal_plan_section(
+        self, section_id: int
+    ) -> Optional[MealPlanSectionResponse]:
+        """Get a meal plan section."""
+        parsed_json = await self._get(
+            "objects/meal_plan_sections", [f"id={section_id}"]
+        )
+        if parsed_json and len(parsed_json) == 1:
+            return MealPlanSectionResponse(**parsed_json[0])
+        return None
+
+    async def get_batteries(
+        self, query_filters: Optional[List[str]] = None
+    ) -> List[CurrentBatteryResponse]:
+        """Get the batteries."""
+        parsed_json = await self._get("batteries", query_filters)
+        return [CurrentBatteryResponse(**battery) for battery in parsed_json or []]
+
+    async def get_battery(self, battery_id: int) -> Optional[BatteryDetailsResponse]:
+        """Get the details of a battery."""
+        parsed_json = await self._get(f"batteries/{battery_id}")
+        return BatteryDetailsResponse(**parsed_json) if parsed_json else None
+
+    async def get_system_info(self) -> Optional[SystemInfoDto]:
+        """Get the Grocy version information."""
+        parsed_json = await self._get("system/info")
+        return SystemInfoDto(**parsed_json) if parsed_json else None
+
+    async def get_system_config(self) -> Optional[SystemConfigDto]:
+        """Get the Grocy configuration."""
+        parsed_json = await self._get("system/config")
+        return SystemConfigDto(**parsed_json) if parsed_json else None
+
+    async def execute_chore(
+        self,
+        chore_id: int,
+        done_by: Optional[int] = None,
+        tracked_time: Optional[datetime] = None,
+        skipped: bool = False,
+    ):
+        """Track an execution of a chore."""
+        data = {
+            "tracked_time": grocy_datetime_str(
+                localize_datetime(tracked_time or datetime.now())
+            ),
+            "skipped": skipped,
+        }
+        if done_by is not None:
+            data["done_by"] = done_by
+        return await self._post(f"chores/{chore_id}/execute", data)
+
+    async def add_product(
+        self,
+        product_id: int,
+        amount: float,
+        price: float,
+        transaction_type: TransactionType = TransactionType.PURCHASE,
+    ):
+        """Add an amount of a product to the stock."""
+        data = {
+            "amount": amount,
+            "transaction_type": transaction_type.value,
+            "price": price,
+        }
+        return await self._post(f"stock/products/{product_id}/add", data)
+
+    async def consume_product(
+        self,
+        product_id: int,
+        amount: float = 1,
+        spoiled: bool = False,
+        transaction_type: TransactionType = TransactionType.CONSUME,
+        allow_subproduct_substitution: bool = False,
+    ):
+        """Remove an amount of a product from the stock."""
+        data = {
+            "amount": amount,
+            "spoiled": spoiled,
+            "transaction_type": transaction_type.value,
+            "allow_subproduct_substitution": allow_subproduct_substitution,
+        }
+        await self._post(f"stock/products/{product_id}/consume", data)
+
+    async def open_product(
+        self,
+        product_id: int,
+        amount: float = 1,
+        allow_subproduct_substitution: bool = False,
+    ):
+        """Mark an amount of a product as opened."""
+        data = {
+            "amount": amount,
+            "allow_subproduct_substitution": allow_subproduct_substitution,
+        }
+        await self._post(f"stock/products/{product_id}/open", data)
+
+    async def consume_recipe(self, recipe_id: int):
+        """Consume the ingredients of a recipe."""
+        await self._post(f"recipes/{recipe_id}/consume")
+
+    async def add_missing_product_to_shopping_list(
+        self, shopping_list_id: Optional[int] = None
+    ):
+        """Add the products below their minimum stock amount to a shopping list."""
+        data = {"list_id": shopping_list_id} if shopping_list_id else None
+        await self._post("stock/shoppinglist/add-missing-products", data)
+
+    async def complete_task(self, task_id: int, done_time: Optional[datetime] = None):
+        """Mark a task as done."""
+        data = {
+            "done_time": grocy_datetime_str(
+                localize_datetime(done_time or datetime.now())
+            )
+        }
+        await self._post(f"tasks/{task_id}/complete", data)
+
+    async def charge_battery(
+        self, battery_id: int, tracked_time: Optional[datetime] = None
+    ):
+        """Track a charge cycle of a battery."""
+        data = {
+            "tracked_time": grocy_datetime_str(
+                localize_datetime(tracked_time or datetime.now())
+            )
+        }
+        return await self._post(f"batteries/{battery_id}/charge", data)
+
+    async def add_generic(self, entity_type: str, data: Any):
+        """Add an object."""
+        return await self._post(f"objects/{entity_type}", data)
+
+    async def update_generic(self, entity_type: str, object_id: int, data: Any):
+        """Update an object."""
+        return await self._request("PUT", f"objects/{entity_type}/{object_id}", data=data)
+
+    async def delete_generic(self, entity_type: str, object_id: int):
+        """Delete an object."""
+        return await self._request("DELETE", f"objects/{entity_type}/{object_id}")
+
+
+class _DetailResponses:
+    """Prefetched detail responses, served to the pygrocy2 data models."""
+
+    def __init__(self):
+        """Initialize the responses."""
+        self.products: Dict[int, Any] = {}
+        self.chores: Dict[int, Any] = {}
+        self.batteries: Dict[int, Any] = {}
+        self.recipes: Dict[int, Any] = {}
+        self.meal_plan_sections: Dict[int, Any] = {}
+
+    def get_product(self, product_id):
+        """Return the details of a product."""
+        return self.products.get(product_id)
+
+    def get_chore(self, chore_id):
+        """Return the details of a chore."""
+        return self.chores.get(chore_id)
+
+    def get_battery(self, battery_id):
+        """Return the details of a battery."""
+        return self.batteries.get(battery_id)
+
+    def get_recipe(self, recipe_id):
+        """Return a recipe."""
+        return self.recipes.get(recipe_id)
+
+    def get_meal_plan_section(self, section_id):
+        """Return a meal plan section."""
+        return self.meal_plan_sections.get(section_id)
+
+
+async def _async_fetch_each(
+    fetch: Callable[[int], Awaitable[Any]], object_ids: Iterable[Optional[int]]
+) -> Dict[int, Any]:
+    """Fetch the response of each distinct object id concurrently."""
+    ids = list(dict.fromkeys(object_id for object_id in object_ids if object_id))
+    responses = await asyncio.gather(*(fetch(object_id) for object_id in ids))
+    return dict(zip(ids, responses))
+
+
+class GrocyApi:
+    """Async counterpart of pygrocy2's Grocy, returning the same data models."""
+
+    def __init__(
+        self,
+        session: ClientSession,
+        base_url: str,
+        api_key: str,
+        port: int = DEFAULT_PORT_NUMBER,
+        path: Optional[str] = None,
+    ):
+        """Initialize the API."""
+        self._api_client = GrocyApiClient(session, base_url, api_key, port, path)
+
+    async def stock(self) -> List[Product]:
+        """Get the products in stock."""
+        return [Product(item) for item in await self._api_client.get_stock()]
+
+    async def volatile_stock(self) -> CurrentVolatilStockResponse:
+        """Get the due, overdue, expired and missing products in one request."""
+        return await self._api_client.get_volatile_stock()
+
+    async def products_with_details(
+        self, responses: Iterable[Any]
+    ) -> List[List[Product]]:
+        """Build products from lists of stock responses with their details.
+
+        A product in several lists has its details fetched once.
+        """
+        lists = [[Product(response) for response in items or []] for items in responses]
+        details = _DetailResponses()
+        details.products = await _async_fetch_each(
+            self._api_client.get_product,
+            (product.id for products in lists for product in products),
+        )
+        for products in lists:
+            for product in products:
+                product.get_details(details)
+        return lists
+
+    async def chores(
+        self, get_details: bool = False, query_filters: Optional[List[str]] = None
+    ) -> List[Chore]:
+        """Get the chores."""
+        chores = [
+            Chore(chore) for chore in await self._api_client.get_chores(query_filters)
+        ]
+        if get_details:
+            details = _DetailResponses()
+            details.chores = await _async_fetch_each(
+                self._api_client.get_chore, (chore.id for chore in chores)
+            )
+            for chore in chores:
+                chore.get_details(details)
+        return chores
+
+    async def tasks(self, query_filters: Optional[List[str]] = None) -> List[Task]:
+        """Get the tasks that are not done."""
+        return [Task(task) for task in await self._api_client.get_tasks(query_filters)]
+
+    async def shopping_list(
+        self, get_details: bool = False, query_filters: Optional[List[str]] = None
+    ) -> List[ShoppingListProduct]:
+        """Get the shopping list."""
+        shopping_list = [
+            ShoppingListProduct(item)
+            for item in await self._api_client.get_shopping_list(query_filters)
+        ]
+        if get_details:
+            details = _DetailResponses()
+            details.products = await _async_fetch_each(
+                self._api_client.get_product,
+                (item.product_id for item in shopping_list),
+            )
+            for item in shopping_list:
+                item.get_details(details)
+        return shopping_list
+
+    async def meal_plan(
+        self, get_details: bool = False, query_filters: Optional[List[str]] = None
+    ) -> List[MealPlanItem]:
+        """Get the meal plan."""
+        meal_plan = [
+            MealPlanItem(item)
+            for item in await self._api_client.get_meal_plan(query_filters)
+        ]
+        if get_details:
+            details = _DetailResponses()
+            details.recipes, details.meal_plan_sections = await asyncio.gather(
+                _async_fetch_each(
+                    self._api_client.get_recipe,
+                    (item.recipe_id for item in meal_plan),
+                ),
+                _async_fetch_each(
+                    self._api_client.get_meal_plan_section,
+                    (item.section_id for item in meal_plan),
+                ),
+            )
+            for item in meal_plan:
+                item.get_details(details)
+        return meal_plan
+
+    async def batteries(
+        self, query_filters: Optional[List[str]] = None, get_details: bool = False
+    ) -> List[Battery]:
+        """Get the batteries."""
+        batteries = [
+            Battery(battery)
+            for battery in await self._api_client.get_batteries(query_filters)
+        ]
+        if get_details:
+            details = _DetailResponses()
+            details.batteries = await _async_fetch_each(
+                self._api_client.get_battery, (battery.id for battery in batteries)
+            )
+            for battery in batteries:
+                battery.get_details(details)
+        return batteries
+
+    async def get_system_info(self) -> Optional[SystemInfo]:
+        """Get the Grocy version information."""
+        system_info = await self._api_client.get_system_info()
+        return SystemInfo(system_info) if system_info else None
+
+    async def get_system_config(self) -> Optional[SystemConfig]:
+        """Get the Grocy configuration."""
+        system_config = await self._api_client.get_system_config()
+        return SystemConfig(system_config) if system_config else None
+
+    async def execute_chore(
+        self,
+        chore_id: int,
+        done_by: Optional[int] = None,
+        tracked_time: Optional[datetime] = None,
+        skipped: bool = False,
+    ):
+        """Track an execution of a chore."""
+        return await self._api_client.execute_chore(
+            chore_id, done_by, tracked_time, skipped
+        )
+
+    async def add_product(self, product_id: int, amount: float, price: float):
+        """Add an amount of a product to the stock."""
+        return await self._api_client.add_product(product_id, amount, price)
+
+    async def consume_product(
+        self,
+        product_id: int,
+        amount: float = 1,
+        spoiled: bool = False,
+        transaction_type: TransactionType = TransactionType.CONSUME,
+        allow_subproduct_substitution: bool = False,
+    ):
+        """Remove an amount of a product from the stock."""
+        return await self._api_client.consume_product(
+            product_id, amount, spoiled, transaction_type, allow_subproduct_substitution
+        )
+
+    async def open_product(
+        self,
+        product_id: int,
+        amount: float = 1,
+        allow_subproduct_substitution: bool = False,
+    ):
+        """Mark an amount of a product as opened."""
+        return await self._api_client.open_product(
+            product_id, amount, allow_subproduct_substitution
+        )
+
+    async def consume_recipe(self, recipe_id: int):
+        """Consume the ingredients of a recipe."""
+        return await self._api_client.consume_recipe(recipe_id)
+
+    async def add_missing_product_to_shopping_list(self, shopping_list_id: int = 1):
+        """Add the products below their minimum stock amount to a shopping list."""
+        return await self._api_client.add_missing_product_to_shopping_list(
+            shopping_list_id
+        )
+
+    async def complete_task(self, task_id: int, done_time: Optional[datetime] = None):
+        """Mark a task as done."""
+        return await self._api_client.complete_task(task_id, done_time)
+
+    async def charge_battery(
+        self, battery_id: int, tracked_time: Optional[datetime] = None
+    ):
+        """Track a charge cycle of a battery."""
+        return await self._api_client.charge_battery(battery_id, tracked_time)
+
+    async def add_generic(self, entity_type: EntityType, data: Any):
+        """Add an object."""
+        return await self._api_client.add_generic(entity_type.value, data)
+
+    async def update_generic(
+        self, entity_type: EntityType, object_id: int, updated_data: Any
+    ):
+        """Update an object."""
+        return await self._api_client.update_generic(
+            entity_type.value, object_id, updated_data
+        )
+
+    async def delete_generic(self, entity_type: EntityType, object_id: int):
+        """Delete an object."""
+        return await self._api_client.delete_generic(entity_type.value, object_id)
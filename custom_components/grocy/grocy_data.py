@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from aiohttp import hdrs, web
 from homeassistant.components.http import HomeAssistantView
@@ -34,6 +34,42 @@ from .helpers import MealPlanItemWrapper, extract_base_url_and_path
 
 _LOGGER = logging.getLogger(__name__)
 
+SOURCE_VOLATILE_STOCK = "volatile_stock"
+SOURCE_CHORES = "chores"
+SOURCE_TASKS = "tasks"
+SOURCE_BATTERIES = "batteries"
+
+# Entity keys served by the same Grocy endpoint. The endpoint is fetched once
+# per refresh and the entity data is derived from it locally.
+SHARED_SOURCES: Dict[str, tuple[str, ...]] = {
+    SOURCE_VOLATILE_STOCK: (
+        ATTR_EXPIRING_PRODUCTS,
+        ATTR_EXPIRED_PRODUCTS,
+        ATTR_OVERDUE_PRODUCTS,
+        ATTR_MISSING_PRODUCTS,
+    ),
+    SOURCE_CHORES: (ATTR_CHORES, ATTR_OVERDUE_CHORES),
+    SOURCE_TASKS: (ATTR_TASKS, ATTR_OVERDUE_TASKS),
+    SOURCE_BATTERIES: (ATTR_BATTERIES, ATTR_OVERDUE_BATTERIES),
+}
+
+KEY_SOURCE: Dict[str, str] = {
+    key: source for source, keys in SHARED_SOURCES.items() for key in keys
+}
+
+# Product lists in the stock/volatile response
+VOLATILE_STOCK_FIELDS: Dict[str, str] = {
+    ATTR_EXPIRING_PRODUCTS: "due_products",
+    ATTR_EXPIRED_PRODUCTS: "expired_products",
+    ATTR_OVERDUE_PRODUCTS: "overdue_products",
+    ATTR_MISSING_PRODUCTS: "missing_products",
+}
+
+
+def _is_before(value: Optional[datetime], limit: datetime) -> bool:
+    """Return whether an optional Grocy timestamp lies before limit."""
+    return value is not None and value < limit
+
 
 class GrocyData:
     """Handles communication and gets the data."""
@@ -44,113 +80,56 @@ class GrocyData:
         self.api = api
         self.entity_update_method = {
             ATTR_STOCK: self.async_update_stock,
-            ATTR_CHORES: self.async_update_chores,
-            ATTR_TASKS: self.async_update_tasks,
             ATTR_SHOPPING_LIST: self.async_update_shopping_list,
-            ATTR_EXPIRING_PRODUCTS: self.async_update_expiring_products,
-            ATTR_EXPIRED_PRODUCTS: self.async_update_expired_products,
-            ATTR_OVERDUE_PRODUCTS: self.async_update_overdue_products,
-            ATTR_MISSING_PRODUCTS: self.async_update_missing_products,
             ATTR_MEAL_PLAN: self.async_update_meal_plan,
-            ATTR_OVERDUE_CHORES: self.async_update_overdue_chores,
-            ATTR_OVERDUE_TASKS: self.async_update_overdue_tasks,
-            ATTR_BATTERIES: self.async_update_batteries,
-            ATTR_OVERDUE_BATTERIES: self.async_update_overdue_batteries,
         }
+        self.source_update_method = {
+            SOURCE_VOLATILE_STOCK: self.async_update_volatile_stock,
+            SOURCE_CHORES: self.async_update_chores,
+            SOURCE_TASKS: self.async_update_tasks,
+            SOURCE_BATTERIES: self.async_update_batteries,
+        }
+
+    @staticmethod
+    def plan_fetches(entity_keys: List[str]) -> Dict[str, List[str]]:
+        """Group entity keys by the source they are fetched from.
+
+        Keys without a shared source are their own source.
+        """
+        plan: Dict[str, List[str]] = {}
+        for key in entity_keys:
+            keys = plan.setdefault(KEY_SOURCE.get(key, key), [])
+            if key not in keys:
+                keys.append(key)
+        return plan
+
+    async def async_update_source(
+        self, source: str, entity_keys: List[str]
+    ) -> Dict[str, Any]:
+        """Fetch a source once and return the data of each of its entity keys."""
+        if source in self.source_update_method:
+            return await self.source_update_method[source](entity_keys)
+        return {key: await self.async_update_data(key) for key in entity_keys}
 
     async def async_update_data(self, entity_key):
         """Update data."""
+        if entity_key in KEY_SOURCE:
+            data = await self.async_update_source(KEY_SOURCE[entity_key], [entity_key])
+            return data[entity_key]
         if entity_key in self.entity_update_method:
             return await self.entity_update_method[entity_key]()
 
     async def async_update_stock(self):
         """Update stock data."""
-        return await self.hass.async_add_executor_job(self.api.stock)
-
-    async def async_update_chores(self):
-        """Update chores data."""
-
-        def wrapper():
-            return self.api.chores(True)
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_overdue_chores(self):
-        """Update overdue chores data."""
-
-        query_filter = [f"next_estimated_execution_time<{datetime.now()}"]
-
-        def wrapper():
-            return self.api.chores(get_details=True, query_filters=query_filter)
-
-        return await self.hass.async_add_executor_job(wrapper)
+        return await self.api.stock()
 
     async def async_get_config(self):
         """Get the configuration from Grocy."""
-
-        def wrapper():
-            return self.api.get_system_config()
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_tasks(self):
-        """Update tasks data."""
-
-        return await self.hass.async_add_executor_job(self.api.tasks)
-
-    async def async_update_overdue_tasks(self):
-        """Update overdue tasks data."""
-
-        and_query_filter = [
-            f"due_date<{datetime.now().date()}",
-            # It's not possible to pass an empty value to Grocy, so use a regex that matches non-empty values to exclude empty str due_date.
-            r"due_date§.*\S.*",
-        ]
-
-        def wrapper():
-            return self.api.tasks(query_filters=and_query_filter)
-
-        return await self.hass.async_add_executor_job(wrapper)
+        return await self.api.get_system_config()
 
     async def async_update_shopping_list(self):
         """Update shopping list data."""
-
-        def wrapper():
-            return self.api.shopping_list(True)
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_expiring_products(self):
-        """Update expiring products data."""
-
-        def wrapper():
-            return self.api.due_products(True)
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_expired_products(self):
-        """Update expired products data."""
-
-        def wrapper():
-            return self.api.expired_products(True)
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_overdue_products(self):
-        """Update overdue products data."""
-
-        def wrapper():
-            return self.api.overdue_products(True)
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_missing_products(self):
-        """Update missing products data."""
-
-        def wrapper():
-            return self.api.missing_products(True)
-
-        return await self.hass.async_add_executor_job(wrapper)
+        return await self.api.shopping_list(True)
 
     async def async_update_meal_plan(self):
         """Update meal plan data."""
@@ -159,29 +138,62 @@ class GrocyData:
         yesterday = datetime.now() - timedelta(1)
         query_filter = [f"day>{yesterday.date()}"]
 
-        def wrapper():
-            meal_plan = self.api.meal_plan(get_details=True, query_filters=query_filter)
-            plan = [MealPlanItemWrapper(item) for item in meal_plan]
-            return sorted(plan, key=lambda item: item.meal_plan.day)
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_batteries(self) -> List[Battery]:
-        """Update batteries."""
-
-        def wrapper():
-            return self.api.batteries(get_details=True)
-
-        return await self.hass.async_add_executor_job(wrapper)
-
-    async def async_update_overdue_batteries(self) -> List[Battery]:
-        """Update overdue batteries."""
-
-        def wrapper():
-            filter_query = [f"next_estimated_charge_time<{datetime.now()}"]
-            return self.api.batteries(filter_query, get_details=True)
-
-        return await self.hass.async_add_executor_job(wrapper)
+        meal_plan = await self.api.meal_plan(
+            get_details=True, query_filters=query_filter
+        )
+        plan = [MealPlanItemWrapper(item) for item in meal_plan]
+        return sorted(plan, key=lambda item: item.meal_plan.day)
+
+    async def async_update_volatile_stock(
+        self, entity_keys: List[str]
+    ) -> Dict[str, Any]:
+        """Fetch stock/volatile once for the due, overdue, expired and missing products."""
+        volatile_stock = await self.api.volatile_stock()
+        product_lists = await self.api.products_with_details(
+            getattr(volatile_stock, VOLATILE_STOCK_FIELDS[key]) for key in entity_keys
+        )
+        return dict(zip(entity_keys, product_lists))
+
+    async def async_update_chores(self, entity_keys: List[str]) -> Dict[str, Any]:
+        """Fetch the chores once, overdue chores are filtered locally."""
+        chores = await self.api.chores(get_details=True)
+        now = datetime.now()
+        data = {
+            ATTR_CHORES: chores,
+            ATTR_OVERDUE_CHORES: [
+                chore
+                for chore in chores
+                if _is_before(chore.next_estimated_execution_time, now)
+            ],
+        }
+        return {key: data[key] for key in entity_keys}
+
+    async def async_update_tasks(self, entity_keys: List[str]) -> Dict[str, Any]:
+        """Fetch the tasks once, overdue tasks are filtered locally."""
+        tasks = await self.api.tasks()
+        # Tasks without a due date are never overdue, as with the former query filter
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        data = {
+            ATTR_TASKS: tasks,
+            ATTR_OVERDUE_TASKS: [
+                task for task in tasks if _is_before(task.due_date, today)
+            ],
+        }
+        return {key: data[key] for key in entity_keys}
+
+    async def async_update_batteries(self, entity_keys: List[str]) -> Dict[str, Any]:
+        """Fetch the batteries once, overdue batteries are filtered locally."""
+        batteries: List[Battery] = await self.api.batteries(get_details=True)
+        now = datetime.now()
+        data = {
+            ATTR_BATTERIES: batteries,
+            ATTR_OVERDUE_BATTERIES: [
+                battery
+                for battery in batteries
+                if _is_before(battery.next_estimated_charge_time, now)
+            ],
+        }
+        return {key: data[key] for key in entity_keys}
 
 
 async def async_setup_endpoint_for_image_proxy(
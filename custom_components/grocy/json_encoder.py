@@ -1,6 +1,8 @@
 """JSON encoder for Grocy."""
 
 import datetime
+import json
+from enum import Enum
 from typing import Any
 
 from homeassistant.helpers.json import ExtendedJSONEncoder
@@ -16,3 +18,28 @@ class CustomJSONEncoder(ExtendedJSONEncoder):
             return o.isoformat()
 
         return super().default(o)
+
+
+_ENCODER = CustomJSONEncoder()
+
+
+def _json_key(key: Any) -> str:
+    """Convert a dict key the way json.dumps does."""
+    return key if isinstance(key, str) else json.dumps(key)
+
+
+def to_json_compatible(obj: Any) -> Any:
+    """Convert an object to JSON types in a single pass.
+
+    The result equals a json.dumps/json.loads round trip with CustomJSONEncoder,
+    without building the intermediate string.
+    """
+    if isinstance(obj, Enum) and isinstance(obj, (str, int, float)):
+        return obj.value
+    if obj is None or isinstance(obj, (str, int, float)):
+        return obj
+    if isinstance(obj, dict):
+        return {_json_key(key): to_json_compatible(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_json_compatible(value) for value in obj]
+    return to_json_compatible(_ENCODER.default(obj))
@@ -7,8 +7,9 @@ from homeassistant.core import HomeAssistant, ServiceCall
 from pygrocy2.grocy import EntityType, TransactionType
 from datetime import datetime
 
-from .const import ATTR_CHORES, ATTR_TASKS, DOMAIN
+from .const import ATTR_BATTERIES, ATTR_CHORES, ATTR_STOCK, ATTR_TASKS, DOMAIN
 from .coordinator import GrocyDataUpdateCoordinator
+from .grocy_data import SHARED_SOURCES, SOURCE_VOLATILE_STOCK
 
 SERVICE_PRODUCT_ID = "product_id"
 SERVICE_AMOUNT = "amount"
@@ -28,6 +29,9 @@ SERVICE_BATTERY_ID = "battery_id"
 SERVICE_OBJECT_ID = "object_id"
 SERVICE_LIST_ID = "list_id"
 
+# Entity keys that change with the stock
+STOCK_KEYS = (ATTR_STOCK, *SHARED_SOURCES[SOURCE_VOLATILE_STOCK])
+
 SERVICE_ADD_PRODUCT = "add_product_to_stock"
 SERVICE_OPEN_PRODUCT = "open_product"
 SERVICE_CONSUME_PRODUCT = "consume_product_from_stock"
@@ -220,10 +224,8 @@ async def async_add_product_service(hass, coordinator, data):
     amount = data[SERVICE_AMOUNT]
     price = data.get(SERVICE_PRICE, "")
 
-    def wrapper():
-        coordinator.grocy_api.add_product(product_id, amount, price)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.add_product(product_id, amount, price)
+    await _async_force_update_entity(coordinator, *STOCK_KEYS)
 
 
 async def async_open_product_service(hass, coordinator, data):
@@ -232,12 +234,10 @@ async def async_open_product_service(hass, coordinator, data):
     amount = data[SERVICE_AMOUNT]
     allow_subproduct_substitution = data.get(SERVICE_SUBPRODUCT_SUBSTITUTION, False)
 
-    def wrapper():
-        coordinator.grocy_api.open_product(
-            product_id, amount, allow_subproduct_substitution
-        )
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.open_product(
+        product_id, amount, allow_subproduct_substitution
+    )
+    await _async_force_update_entity(coordinator, *STOCK_KEYS)
 
 
 async def async_consume_product_service(hass, coordinator, data):
@@ -253,16 +253,14 @@ async def async_consume_product_service(hass, coordinator, data):
     if transaction_type_raw is not None:
         transaction_type = TransactionType[transaction_type_raw]
 
-    def wrapper():
-        coordinator.grocy_api.consume_product(
-            product_id,
-            amount,
-            spoiled=spoiled,
-            transaction_type=transaction_type,
-            allow_subproduct_substitution=allow_subproduct_substitution,
-        )
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.consume_product(
+        product_id,
+        amount,
+        spoiled=spoiled,
+        transaction_type=transaction_type,
+        allow_subproduct_substitution=allow_subproduct_substitution,
+    )
+    await _async_force_update_entity(coordinator, *STOCK_KEYS)
 
 
 async def async_execute_chore_service(hass, coordinator, data):
@@ -274,10 +272,7 @@ async def async_execute_chore_service(hass, coordinator, data):
     tracked_time = datetime.now() if should_track_now else None
     skipped = data.get(SERVICE_SKIPPED, False)
 
-    def wrapper():
-        coordinator.grocy_api.execute_chore(chore_id, done_by, tracked_time, skipped=skipped)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.execute_chore(chore_id, done_by, tracked_time, skipped=skipped)
     await _async_force_update_entity(coordinator, ATTR_CHORES)
 
 
@@ -285,10 +280,7 @@ async def async_complete_task_service(hass, coordinator, data):
     """Complete a task in Grocy."""
     task_id = data[SERVICE_TASK_ID]
 
-    def wrapper():
-        coordinator.grocy_api.complete_task(task_id)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.complete_task(task_id)
     await _async_force_update_entity(coordinator, ATTR_TASKS)
 
 
@@ -302,10 +294,7 @@ async def async_add_generic_service(hass, coordinator, data):
 
     data = data[SERVICE_DATA]
 
-    def wrapper():
-        coordinator.grocy_api.add_generic(entity_type, data)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.add_generic(entity_type, data)
     await post_generic_refresh(coordinator, entity_type);
 
 
@@ -321,10 +310,7 @@ async def async_update_generic_service(hass, coordinator, data):
 
     data = data[SERVICE_DATA]
 
-    def wrapper():
-        coordinator.grocy_api.update_generic(entity_type, object_id, data)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.update_generic(entity_type, object_id, data)
     await post_generic_refresh(coordinator, entity_type);
 
 
@@ -338,54 +324,48 @@ async def async_delete_generic_service(hass, coordinator, data):
 
     object_id = data[SERVICE_OBJECT_ID]
 
-    def wrapper():
-        coordinator.grocy_api.delete_generic(entity_type, object_id)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.delete_generic(entity_type, object_id)
     await post_generic_refresh(coordinator, entity_type);
 
 
 async def post_generic_refresh(coordinator, entity_type):
-    if entity_type == "tasks" or entity_type == "chores":
+    if entity_type == "tasks" or entity_type == "chores" or entity_type == "batteries":
         await _async_force_update_entity(coordinator, entity_type)
+    elif entity_type == "products":
+        await _async_force_update_entity(coordinator, *STOCK_KEYS)
 
 async def async_consume_recipe_service(hass, coordinator, data):
     """Consume a recipe in Grocy."""
     recipe_id = data[SERVICE_RECIPE_ID]
 
-    def wrapper():
-        coordinator.grocy_api.consume_recipe(recipe_id)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.consume_recipe(recipe_id)
+    await _async_force_update_entity(coordinator, *STOCK_KEYS)
 
 
 async def async_track_battery_service(hass, coordinator, data):
     """Track a battery in Grocy."""
     battery_id = data[SERVICE_BATTERY_ID]
 
-    def wrapper():
-        coordinator.grocy_api.charge_battery(battery_id)
-
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.charge_battery(battery_id)
+    await _async_force_update_entity(coordinator, ATTR_BATTERIES)
 
 async def async_add_missing_products_to_shopping_list(hass, coordinator, data):
     '''Adds currently missing proudcts (below defined min. stock amount) to the given shopping list.'''
     list_id = data.get(SERVICE_LIST_ID, 1)
 
-    def wrapper():
-        coordinator.grocy_api.add_missing_product_to_shopping_list(list_id)
-    
-    await hass.async_add_executor_job(wrapper)
+    await coordinator.grocy_api.add_missing_product_to_shopping_list(list_id)
 
 async def _async_force_update_entity(
-    coordinator: GrocyDataUpdateCoordinator, entity_key: str
+    coordinator: GrocyDataUpdateCoordinator, *entity_keys: str
 ) -> None:
-    """Force entity update for given entity key."""
+    """Force entity update for given entity keys."""
+    # The keys are fetched even if their refresh tier is not due yet
+    coordinator.invalidate(*entity_keys)
     entity = next(
         (
             entity
             for entity in coordinator.entities
-            if entity.entity_description.key == entity_key
+            if entity.entity_description.key in entity_keys
         ),
         None,
     )
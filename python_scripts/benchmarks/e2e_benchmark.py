@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark
+Starts local stand-ins for Grocy and Home Assistant, drives run.py in each
+mode and reports wall time percentiles, requests per endpoint and peak RSS.
+Results can be saved as JSON and compared with an earlier run.
+
+Usage: python3 benchmarks/e2e_benchmark.py [--modes grocy weather device all] [--runs 10]
+                                           [--latency 0.02] [--chores 200] [--json results.json]
+                                           [--baseline previous.json]
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import yaml
+
+# Add parent directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from benchmarks.grocy_join_benchmark import make_chores
+
+RUN_SCRIPT = os.path.join(parent_dir, "run.py")
+FLAGS_PATH = os.path.join(parent_dir, "feature_flags.yaml")
+
+WEATHER_ENTITY = "weather.openweathermap"
+DEVICE_ENTITY = "switch.shelly_caldaia"
+
+# Flags changed for every benchmark run, on top of feature_flags.yaml
+BENCHMARK_FLAGS = {
+    # Every run sends its notifications instead of dropping repeats
+    "notifications.dedupe_window": 0,
+    # Every grocy run formats and sends the full list instead of an empty digest
+    "grocy.change_digest": False,
+    # Measure the device mode itself, not the debounce wait
+    "devices.debounce_quiet": 0,
+    "metrics.ha_sensor": False,
+}
+
+# Objects filter sent by services/grocy.py, e.g. id§^(1|2|3)$
+OBJECT_ID_FILTER = re.compile(r'^id§\^\((.*)\)\$$')
+
+
+class StubData:
+    """Payloads served by the stand-ins, built once per benchmark"""
+
+    def __init__(self, chores, forecast_days, entities):
+        """
+        Build the payloads
+
+        Args:
+            chores: Number of chores Grocy returns
+            forecast_days: Number of days in the weather forecast
+            entities: Number of entities in /api/states besides the Shelly relay
+        """
+        today = datetime.date.today()
+        self.chores, self.objects = make_chores(chores, today)
+        self.forecast = {"service_response": {WEATHER_ENTITY: {"forecast": [
+            {
+                "datetime": f"{today + datetime.timedelta(days=day)}T12:00:00+00:00",
+                "condition": "rainy" if day % 3 == 0 else "sunny",
+                "temperature": 15.0 + day,
+                "templow": 5.0 + day,
+                "precipitation": 1.5 if day % 3 == 0 else 0.0,
+                "wind_speed": 4.0 + day,
+            }
+            for day in range(forecast_days)
+        ]}}}
+        self.states = [{"entity_id": DEVICE_ENTITY, "state": "on", "attributes": {}}]
+        self.states.extend(
+            {"entity_id": f"sensor.bench_{index}", "state": str(index), "attributes": {}}
+            for index in range(entities)
+        )
+        self.states_by_id = {state["entity_id"]: state for state in self.states}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Routes requests to the Grocy or Home Assistant payloads"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        """Answer a request after the configured latency, counted per endpoint"""
+        stub = self.server.stub
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+
+        route, response = stub.handle(method, parts.path, parse_qs(parts.query))
+        stub.count(f"{method} {route}")
+        if stub.latency:
+            time.sleep(stub.latency)
+        if response is None:
+            self._send({"error": f"No stub for {method} {parts.path}"}, 404)
+        else:
+            self._send(response)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+class StubServer:
+    """One stand-in HTTP server on a free local port"""
+
+    def __init__(self, data, latency):
+        """
+        Initialize the server
+
+        Args:
+            data: StubData with the payloads
+            latency: Seconds added to every response
+        """
+        self.data = data
+        self.latency = latency
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, route):
+        with self._lock:
+            self.counts[route] += 1
+
+    def take_counts(self):
+        """Return and reset the request counts"""
+        with self._lock:
+            counts = self.counts
+            self.counts = Counter()
+        return counts
+
+    def handle(self, method, path, query):
+        """
+        Pick the payload for a request
+
+        Returns:
+            tuple: (route used for counting, response data or None for 404)
+        """
+        data = self.data
+        if method == "GET" and path == "/api/chores":
+            return path, data.chores
+        if method == "GET" and path == "/api/objects/chores":
+            for query_filter in query.get("query[]", []):
+                match = OBJECT_ID_FILTER.match(query_filter)
+                if match:
+                    ids = set(match.group(1).split("|"))
+                    return path, [chore for chore in data.objects if str(chore["id"]) in ids]
+            return path, data.objects
+        if method == "POST" and path == "/api/services/weather/get_forecasts":
+            return path, data.forecast
+        if method == "GET" and path == "/api/states":
+            return path, data.states
+        if path.startswith("/api/states/"):
+            if method == "POST":
+                return "/api/states/*", {}
+            return "/api/states/*", data.states_by_id.get(path[len("/api/states/"):])
+        if method == "POST" and path.startswith("/api/services/notify/"):
+            return "/api/services/notify/*", []
+        return path, None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def write_flags(path, overrides):
+    """Write feature_flags.yaml with dotted-path overrides applied"""
+    with open(FLAGS_PATH, "r") as f:
+        flags = yaml.safe_load(f) or {}
+    for dotted, value in overrides.items():
+        node = flags
+        *parents, key = dotted.split(".")
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[key] = value
+    with open(path, "w") as f:
+        yaml.safe_dump(flags, f)
+
+
+def run_once(mode, iteration, hass, grocy, env):
+    """
+    Run run.py once in its own process
+
+    Returns:
+        tuple: (wall seconds, exit code, peak RSS in KiB)
+    """
+    command = [
+        sys.executable, RUN_SCRIPT, "--mode", mode, "--no-daemon",
+        "--hass-token", "benchmark", "--hass-url", hass.url,
+        "--grocy-url", f"{grocy.url}/api", "--grocy-api-key", "benchmark",
+        "--weather-entity", WEATHER_ENTITY,
+        # Alternate the relay so every run has a change to report
+        "--device-entity", DEVICE_ENTITY, "--device-state", "on" if iteration % 2 == 0 else "off",
+    ]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=parent_dir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # wait4 gives the resource usage of this child alone
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return wall, process.returncode, usage.ru_maxrss
+
+
+def benchmark_mode(mode, args, hass, grocy, env, state_dir):
+    """
+    Run one mode args.warmup + args.runs times
+
+    Returns:
+        dict: Timings, request counts per run and peak RSS of the measured runs
+    """
+    walls = []
+    failures = 0
+    peak_rss = 0
+    requests = Counter()
+    for iteration in range(args.warmup + args.runs):
+        if args.cold:
+            shutil.rmtree(state_dir, ignore_errors=True)
+        hass.take_counts()
+        grocy.take_counts()
+
+        wall, code, rss = run_once(mode, iteration, hass, grocy, env)
+        counts = hass.take_counts() + grocy.take_counts()
+        if iteration < args.warmup:
+            continue
+
+        walls.append(wall)
+        failures += 1 if code != 0 else 0
+        peak_rss = max(peak_rss, rss)
+        requests.update(counts)
+
+    return {
+        "runs": len(walls),
+        "failures": failures,
+        "p50": percentile(walls, 50),
+        "p95": percentile(walls, 95),
+        "mean": sum(walls) / len(walls),
+        "requests_per_run": sum(requests.values()) / len(walls),
+        "requests": {route: count / len(walls) for route, count in sorted(requests.items())},
+        "peak_rss_kib": peak_rss,
+    }
+
+
+def print_results(results, baseline=None):
+    """Print a table per mode, with the change against the baseline if given"""
+    def delta(mode, key, value):
+        previous = (baseline or {}).get("modes", {}).get(mode, {}).get(key)
+        if not previous:
+            return ""
+        return f" ({(value - previous) / previous * 100:+.0f}%)"
+
+    print(f"\n{'mode':<8} {'runs':>5} {'fail':>5} {'p50 s':>16} {'p95 s':>16} {'req/run':>14} {'peak RSS MiB':>18}")
+    for mode, result in results["modes"].items():
+        print(
+            f"{mode:<8} {result['runs']:>5} {result['failures']:>5} "
+            f"{result['p50']:>7.3f}{delta(mode, 'p50', result['p50']):>9} "
+            f"{result['p95']:>7.3f}{delta(mode, 'p95', result['p95']):>9} "
+            f"{result['requests_per_run']:>6.1f}{delta(mode, 'requests_per_run', result['requests_per_run']):>8} "
+            f"{result['peak_rss_kib'] / 1024:>9.1f}{delta(mode, 'peak_rss_kib', result['peak_rss_kib']):>9}"
+        )
+
+    print("\nRequests per run")
+    for mode, result in results["modes"].items():
+        for route, count in result["requests"].items():
+            print(f"  {mode:<8} {route:<45} {count:>6.1f}")
+
+
+def parse_flag(text):
+    """Parse a --flag section.key=value argument"""
+    key, _, value = text.partition("=")
+    if not key or not _:
+        raise argparse.ArgumentTypeError(f"Expected section.key=value, got {text!r}")
+    return key, yaml.safe_load(value)
+
+
+def main():
+    """Start the stand-ins, run the modes and print the results"""
+    parser = argparse.ArgumentParser(description="Benchmark run.py against local Grocy and Home Assistant stand-ins")
+    parser.add_argument("--modes", nargs="+", default=["grocy", "weather", "device", "all"],
+                        choices=["grocy", "weather", "device", "all"], help="Modes to run")
+    parser.add_argument("--runs", type=int, default=10, help="Measured runs per mode")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per mode before the measured ones")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every stub response")
+    parser.add_argument("--chores", type=int, default=200, help="Chores returned by the Grocy stand-in")
+    parser.add_argument("--forecast-days", type=int, default=7, help="Days in the forecast")
+    parser.add_argument("--entities", type=int, default=500, help="Extra entities in /api/states")
+    parser.add_argument("--cold", action="store_true", help="Clear the state directory (caches, outbox) before every run")
+    parser.add_argument("--flag", type=parse_flag, action="append", default=[],
+                        help="Feature flag override, e.g. --flag devices.debounce_quiet=5")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    data = StubData(args.chores, args.forecast_days, args.entities)
+    hass = StubServer(data, args.latency)
+    grocy = StubServer(data, args.latency)
+    hass.start()
+    grocy.start()
+
+    work_dir = tempfile.mkdtemp(prefix="automation-bench-")
+    state_dir = os.path.join(work_dir, "state")
+    flags_path = os.path.join(work_dir, "feature_flags.yaml")
+    overrides = dict(BENCHMARK_FLAGS)
+    overrides.update(args.flag)
+    write_flags(flags_path, overrides)
+
+    # Keep state and logs of the benchmark away from the real ones
+    env = dict(os.environ)
+    env.update({
+        "AUTOMATION_STATE_DIR": state_dir,
+        "AUTOMATION_LOG_DIR": os.path.join(work_dir, "logs"),
+        "AUTOMATION_FEATURE_FLAGS": flags_path,
+    })
+
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "runs": args.runs, "warmup": args.warmup, "latency": args.latency, "chores": args.chores,
+            "forecast_days": args.forecast_days, "entities": args.entities, "cold": args.cold,
+            "flags": overrides,
+        },
+        "modes": {},
+    }
+    try:
+        for mode in args.modes:
+            print(f"Running {mode} mode {args.warmup} + {args.runs} times...", flush=True)
+            results["modes"][mode] = benchmark_mode(mode, args, hass, grocy, env, state_dir)
+    finally:
+        hass.stop()
+        grocy.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Grocy chore join benchmark
+Times joining the chore overview with the chore objects for growing numbers
+of synthetic chores, to check that the join scales linearly
+
+Usage: python3 benchmarks/grocy_join_benchmark.py [--sizes 1000 2000 4000 8000] [--repeat 5]
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from common import description_parser
+from services import grocy
+
+
+def make_chores(count, today):
+    """
+    Build synthetic /api/chores and /api/objects/chores payloads
+
+    Every chore is due within the next 14 days, so all of them are joined.
+    The objects are returned in reverse order to rule out positional matching.
+    """
+    chores = []
+    objects = []
+    for chore_id in range(1, count + 1):
+        due = today + datetime.timedelta(days=chore_id % 14)
+        chores.append({
+            "chore_id": chore_id,
+            "chore_name": f"Chore {chore_id}",
+            "next_estimated_execution_time": f"{due} 10:00:00",
+            "next_execution_assigned_user": {"display_name": "User"},
+        })
+        objects.append({
+            "id": chore_id,
+            "name": f"Chore {chore_id}",
+            "description": f"Task {chore_id}\n---\nReferences: ref {chore_id}\n---\nEquipment: tool {chore_id}",
+            "userfields": {"location": "Home"},
+        })
+    objects.reverse()
+    return chores, objects
+
+
+def time_join(chores, objects, today, repeat, cache_dir):
+    """
+    Time joins starting from an empty description cache
+
+    Returns:
+        tuple: (first run, best of the following runs) in seconds
+    """
+    future_date = today + datetime.timedelta(days=14)
+    description_parser.description_cache = description_parser.DescriptionCache(
+        os.path.join(cache_dir, f"cache_{len(chores)}.json")
+    )
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        joined = grocy.join_chores(chores, objects, today, future_date)
+        timings.append(time.perf_counter() - start)
+    assert len(joined) == len(chores)
+    assert all(chore["sections"].references != "None" for chore in joined)
+    description_parser.description_cache.save()
+    return timings[0], min(timings[1:] or timings)
+
+
+def main():
+    """Run the benchmark and print a table of timings"""
+    parser = argparse.ArgumentParser(description="Benchmark the Grocy chore join")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000],
+                        help="Numbers of synthetic chores")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per size, the best one is reported")
+    args = parser.parse_args()
+
+    # Keep per-chore logging out of the measurement
+    grocy.logger.logger.setLevel(logging.WARNING)
+    description_parser.logger.logger.setLevel(logging.WARNING)
+
+    today = datetime.date.today()
+    print(f"{'chores':>8} {'cold ms':>10} {'warm ms':>10} {'us/chore':>10} {'scaling':>8}")
+    previous = None
+    # The first run parses every description, later runs hit the description cache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for size in args.sizes:
+            chores, objects = make_chores(size, today)
+            cold, warm = time_join(chores, objects, today, args.repeat, cache_dir)
+            per_chore = warm / size
+            # Ratio of per-chore cost to the previous size, ~1.0 means linear
+            scaling = f"{per_chore / previous:.2f}" if previous else "-"
+            print(f"{size:>8} {cold * 1000:>10.2f} {warm * 1000:>10.2f} {per_chore * 1e6:>10.2f} {scaling:>8}")
+            previous = per_chore
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,30 @@
 """
 Common utilities for Home Assistant automation scripts
+The notification system is imported on first access, so a script only pays
+for it when it actually sends something
 """
+import importlib
+
 from .config_manager import config_manager, ConfigManager
 from .logger import get_logger
-from .notification import send_telegram, notification_manager
\ No newline at end of file
+
+# Public name -> submodule that provides it
+_LAZY_EXPORTS = {
+    "send_telegram": ".notification",
+    "notification_manager": ".notification",
+}
+
+
+def __getattr__(name):
+    """Import the submodule providing name on first access"""
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
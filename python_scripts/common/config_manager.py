@@ -4,6 +4,8 @@ Configuration manager for Home Assistant automation scripts
 Handles loading feature flags and providing access to configuration values
 """
 import os
+import threading
+import time
 import yaml
 import logging
 
@@ -11,41 +13,127 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("config_manager")
 
+# Seconds between checks of the file mtime, so lookups do not stat the file each time
+RELOAD_CHECK_INTERVAL = 1.0
+
+# AUTOMATION_FEATURE_FLAGS points the scripts at another flags file
+DEFAULT_CONFIG_PATH = os.environ.get("AUTOMATION_FEATURE_FLAGS", "/config/python_scripts/feature_flags.yaml")
+
 
 class ConfigManager:
     """Manages configuration and feature flags for automation scripts"""
     
-    def __init__(self, config_path="/config/python_scripts/feature_flags.yaml"):
+    def __init__(self, config_path=DEFAULT_CONFIG_PATH,
+                 reload_check_interval=RELOAD_CHECK_INTERVAL):
         """
         Initialize the config manager
         
         Args:
             config_path: Path to the feature flags YAML file
+            reload_check_interval: Seconds between checks for a changed file
         """
         self.config_path = config_path
+        self.reload_check_interval = reload_check_interval
         self.config = {}
+        
+        # Dotted path -> value for every node of the config
+        self._values = {}
+        # Dotted path -> value with the parent "enabled" switch already applied
+        self._enabled = {}
+        
+        self._mtime = None
+        self._loaded = False
+        self._next_check = 0.0
+        self._lock = threading.Lock()
         self.load_config()
     
-    def load_config(self):
-        """Load configuration from the YAML file"""
+    def _file_mtime(self):
+        """Return the mtime of the config file, or None if it is missing"""
         try:
-            logger.info(f"Loading configuration from: {self.config_path}")
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r') as file:
-                    self.config = yaml.safe_load(file)
-                    if not self.config:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def load_config(self):
+        """
+        Load configuration from the YAML file and rebuild the lookup index
+        
+        A reload that fails, e.g. on a half-written save, keeps the previous
+        configuration until the file changes again. Only the first load falls
+        back to an empty configuration.
+        """
+        with self._lock:
+            self._mtime = self._file_mtime()
+            self._next_check = time.monotonic() + self.reload_check_interval
+            try:
+                logger.info("Loading configuration from: %s", self.config_path)
+                if self._mtime is not None:
+                    with open(self.config_path, 'r') as file:
+                        config = yaml.safe_load(file)
+                    if not config:
+                        if self._loaded:
+                            raise ValueError("config file is empty")
                         logger.warning("Config file exists but is empty, using empty dict")
-                        self.config = {}
+                        config = {}
                     else:
-                        logger.info(f"Loaded configuration with {len(self.config)} sections")
+                        logger.info("Loaded configuration with %d sections", len(config))
                         # Log first level keys to help with debugging
-                        logger.info(f"Config sections: {', '.join(self.config.keys())}")
+                        logger.info("Config sections: %s", ', '.join(config.keys()))
+                else:
+                    logger.warning("Configuration file not found: %s", self.config_path)
+                    config = {}
+            except Exception as e:
+                if self._loaded:
+                    logger.error("Error reloading configuration, keeping the previous one: %s", str(e))
+                    return
+                logger.error("Error loading configuration: %s", str(e))
+                config = {}
+            
+            self.config = config
+            self._values, self._enabled = self._compile(config)
+            self._loaded = True
+    
+    @staticmethod
+    def _compile(config):
+        """
+        Flatten the config into dotted-path lookup tables
+        
+        Returns:
+            tuple: (values, enabled) dictionaries keyed by dotted path
+        """
+        values = {}
+        
+        def flatten(prefix, node):
+            for key, value in node.items():
+                path = f"{prefix}.{key}" if prefix else str(key)
+                values[path] = value
+                if isinstance(value, dict):
+                    flatten(path, value)
+        
+        if isinstance(config, dict):
+            flatten("", config)
+        
+        # A feature is disabled whenever its top-level section is switched off
+        enabled = {}
+        for path, value in values.items():
+            parent = path.split('.', 1)[0]
+            if parent != path and not values.get(f"{parent}.enabled", True):
+                enabled[path] = False
             else:
-                logger.warning(f"Configuration file not found: {self.config_path}")
-                self.config = {}
-        except Exception as e:
-            logger.error(f"Error loading configuration: {str(e)}")
-            self.config = {}
+                enabled[path] = value
+        
+        return values, enabled
+    
+    def _check_reload(self):
+        """Reload the file if its mtime changed, checking at most once per interval"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_check_interval
+        
+        if self._file_mtime() != self._mtime:
+            logger.info("Configuration file changed, reloading")
+            self.load_config()
     
     def is_enabled(self, feature_path):
         """
@@ -57,19 +145,8 @@ class ConfigManager:
         Returns:
             bool: True if feature is enabled, False otherwise
         """
-        # First check if the parent feature is enabled
-        parts = feature_path.split('.')
-        if len(parts) > 1:
-            parent = parts[0]
-            parent_enabled = self.get_config_value(f"{parent}.enabled", True)
-            if not parent_enabled:
-                logger.debug(f"Parent feature {parent} is disabled, so {feature_path} is disabled")
-                return False
-        
-        # Get the specific feature value
-        enabled = self.get_config_value(feature_path, False)
-        logger.debug(f"Feature {feature_path} enabled: {enabled}")
-        return enabled
+        self._check_reload()
+        return self._enabled.get(feature_path, False)
     
     def get_config_value(self, path, default=None):
         """
@@ -82,18 +159,8 @@ class ConfigManager:
         Returns:
             The configuration value or default
         """
-        parts = path.split('.')
-        value = self.config
-        
-        for part in parts:
-            if isinstance(value, dict) and part in value:
-                value = value[part]
-            else:
-                logger.debug(f"Config path {path} not found, returning default: {default}")
-                return default
-        
-        logger.debug(f"Config path {path} = {value}")
-        return value
+        self._check_reload()
+        return self._values.get(path, default)
     
     def __str__(self):
         """String representation of the config manager"""
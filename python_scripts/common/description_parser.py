@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Parser for Grocy chore descriptions
+Splits a description into its "---" separated sections and remembers the
+result per description hash, so unchanged descriptions are parsed once and
+then served from a cache that is kept between runs
+
+A description looks like:
+
+    Clean the filter
+    ---
+    References: manual p. 12
+    ---
+    Equipment: screwdriver
+"""
+import atexit
+import hashlib
+import re
+import threading
+from dataclasses import dataclass, field, asdict
+
+from .logger import get_logger
+from .storage import load_json, save_json, state_path
+
+# Set up logger
+logger = get_logger("description_parser")
+
+# Bump when the parsing rules change, so cached results are discarded
+PARSER_VERSION = 1
+
+# Entries kept in the persisted cache
+MAX_CACHE_ENTRIES = 2000
+
+# "---" on a line of its own separates sections
+SECTION_SEPARATOR = re.compile(r'\n\s*---\s*\n')
+
+# A section starts with a label such as "References:" or "Equipment:"
+SECTION_LABEL = re.compile(r'^\s*([^\W\d][\w ]*?)\s*:\s*', re.UNICODE)
+
+# Value used by the notification messages for missing sections
+MISSING = "None"
+
+
+@dataclass(frozen=True)
+class DescriptionSections:
+    """Sections of a chore description"""
+
+    main: str = MISSING
+    references: str = MISSING
+    equipment: str = MISSING
+    # Any other labelled sections, keyed by their label as written
+    extra: dict = field(default_factory=dict)
+
+    def get(self, name, default=None):
+        """Look up a section by name, like the dictionaries this replaces"""
+        if name in ("main", "references", "equipment"):
+            return getattr(self, name)
+        return self.extra.get(name, default)
+
+    def as_dict(self):
+        """Return the sections as a dictionary"""
+        return asdict(self)
+
+
+def _parse(description):
+    """Split a description into sections"""
+    if not description:
+        return DescriptionSections()
+
+    parts = SECTION_SEPARATOR.split(description)
+
+    # First section is the main description (it might have leading ---)
+    main = parts[0].strip()
+    if main.startswith("---"):
+        main = main[3:].strip()
+
+    labelled = {}
+    for part in parts[1:]:
+        match = SECTION_LABEL.match(part)
+        if match is None:
+            continue
+        labelled[match.group(1)] = part[match.end():].strip() or MISSING
+
+    known = {label.lower(): label for label in labelled}
+    references = labelled.pop(known["references"], MISSING) if "references" in known else MISSING
+    equipment = labelled.pop(known["equipment"], MISSING) if "equipment" in known else MISSING
+
+    return DescriptionSections(
+        main=main or MISSING,
+        references=references,
+        equipment=equipment,
+        extra=labelled,
+    )
+
+
+class DescriptionCache:
+    """Parsed descriptions keyed by description hash, persisted as JSON"""
+
+    def __init__(self, path=None):
+        """
+        Initialize the cache
+
+        Args:
+            path: JSON file the cache is kept in, defaults to the state directory
+        """
+        self.path = path
+        self._entries = None
+        self._parsed = {}
+        self._used = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(description):
+        """Stable hash of a description, used as the cache key"""
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        """Read the persisted cache on first use"""
+        if self.path is None:
+            self.path = state_path("description_cache.json")
+        self._entries = {}
+        data = load_json(self.path)
+        if isinstance(data, dict) and data.get("version") == PARSER_VERSION:
+            self._entries = data.get("entries", {})
+        atexit.register(self.save)
+
+    def parse(self, description):
+        """
+        Get the sections of a description, parsing it only if it is new
+
+        Args:
+            description: Raw description text
+
+        Returns:
+            DescriptionSections: The parsed sections
+        """
+        if not description:
+            return DescriptionSections()
+
+        key = self.key(description)
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            self._used.add(key)
+            sections = self._parsed.get(key)
+            if sections is None and key in self._entries:
+                sections = self._parsed[key] = DescriptionSections(**self._entries[key])
+            if sections is not None:
+                return sections
+
+        sections = _parse(description)
+        logger.debug("Parsed new description %s into %d sections", key[:8], 3 + len(sections.extra))
+
+        with self._lock:
+            self._entries[key] = sections.as_dict()
+            self._parsed[key] = sections
+            self._dirty = True
+        return sections
+
+    def save(self):
+        """Write the cache if anything was added"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = self._entries
+            if len(entries) > MAX_CACHE_ENTRIES:
+                # Keep what this run used, the rest are likely old descriptions
+                entries = {key: value for key, value in entries.items() if key in self._used}
+            try:
+                save_json(self.path, {"version": PARSER_VERSION, "entries": entries})
+                self._entries = entries
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"Error saving description cache: {str(e)}")
+
+
+# Create a singleton instance
+description_cache = DescriptionCache()
+
+
+def parse_description(description):
+    """Convenience function to parse a description through the shared cache"""
+    return description_cache.parse(description)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Module executor for Home Assistant automation scripts
+Runs automation modules concurrently with per-module deadlines and collects
+their status and timings
+"""
+import threading
+import time
+
+from .logger import get_logger
+
+# Set up logger
+logger = get_logger("executor")
+
+DEFAULT_DEADLINE = 120
+
+# Module statuses
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+
+# Cancellation flag of the module running on the current thread
+_context = threading.local()
+
+
+class ModuleCancelled(Exception):
+    """Raised inside a module whose deadline has passed"""
+
+
+def check_cancelled():
+    """
+    Stop the current module if its deadline has passed
+
+    Called by the shared transport before every request attempt, so that a
+    straggling module stops talking to Home Assistant or Grocy as soon as it
+    is abandoned.
+
+    Raises:
+        ModuleCancelled: If the module running on this thread was cancelled
+    """
+    event = getattr(_context, "cancelled", None)
+    if event is not None and event.is_set():
+        raise ModuleCancelled(f"Module {_context.name} was cancelled")
+
+
+def report(**details):
+    """
+    Attach details such as counts to the result of the module running on this thread
+
+    Details end up in ModuleResult.details and in the run-state file. Calls
+    outside a module run are ignored.
+    """
+    target = getattr(_context, "details", None)
+    if target is not None:
+        target.update(details)
+
+
+def in_current_module(func):
+    """
+    Wrap func so that it runs under the current module's cancellation flag
+
+    Use this for work a module hands to another thread, so that the helper
+    thread is cancelled together with the module.
+
+    Args:
+        func: Callable to run on another thread
+
+    Returns:
+        callable: Wrapped callable
+    """
+    name = getattr(_context, "name", None)
+    cancelled = getattr(_context, "cancelled", None)
+    details = getattr(_context, "details", None)
+
+    def wrapper(*args, **kwargs):
+        _context.name = name
+        _context.cancelled = cancelled
+        _context.details = details
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+class ModuleResult:
+    """Outcome of a single module run"""
+
+    def __init__(self, name, status, duration=0.0, error=None, details=None):
+        self.name = name
+        self.status = status
+        self.duration = duration
+        self.error = error
+        self.details = details if details is not None else {}
+
+    @property
+    def success(self):
+        """Whether the module counts as successful"""
+        return self.status in (STATUS_SUCCESS, STATUS_SKIPPED)
+
+    def as_dict(self):
+        """Return the result as a dictionary"""
+        return {
+            "status": self.status,
+            "duration": round(self.duration, 3),
+            "error": self.error,
+            "details": self.details,
+        }
+
+    def __str__(self):
+        text = f"{self.name}: {self.status} in {self.duration:.2f}s"
+        return f"{text} ({self.error})" if self.error else text
+
+
+class RunResult:
+    """Aggregated outcome of a run over one or more modules"""
+
+    def __init__(self):
+        self.modules = {}
+        self.duration = 0.0
+
+    def add(self, result):
+        """Add a module result"""
+        self.modules[result.name] = result
+
+    @property
+    def success(self):
+        """Whether every module succeeded or was skipped"""
+        return all(result.success for result in self.modules.values())
+
+    def as_dict(self):
+        """Return the run as a dictionary"""
+        return {
+            "success": self.success,
+            "duration": round(self.duration, 3),
+            "modules": {name: result.as_dict() for name, result in self.modules.items()},
+        }
+
+    def summary(self):
+        """One line per module plus the total"""
+        lines = [str(result) for result in self.modules.values()]
+        lines.append(f"total: {self.duration:.2f}s")
+        return "\n".join(lines)
+
+
+def _status_for(value):
+    """Map a module return value to a status"""
+    return STATUS_SUCCESS if value else STATUS_FAILED
+
+
+def run_inline(name, func):
+    """
+    Run a single module on the current thread
+
+    Args:
+        name: Module name
+        func: Callable returning the module success status
+
+    Returns:
+        RunResult: Result with the single module
+    """
+    run = RunResult()
+    start = time.monotonic()
+    details = {}
+    _context.name = name
+    _context.cancelled = None
+    _context.details = details
+    try:
+        result = ModuleResult(name, _status_for(func()), details=details)
+    except Exception as e:
+        logger.error(f"Module {name} raised: {str(e)}")
+        result = ModuleResult(name, STATUS_ERROR, error=str(e), details=details)
+    finally:
+        _context.details = None
+    result.duration = run.duration = time.monotonic() - start
+    run.add(result)
+    return run
+
+
+def run_concurrently(modules, deadlines=None, default_deadline=DEFAULT_DEADLINE):
+    """
+    Run modules in parallel threads, each with its own deadline
+
+    Modules still running at their deadline are marked as timed out and
+    cancelled: their thread is abandoned and stops at its next HTTP request.
+
+    Args:
+        modules: Dictionary of module name to callable returning a success status,
+                 or None for modules that are disabled
+        deadlines: Optional dictionary of module name to deadline in seconds
+        default_deadline: Deadline for modules missing from deadlines
+
+    Returns:
+        RunResult: Per-module status and timings
+    """
+    deadlines = deadlines or {}
+    run = RunResult()
+    start = time.monotonic()
+    workers = {}
+
+    def worker(name, func, state):
+        _context.name = name
+        _context.cancelled = state["cancelled"]
+        _context.details = details = {}
+        try:
+            state["result"] = ModuleResult(name, _status_for(func()), details=details)
+        except ModuleCancelled:
+            return
+        except Exception as e:
+            logger.error(f"Module {name} raised: {str(e)}")
+            state["result"] = ModuleResult(name, STATUS_ERROR, error=str(e), details=details)
+        state["result"].duration = time.monotonic() - start
+
+    for name, func in modules.items():
+        if func is None:
+            run.add(ModuleResult(name, STATUS_SKIPPED))
+            continue
+
+        state = {"cancelled": threading.Event(), "result": None}
+        # Daemon threads so an abandoned module never holds the process open
+        thread = threading.Thread(target=worker, args=(name, func, state), name=f"module-{name}", daemon=True)
+        workers[name] = (thread, state)
+        thread.start()
+
+    for name, (thread, state) in workers.items():
+        deadline = start + deadlines.get(name, default_deadline)
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+        if thread.is_alive() or state["result"] is None:
+            state["cancelled"].set()
+            elapsed = time.monotonic() - start
+            logger.error(f"Module {name} missed its deadline after {elapsed:.2f}s, cancelling")
+            run.add(ModuleResult(name, STATUS_TIMEOUT, duration=elapsed, error="Deadline exceeded"))
+        else:
+            run.add(state["result"])
+
+    run.duration = time.monotonic() - start
+    return run
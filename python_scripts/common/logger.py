@@ -1,88 +1,266 @@
 #!/usr/bin/env python3
 """
 Unified logging module for Home Assistant automation scripts
+
+Records are put on a queue by the calling thread and written by a single
+background thread, so logging never blocks on disk I/O. Each log file has one
+shared handler that rotates it by size and by age.
 """
 import os
+import atexit
 import datetime
 import logging
+import logging.handlers
+import queue
+import threading
+import time
 from .config_manager import config_manager
 
+# AUTOMATION_LOG_DIR moves the logs elsewhere, e.g. for the benchmarks
+LOG_DIR = os.environ.get("AUTOMATION_LOG_DIR", "/config/www/logs")
+
+# Defaults used when feature_flags.yaml has no logging section
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+DEFAULT_ROTATE_INTERVAL = 24 * 60 * 60
+
+FILE_FORMAT = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+CONSOLE_FORMAT = logging.Formatter('%(asctime)s [%(name)s] [%(levelname)s] %(message)s', datefmt='%H:%M:%S')
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that also rolls over when the interval changes"""
+
+    def __init__(self, filename, max_bytes, backup_count, interval):
+        """
+        Initialize the handler
+
+        Args:
+            filename: Log file path
+            max_bytes: Roll over once the file would grow past this size
+            backup_count: Number of rotated files to keep
+            interval: Roll over when the last write was in an earlier interval (seconds)
+        """
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self.interval = interval
+        try:
+            self.last_write = os.stat(filename).st_mtime
+        except OSError:
+            self.last_write = time.time()
+
+    def shouldRollover(self, record):
+        """Roll over on size, or when the previous write was in an earlier interval"""
+        if self.interval and int(record.created // self.interval) != int(self.last_write // self.interval):
+            if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+                return True
+        return super().shouldRollover(record)
+
+    def emit(self, record):
+        super().emit(record)
+        self.last_write = record.created
+
+
+class _RoutingHandler(logging.Handler):
+    """Listener-side handler that writes each record to its file and the console"""
+
+    def __init__(self):
+        super().__init__()
+        self.file_handlers = {}
+        self.console_handler = logging.StreamHandler()
+        self.console_handler.setFormatter(CONSOLE_FORMAT)
+
+    def handle(self, record):
+        file_handler = self.file_handlers.get(getattr(record, "log_file", None))
+        if file_handler is not None:
+            file_handler.handle(record)
+        if getattr(record, "to_console", False):
+            self.console_handler.handle(record)
+        return True
+
+
+class _FileQueueHandler(logging.handlers.QueueHandler):
+    """Caller-side handler that tags records with their destination file"""
+
+    def __init__(self, pipeline, log_file, to_console):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.log_file = log_file
+        self.to_console = to_console
+
+    def enqueue(self, record):
+        # Restart the writer for records logged by atexit handlers that run after stop()
+        if self.pipeline.listener is None:
+            self.pipeline.start()
+        super().enqueue(record)
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.log_file = self.log_file
+        record.to_console = self.to_console
+        return record
+
+
+class _LogPipeline:
+    """Queue and background writer thread shared by every logger in the process"""
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.router = _RoutingHandler()
+        self.listener = None
+        self._registered = False
+        self._lock = threading.Lock()
+
+    def _file_handler(self, log_file):
+        """Get or create the shared rotating handler for a file"""
+        handler = self.router.file_handlers.get(log_file)
+        if handler is None:
+            handler = SizeAndTimeRotatingFileHandler(
+                log_file,
+                max_bytes=config_manager.get_config_value('logging.max_bytes', DEFAULT_MAX_BYTES),
+                backup_count=config_manager.get_config_value('logging.backup_count', DEFAULT_BACKUP_COUNT),
+                interval=config_manager.get_config_value('logging.rotate_interval', DEFAULT_ROTATE_INTERVAL),
+            )
+            handler.setFormatter(FILE_FORMAT)
+            self.router.file_handlers[log_file] = handler
+        return handler
+
+    def handler_for(self, log_file, to_console=True):
+        """
+        Get a queue handler writing to log_file through the background thread
+
+        Args:
+            log_file: Path of the log file
+            to_console: Whether records also go to the console
+        """
+        with self._lock:
+            self._file_handler(log_file)
+        self.start()
+        return _FileQueueHandler(self, log_file, to_console)
+
+    def start(self):
+        """Start the background writer thread if it is not running"""
+        with self._lock:
+            if self.listener is None:
+                self.listener = logging.handlers.QueueListener(self.queue, self.router)
+                self.listener.start()
+                if not self._registered:
+                    atexit.register(self.stop)
+                    self._registered = True
+
+    def stop(self):
+        """Write out everything still queued and stop the background thread"""
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+            for handler in self.router.file_handlers.values():
+                handler.close()
+
+
+_pipeline = _LogPipeline()
+
+
+def route_root_logger(log_file):
+    """
+    Send the root logger's records for log_file through the background writer
+
+    run.py configures the root logger with a plain FileHandler before anything
+    else is imported; once the common modules are loaded this swaps it for the
+    queued, rotating handler.
+    """
+    root = logging.getLogger()
+    log_file = os.path.abspath(log_file)
+    for handler in list(root.handlers):
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == log_file:
+            root.removeHandler(handler)
+            handler.close()
+    root.addHandler(_pipeline.handler_for(log_file, to_console=False))
+
 
 class Logger:
     """Unified logger for automation scripts with file and console output"""
-    
-    def __init__(self, module_name, log_dir="/config/www/logs"):
+
+    def __init__(self, module_name, log_dir=LOG_DIR):
         """
         Initialize the logger
-        
+
+        Handlers are only set up on the first log call, so creating a
+        module-level logger at import time costs nothing
+
         Args:
             module_name: Name of the module using this logger
             log_dir: Directory to store log files
         """
         self.module_name = module_name
         self.log_dir = log_dir
+        self.log_file = f"{log_dir}/{module_name}.log"
+        self.verbose = None
+        self._logger = None
+
+    @property
+    def logger(self):
+        """The underlying Python logger, set up on first use"""
+        if self._logger is None:
+            self._setup()
+        return self._logger
+
+    def _setup(self):
+        """Create the log directory and attach the queued file and console handler"""
+        log_dir = self.log_dir
         self.verbose = config_manager.is_enabled('debug.verbose_logging')
-        
+
         # Create log directory if it doesn't exist
         if not os.path.exists(log_dir):
             try:
                 os.makedirs(log_dir)
             except Exception as e:
                 print(f"Error creating log directory {log_dir}: {str(e)}")
-        
-        # Set up file path
-        self.log_file = f"{log_dir}/{module_name}.log"
-        
+
         # Set up Python logger
-        self.logger = logging.getLogger(module_name)
-        self.logger.setLevel(logging.DEBUG if self.verbose else logging.INFO)
-        
+        logger = logging.getLogger(self.module_name)
+        logger.setLevel(logging.DEBUG if self.verbose else logging.INFO)
+
         # Clear existing handlers to avoid duplicates
-        if self.logger.hasHandlers():
-            self.logger.handlers.clear()
-        
-        # Add file handler
+        if logger.hasHandlers():
+            logger.handlers.clear()
+
+        # Add the queued handler for this module's file and the console
         try:
-            file_handler = logging.FileHandler(self.log_file)
-            file_handler.setFormatter(logging.Formatter(
-                '%(asctime)s [%(levelname)s] %(message)s',
-                datefmt='%Y-%m-%d %H:%M:%S'
-            ))
-            self.logger.addHandler(file_handler)
+            logger.addHandler(_pipeline.handler_for(os.path.abspath(self.log_file)))
         except Exception as e:
             print(f"Error setting up log file {self.log_file}: {str(e)}")
-        
-        # Add console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(logging.Formatter(
-            '%(asctime)s [%(name)s] [%(levelname)s] %(message)s',
-            datefmt='%H:%M:%S'
-        ))
-        self.logger.addHandler(console_handler)
-    
-    def debug(self, message):
+
+        self._logger = logger
+
+    def is_debug(self):
+        """Whether debug messages are written, to guard expensive debug output"""
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    # Messages accept %-style args, which are only formatted if the level is enabled
+
+    def debug(self, message, *args):
         """Log debug message"""
-        self.logger.debug(message)
-    
-    def info(self, message):
+        self.logger.debug(message, *args)
+
+    def info(self, message, *args):
         """Log info message"""
-        self.logger.info(message)
-    
-    def warning(self, message):
+        self.logger.info(message, *args)
+
+    def warning(self, message, *args):
         """Log warning message"""
-        self.logger.warning(message)
-    
-    def error(self, message):
+        self.logger.warning(message, *args)
+
+    def error(self, message, *args):
         """Log error message"""
-        self.logger.error(message)
-    
-    def critical(self, message):
+        self.logger.error(message, *args)
+
+    def critical(self, message, *args):
         """Log critical message"""
-        self.logger.critical(message)
-    
+        self.logger.critical(message, *args)
+
     def section(self, title):
         """Create a section divider in the log"""
-        self.logger.info(f"===== {title} =====")
+        self.logger.info("===== %s =====", title)
 
 
 def get_logger(module_name):
@@ -97,4 +275,4 @@ if __name__ == "__main__":
     test_logger.debug("This is a debug message")
     test_logger.info("This is an info message")
     test_logger.warning("This is a warning message")
-    test_logger.error("This is an error message")
\ No newline at end of file
+    test_logger.error("This is an error message")
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Metrics for Home Assistant automation scripts
+Collects stage timers, HTTP request counters and payload-size histograms
+during a run, adds them to the totals kept in the state directory and
+writes everything as a Prometheus textfile (node_exporter textfile
+collector format). Optionally the last run is also pushed to a Home
+Assistant sensor.
+"""
+import atexit
+import contextlib
+import os
+import threading
+import time
+
+from .config_manager import config_manager
+from .logger import get_logger
+from .storage import file_lock, load_json, save_json, state_path
+
+# Set up logger
+logger = get_logger("metrics")
+
+DEFAULT_SENSOR = "sensor.python_scripts_metrics"
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+# Name -> (type, help, histogram buckets)
+METRICS = {
+    "automation_stage_duration_seconds": (
+        HISTOGRAM, "Time spent in each stage of a module run", DURATION_BUCKETS),
+    "automation_module_runs_total": (
+        COUNTER, "Module runs by status", None),
+    "automation_module_duration_seconds": (
+        HISTOGRAM, "Duration of module runs", DURATION_BUCKETS),
+    "automation_last_run_timestamp_seconds": (
+        GAUGE, "Unix time of the last run of each module", None),
+    "automation_last_run_duration_seconds": (
+        GAUGE, "Duration of the last run of each module", None),
+    "automation_last_run_success": (
+        GAUGE, "1 if the last run of each module succeeded", None),
+    "automation_http_requests_total": (
+        COUNTER, "HTTP requests by host, method and status code", None),
+    "automation_http_request_duration_seconds": (
+        HISTOGRAM, "HTTP request latency by host", DURATION_BUCKETS),
+    "automation_http_request_bytes": (
+        HISTOGRAM, "HTTP request body size by host", SIZE_BUCKETS),
+    "automation_http_response_bytes": (
+        HISTOGRAM, "HTTP response body size by host", SIZE_BUCKETS),
+}
+
+
+def _label_key(labels):
+    """Render labels the way they appear in the textfile, used as the storage key"""
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """Metrics recorded by this process since the last export"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        # Notifications still queued at the end of the run are sent at exit,
+        # this runs after the outbox drain so their requests are counted too
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        """Increase a counter"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Set a gauge"""
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Add a value to a histogram"""
+        buckets = METRICS[name][2]
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """
+        Time a stage of a run
+
+        Usage:
+            with metrics.timer("grocy_fetch"):
+                ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("automation_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+    def record_request(self, host, method, status, latency, sent, received):
+        """Record one HTTP request attempt, status is the status code or error"""
+        self.inc("automation_http_requests_total", host=host, method=method, status=status)
+        self.observe("automation_http_request_duration_seconds", latency, host=host)
+        self.observe("automation_http_request_bytes", sent, host=host)
+        self.observe("automation_http_response_bytes", received, host=host)
+
+    def record_run(self, run):
+        """Record the module results of a RunResult"""
+        now = time.time()
+        for name, result in run.modules.items():
+            self.inc("automation_module_runs_total", module=name, status=result.status)
+            self.observe("automation_module_duration_seconds", result.duration, module=name)
+            self.set("automation_last_run_timestamp_seconds", now, module=name)
+            self.set("automation_last_run_duration_seconds", round(result.duration, 3), module=name)
+            self.set("automation_last_run_success", 1 if result.success else 0, module=name)
+
+    def pending(self):
+        """Whether anything was recorded since the last export"""
+        with self._lock:
+            return bool(self.counters or self.gauges or self.histograms)
+
+    def _take(self):
+        """Return and clear what was recorded since the last export"""
+        with self._lock:
+            taken = {"counters": self.counters, "gauges": self.gauges, "histograms": self.histograms}
+            self._reset()
+        return taken
+
+    def export(self, hass_url=None, hass_token=None):
+        """
+        Add this run's metrics to the persisted totals and write the textfile
+
+        Args:
+            hass_url: Home Assistant URL, needed for metrics.ha_sensor
+            hass_token: Home Assistant token, needed for metrics.ha_sensor
+        """
+        if not config_manager.is_enabled('metrics.enabled'):
+            return
+
+        delta = self._take()
+        if not self._write(delta):
+            return
+
+        if config_manager.is_enabled('metrics.ha_sensor') and hass_url and hass_token:
+            self._push_sensor(hass_url, hass_token, delta)
+
+    def flush(self):
+        """Write what was recorded after the last export, without updating the sensor"""
+        if self.pending() and config_manager.is_enabled('metrics.enabled'):
+            self._write(self._take())
+
+    def _write(self, delta):
+        """
+        Merge delta into the persisted totals and rewrite the textfile
+
+        Returns:
+            bool: Success status
+        """
+        path = state_path("metrics.json")
+        try:
+            with file_lock(path):
+                totals = load_json(path, {}) or {}
+                _merge(totals, delta)
+                save_json(path, totals)
+            textfile = config_manager.get_config_value('metrics.textfile', None) or state_path("metrics.prom")
+            _write_textfile(textfile, render(totals))
+        except Exception as e:
+            logger.error(f"Error exporting metrics: {str(e)}")
+            return False
+        return True
+
+    def _push_sensor(self, hass_url, hass_token, delta):
+        """Publish the last run's stage timings as attributes of a Home Assistant sensor"""
+        # Imported here, the transport itself records into this module
+        from .transport import transport
+
+        entity_id = config_manager.get_config_value('metrics.sensor_entity', DEFAULT_SENSOR)
+        attributes = {"unit_of_measurement": "s", "friendly_name": "Python scripts run time"}
+        for key, histogram in delta["histograms"].get("automation_stage_duration_seconds", {}).items():
+            stage = key.split('"')[1]
+            attributes[f"{stage}_seconds"] = round(histogram["sum"], 3)
+        last_durations = delta["gauges"].get("automation_last_run_duration_seconds", {})
+        state = round(sum(last_durations.values()), 3)
+
+        try:
+            response = transport.post(
+                f"{hass_url}/api/states/{entity_id}",
+                headers={"Authorization": f"Bearer {hass_token}", "Content-Type": "application/json"},
+                json={"state": state, "attributes": attributes},
+            )
+            if response.status_code not in (200, 201):
+                logger.error(f"Error updating {entity_id}: {response.status_code} - {response.text}")
+        except Exception as e:
+            logger.error(f"Error updating {entity_id}: {str(e)}")
+
+
+def _merge(totals, delta):
+    """Add counters and histograms of delta to totals, replace gauges"""
+    for name, series in delta["counters"].items():
+        target = totals.setdefault("counters", {}).setdefault(name, {})
+        for key, value in series.items():
+            target[key] = target.get(key, 0) + value
+
+    for name, series in delta["gauges"].items():
+        totals.setdefault("gauges", {}).setdefault(name, {}).update(series)
+
+    for name, series in delta["histograms"].items():
+        target = totals.setdefault("histograms", {}).setdefault(name, {})
+        for key, histogram in series.items():
+            existing = target.get(key)
+            if existing is None or len(existing["buckets"]) != len(histogram["buckets"]):
+                target[key] = histogram
+                continue
+            existing["buckets"] = [a + b for a, b in zip(existing["buckets"], histogram["buckets"])]
+            existing["sum"] += histogram["sum"]
+            existing["count"] += histogram["count"]
+
+
+def _series(name, key, value, extra=None):
+    labels = ",".join(part for part in (key, extra) if part)
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+def render(totals):
+    """
+    Render metric totals in the Prometheus text format
+
+    Returns:
+        str: Textfile contents
+    """
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        section = {COUNTER: "counters", GAUGE: "gauges", HISTOGRAM: "histograms"}[kind]
+        series = totals.get(section, {}).get(name)
+        if not series:
+            continue
+
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(series.items()):
+            if kind != HISTOGRAM:
+                lines.append(_series(name, key, value))
+                continue
+            # Bucket counts are already cumulative, observe() counts every bound >= value
+            for bound, count in zip(buckets, value["buckets"]):
+                lines.append(_series(f"{name}_bucket", key, count, f'le="{bound}"'))
+            lines.append(_series(f"{name}_bucket", key, value["count"], 'le="+Inf"'))
+            lines.append(_series(f"{name}_sum", key, round(value["sum"], 6)))
+            lines.append(_series(f"{name}_count", key, value["count"]))
+    return "\n".join(lines) + "\n"
+
+
+def _write_textfile(path, text):
+    """Replace the textfile atomically, so the collector never reads a partial file"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Create a singleton instance
+metrics = MetricsRegistry()
@@ -3,16 +3,353 @@
 Notification system for Home Assistant automations
 Supports Telegram and could be extended to other notification methods
 """
-import requests
+import atexit
 import datetime
+import hashlib
 import os
 import logging
+import random
+import sqlite3
+import threading
+import time
 from .config_manager import config_manager
-from .logger import get_logger
+from .executor import report
+from .logger import LOG_DIR, get_logger
+from .metrics import metrics
+from .storage import state_path
+from .templates import TELEGRAM_MAX_LENGTH, split_message
+from .transport import transport
 
 # Set up logger
 logger = get_logger("notification")
 
+# Defaults used when feature_flags.yaml has no outbox settings.
+# Telegram allows about one message per second per chat and 20 per minute in groups.
+DEFAULT_NOTIFY_SERVICE = "kermode"
+DEFAULT_RATE_PER_MINUTE = 20
+DEFAULT_BURST = 3
+DEFAULT_COALESCE_WINDOW = 2.0
+DEFAULT_DEDUPE_WINDOW = 300
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_DRAIN_TIMEOUT = 30
+
+# Retry backoff bounds in seconds
+RETRY_BASE = 2.0
+RETRY_MAX = 300.0
+
+# Rows left in "sending" longer than this belong to a process that died
+CLAIM_TIMEOUT = 120
+
+
+class TokenBucket:
+    """Token bucket rate limiter"""
+    
+    def __init__(self, rate, capacity):
+        """
+        Initialize the bucket
+        
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self):
+        """Seconds until a token is available"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+    
+    def consume(self):
+        """Wait for a token and take it"""
+        delay = self.wait_time()
+        if delay > 0:
+            time.sleep(delay)
+            self._refill()
+        self.tokens -= 1
+
+
+class NotificationOutbox:
+    """
+    Persistent SQLite outbox for notifications
+    
+    Messages are acknowledged as soon as they are stored. A background thread
+    coalesces messages per chat that arrive within a short window, drops
+    repeats of the last message for a chat, sends within a token-bucket rate
+    limit and retries failures with exponential backoff. Anything not
+    delivered before the process exits stays in the database for the next run.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat TEXT NOT NULL,
+            message TEXT NOT NULL,
+            markdown INTEGER NOT NULL,
+            payload_hash TEXT NOT NULL,
+            hass_url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created REAL NOT NULL,
+            next_attempt REAL NOT NULL,
+            claimed_at REAL,
+            sent_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, next_attempt);
+        CREATE INDEX IF NOT EXISTS outbox_chat ON outbox (chat, id);
+        DROP INDEX IF EXISTS outbox_hash;
+    """
+    
+    def __init__(self, sender, db_path=None):
+        """
+        Initialize the outbox
+        
+        Args:
+            sender: Callable (hass_url, hass_token, chat, message, markdown) -> bool
+            db_path: SQLite database path, defaults to the state directory
+        """
+        self.sender = sender
+        self.db_path = db_path or state_path("notification_outbox.db")
+        self.coalesce_window = config_manager.get_config_value('notifications.coalesce_window', DEFAULT_COALESCE_WINDOW)
+        self.dedupe_window = config_manager.get_config_value('notifications.dedupe_window', DEFAULT_DEDUPE_WINDOW)
+        self.max_attempts = config_manager.get_config_value('notifications.max_attempts', DEFAULT_MAX_ATTEMPTS)
+        self.rate_per_minute = config_manager.get_config_value('notifications.rate_per_minute', DEFAULT_RATE_PER_MINUTE)
+        self.burst = config_manager.get_config_value('notifications.burst', DEFAULT_BURST)
+        
+        self.hass_token = None
+        self._buckets = {}
+        self._draining = False
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        
+        self._db = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._db.executescript(self.SCHEMA)
+            # Keep sent and failed rows only as long as they matter for dedupe
+            self._db.execute(
+                "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created < ?",
+                (time.time() - max(self.dedupe_window, 24 * 60 * 60),),
+            )
+    
+    def enqueue(self, chat, message, markdown, hass_url, hass_token):
+        """
+        Store a message for delivery
+        
+        Args:
+            chat: Notify service the message goes to
+            message: Message text
+            markdown: Whether to use markdown formatting
+            hass_url: Home Assistant URL
+            hass_token: Home Assistant token, kept in memory only
+            
+        Returns:
+            bool: True once the message is stored or repeats the last one for the chat
+        """
+        self.hass_token = hass_token
+        now = time.time()
+        payload_hash = hashlib.sha256(f"{chat}\0{int(markdown)}\0{message}".encode("utf-8")).hexdigest()
+        
+        with self._lock:
+            # Only a repeat of the last message for the chat is a duplicate, a
+            # message that went out in between (e.g. ON, OFF, ON) must be sent again
+            last = self._db.execute(
+                "SELECT payload_hash, created FROM outbox WHERE chat = ? AND status != 'failed' "
+                "ORDER BY id DESC LIMIT 1",
+                (chat,),
+            ).fetchone()
+            if last and last[0] == payload_hash and last[1] > now - self.dedupe_window:
+                logger.info("Dropping duplicate notification for %s", chat)
+                return True
+            
+            # Hold new messages for the coalesce window so later ones can join them
+            self._db.execute(
+                "INSERT INTO outbox (chat, message, markdown, payload_hash, hass_url, created, next_attempt) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chat, message, int(markdown), payload_hash, hass_url, now, now + self.coalesce_window),
+            )
+        
+        self._start()
+        self._wakeup.set()
+        return True
+    
+    def _start(self):
+        """Start the background delivery thread"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        """Deliver due messages until the process exits"""
+        while True:
+            try:
+                wait = self._deliver_due()
+            except Exception as e:
+                logger.error(f"Error delivering notifications: {str(e)}")
+                wait = RETRY_BASE
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+    
+    def _claim_due(self):
+        """
+        Mark due pending rows as being sent by this process
+        
+        Returns:
+            list: Claimed rows as (id, chat, message, markdown, hass_url, attempts) tuples
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE outbox SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+                    (now - CLAIM_TIMEOUT,),
+                )
+                # When draining, first attempts skip the coalesce hold
+                rows = self._db.execute(
+                    "SELECT id, chat, message, markdown, hass_url, attempts FROM outbox "
+                    "WHERE status = 'pending' AND (next_attempt <= ? OR (? AND attempts = 0)) ORDER BY id",
+                    (now, int(self._draining)),
+                ).fetchall()
+                if rows:
+                    self._db.executemany(
+                        "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                        [(now, row[0]) for row in rows],
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+    
+    def _deliver_due(self):
+        """
+        Send every due message, coalescing per chat
+        
+        Returns:
+            float: Seconds until the next pending message is due, or None if there is none
+        """
+        rows = self._claim_due()
+        if rows and not self.hass_token:
+            # Left over from a previous run, wait until a caller provides a token
+            self._release([row[0] for row in rows])
+            return None
+        
+        for batch in self._coalesce(rows):
+            self._send_batch(batch)
+        
+        with self._lock:
+            next_due = self._db.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'"
+            ).fetchone()[0]
+        if next_due is None:
+            return None
+        return max(0.0, next_due - time.time())
+    
+    @staticmethod
+    def _coalesce(rows):
+        """Group consecutive rows per chat and format into batches below the Telegram limit"""
+        batches = []
+        current = {}
+        for row in rows:
+            _, chat, message, markdown, hass_url, _ = row
+            key = (chat, markdown, hass_url)
+            batch = current.get(key)
+            if batch is not None and batch["length"] + 2 + len(message) <= TELEGRAM_MAX_LENGTH:
+                batch["rows"].append(row)
+                batch["length"] += 2 + len(message)
+            else:
+                batch = {"key": key, "rows": [row], "length": len(message)}
+                current[key] = batch
+                batches.append(batch)
+        return batches
+    
+    def _bucket(self, chat):
+        """Get the rate limiter for a chat"""
+        bucket = self._buckets.get(chat)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_per_minute / 60.0, self.burst)
+            self._buckets[chat] = bucket
+        return bucket
+    
+    def _send_batch(self, batch):
+        """Send one coalesced batch and record the outcome of its rows"""
+        chat, markdown, hass_url = batch["key"]
+        ids = [row[0] for row in batch["rows"]]
+        message = "\n\n".join(row[2] for row in batch["rows"])
+        if len(ids) > 1:
+            logger.info("Coalesced %d notifications for %s", len(ids), chat)
+        
+        self._bucket(chat).consume()
+        try:
+            success = self.sender(hass_url, self.hass_token, chat, message, bool(markdown))
+        except Exception as e:
+            logger.error(f"Exception sending notification: {str(e)}")
+            success = False
+        
+        now = time.time()
+        with self._lock:
+            if success:
+                self._db.executemany(
+                    "UPDATE outbox SET status = 'sent', sent_at = ? WHERE id = ?",
+                    [(now, row_id) for row_id in ids],
+                )
+                return
+            
+            for row in batch["rows"]:
+                attempts = row[5] + 1
+                if attempts >= self.max_attempts:
+                    logger.error("Giving up on notification %d after %d attempts", row[0], attempts)
+                    self._db.execute("UPDATE outbox SET status = 'failed', attempts = ? WHERE id = ?", (attempts, row[0]))
+                    continue
+                delay = min(RETRY_MAX, RETRY_BASE * (2 ** attempts)) * random.uniform(0.5, 1.0)
+                logger.warning("Notification %d failed, retrying in %.1fs", row[0], delay)
+                self._db.execute(
+                    "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt = ? WHERE id = ?",
+                    (attempts, now + delay, row[0]),
+                )
+    
+    def _release(self, ids):
+        """Return claimed rows to the pending state"""
+        with self._lock:
+            self._db.executemany("UPDATE outbox SET status = 'pending' WHERE id = ?", [(row_id,) for row_id in ids])
+    
+    def pending_count(self):
+        """Number of messages waiting to be sent"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+    
+    def drain(self, timeout=None):
+        """
+        Deliver pending messages now, waiting at most timeout seconds
+        
+        Returns:
+            bool: True if nothing is left pending
+        """
+        if timeout is None:
+            timeout = config_manager.get_config_value('notifications.drain_timeout', DEFAULT_DRAIN_TIMEOUT)
+        deadline = time.monotonic() + timeout
+        self._draining = True
+        try:
+            while True:
+                wait = self._deliver_due()
+                if wait is None:
+                    return self.pending_count() == 0
+                if time.monotonic() + wait > deadline:
+                    logger.warning("%d notifications left in the outbox for the next run", self.pending_count())
+                    return False
+                time.sleep(wait)
+        finally:
+            self._draining = False
+
 
 class NotificationManager:
     """Handles sending notifications through various channels"""
@@ -26,12 +363,12 @@ class NotificationManager:
         """
         self.hass_url = hass_url
         # Debug the config manager state
-        logger.debug(f"Config manager: {config_manager}")
+        logger.debug("Config manager: %s", config_manager)
         
         # Check if telegram is enabled, with debug logging
         try:
             self.telegram_enabled = config_manager.get_config_value('notifications.telegram_enabled', False)
-            logger.debug(f"Telegram enabled from config: {self.telegram_enabled}")
+            logger.debug("Telegram enabled from config: %s", self.telegram_enabled)
         except Exception as e:
             logger.error(f"Error getting telegram_enabled from config: {str(e)}")
             self.telegram_enabled = True  # Default to enabled if config fails
@@ -39,12 +376,17 @@ class NotificationManager:
         # Log to file setting
         try:
             self.log_to_file = config_manager.get_config_value('notifications.log_to_file', True)
-            logger.debug(f"Log to file from config: {self.log_to_file}")
+            logger.debug("Log to file from config: %s", self.log_to_file)
         except Exception as e:
             logger.error(f"Error getting log_to_file from config: {str(e)}")
             self.log_to_file = True  # Default to enabled if config fails
             
-        self.log_dir = "/config/www/logs"
+        self.log_dir = LOG_DIR
+        self.notify_service = config_manager.get_config_value('notifications.notify_service', DEFAULT_NOTIFY_SERVICE)
+        
+        # Outbox for queued delivery, created on first use
+        self.use_outbox = config_manager.get_config_value('notifications.outbox_enabled', True)
+        self._outbox = None
         
         # Create log directory if needed and using file logging
         if self.log_to_file and not os.path.exists(self.log_dir):
@@ -53,19 +395,34 @@ class NotificationManager:
             except Exception as e:
                 logger.error(f"Error creating notification log directory: {str(e)}")
     
-    def send_telegram(self, message, hass_token, markdown=True, title=None):
+    @property
+    def outbox(self):
+        """The notification outbox, created on first use"""
+        if self._outbox is None:
+            self._outbox = NotificationOutbox(self._post_telegram)
+            atexit.register(self._outbox.drain)
+        return self._outbox
+    
+    def send_telegram(self, message, hass_token, markdown=True, title=None, hass_url=None):
         """
         Send a message via Telegram using Home Assistant
         
+        With the outbox enabled the message is stored and sent in the
+        background, and the return value acknowledges the enqueue.
+        Messages longer than Telegram allows are sent as ordered chunks.
+        
         Args:
             message: The message to send
             hass_token: Long-lived access token for Home Assistant
             markdown: Whether to use markdown formatting
             title: Optional title for the message
+            hass_url: Home Assistant URL, defaults to the one the manager was created with
             
         Returns:
             bool: Success status
         """
+        hass_url = hass_url or self.hass_url
+        
         # Force enable telegram for now for debugging
         #self.telegram_enabled = True
         
@@ -84,39 +441,70 @@ class NotificationManager:
             if self.log_to_file:
                 self._log_notification("telegram", message)
             
+            # Lets sensors tell whether the module sent something new
+            report(message_hash=hashlib.sha256(message.encode("utf-8")).hexdigest()[:16])
+            
             # Add title if specified
             if title:
                 message = f"*{title}*\n\n{message}" if markdown else f"{title}\n\n{message}"
             
-            # Use the notify service
-            url = f"{self.hass_url}/api/services/notify/kermode"
-            headers = {
-                "Authorization": f"Bearer {hass_token}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "message": message
-            }
+            chunks = split_message(message)
+            if len(chunks) > 1:
+                logger.info(f"Splitting a {len(message)} character message into {len(chunks)} chunks")
             
-            # Add markdown parsing if enabled
-            if markdown:
-                data["data"] = {"parse_mode": "markdown"}
+            if self.use_outbox:
+                logger.info(f"Queueing Telegram notification: {message[:50]}...")
+                # The outbox sends rows in insertion order, so chunks arrive in order
+                queued = [
+                    self.outbox.enqueue(self.notify_service, chunk, markdown, hass_url, hass_token)
+                    for chunk in chunks
+                ]
+                return all(queued)
             
-            logger.info(f"Sending Telegram notification: {message[:50]}...")
-            response = requests.post(url, headers=headers, json=data, timeout=10)
-            
-            if response.status_code == 200:
-                logger.info("Telegram notification sent successfully")
-                return True
-            else:
-                logger.error(f"Error sending Telegram notification: {response.status_code} - {response.text}")
-                return False
+            # Chunks share the pooled connection to Home Assistant, stop at the
+            # first failure so the chat never shows a later chunk without an earlier one
+            for chunk in chunks:
+                if not self._post_telegram(hass_url, hass_token, self.notify_service, chunk, markdown):
+                    return False
+            return True
                 
         except Exception as e:
             logger.error(f"Exception sending Telegram notification: {str(e)}")
             return False
     
+    def _post_telegram(self, hass_url, hass_token, notify_service, message, markdown):
+        """
+        Post a message to the Home Assistant notify service
+        
+        Returns:
+            bool: Success status
+        """
+        # Use the notify service
+        url = f"{hass_url}/api/services/notify/{notify_service}"
+        headers = {
+            "Authorization": f"Bearer {hass_token}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "message": message
+        }
+        
+        # Add markdown parsing if enabled
+        if markdown:
+            data["data"] = {"parse_mode": "markdown"}
+        
+        logger.info(f"Sending Telegram notification: {message[:50]}...")
+        with metrics.timer("telegram_post"):
+            response = transport.post(url, headers=headers, json=data)
+        
+        if response.status_code == 200:
+            logger.info("Telegram notification sent successfully")
+            return True
+        else:
+            logger.error(f"Error sending Telegram notification: {response.status_code} - {response.text}")
+            return False
+    
     def _log_notification(self, channel, message):
         """
         Log a notification to file
@@ -136,11 +524,26 @@ class NotificationManager:
             logger.error(f"Error logging notification: {str(e)}")
 
 
-# Create a singleton instance
-notification_manager = NotificationManager()
+# The singleton instance is created on first use
+_notification_manager = None
+
+
+def get_notification_manager():
+    """Get the shared notification manager, creating it on first use"""
+    global _notification_manager
+    if _notification_manager is None:
+        _notification_manager = NotificationManager()
+    return _notification_manager
+
+
+def __getattr__(name):
+    """Keep notification_manager importable without creating it at import time"""
+    if name == "notification_manager":
+        return get_notification_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-def send_telegram(message, hass_token, markdown=True, title=None):
+def send_telegram(message, hass_token, markdown=True, title=None, hass_url=None):
     """
     Convenience function to send a Telegram message
     
@@ -149,16 +552,16 @@ def send_telegram(message, hass_token, markdown=True, title=None):
         hass_token: Home Assistant access token
         markdown: Whether to use markdown formatting
         title: Optional title for the message
+        hass_url: Home Assistant URL, defaults to http://localhost:8123
         
     Returns:
         bool: Success status
     """
     # For debugging/testing, force allow sending telegram messages
-    global notification_manager
-#    notification_manager.telegram_enabled = True
+#    get_notification_manager().telegram_enabled = True
 #    logger.info("Forcing telegram enabled for testing")
     
-    return notification_manager.send_telegram(message, hass_token, markdown, title)
+    return get_notification_manager().send_telegram(message, hass_token, markdown, title, hass_url)
 
 
 if __name__ == "__main__":
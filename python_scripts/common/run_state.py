@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Run-state file for Home Assistant automation scripts
+After every run the outcome of each module is written to a small JSON file,
+which the sensors in configuration.yaml read instead of scraping the logs
+
+{
+  "updated": "2025-01-31T13:08:02",
+  "modules": {
+    "grocy": {"last_run": "...", "duration": 1.2, "success": true,
+              "status": "success", "error": null, "chores": 4, "message_hash": "..."}
+  }
+}
+"""
+import datetime
+
+from .logger import get_logger
+from .storage import file_lock, load_json, save_json, state_path
+
+# Set up logger
+logger = get_logger("run_state")
+
+RUN_STATE_FILE = "run_state.json"
+
+
+def record_run(run):
+    """
+    Merge the module results of a run into the run-state file
+
+    Modules that were not part of this run keep their previous entry. The
+    file is replaced atomically, so a sensor never reads a partial file.
+
+    Args:
+        run: RunResult from the executor
+    """
+    path = state_path(RUN_STATE_FILE)
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    try:
+        with file_lock(path):
+            state = load_json(path, {}) or {}
+            modules = state.setdefault("modules", {})
+            for name, result in run.modules.items():
+                entry = {
+                    "last_run": now,
+                    "duration": round(result.duration, 3),
+                    "success": result.success,
+                    "status": result.status,
+                    "error": result.error,
+                }
+                entry.update(result.details)
+                modules[name] = entry
+            state["updated"] = now
+            save_json(path, state)
+    except Exception as e:
+        logger.error(f"Error writing run state: {str(e)}")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Persistent state storage for Home Assistant automation scripts
+Keeps files that must survive between runs in a single state directory
+"""
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+
+# AUTOMATION_STATE_DIR moves the state elsewhere, e.g. for the benchmarks
+STATE_DIR = os.environ.get("AUTOMATION_STATE_DIR", "/config/python_scripts/.state")
+
+
+def state_path(name):
+    """
+    Get the path of a file in the state directory, creating the directory if needed
+
+    Args:
+        name: File name inside the state directory
+
+    Returns:
+        str: Absolute path of the state file
+    """
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, name)
+
+
+def load_json(path, default=None):
+    """
+    Read a JSON state file
+
+    Args:
+        path: File path, usually from state_path()
+        default: Value returned if the file is missing or unreadable
+
+    Returns:
+        The decoded data, or default
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    """
+    Write a JSON state file atomically
+
+    The data is written to a temporary file in the same directory and moved
+    into place, so readers in other processes never see a partial file.
+
+    Args:
+        path: File path, usually from state_path()
+        data: JSON-serialisable data
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock across processes for a read-modify-write of a state file
+
+    Args:
+        path: State file to lock, the lock itself is taken on path + ".lock"
+    """
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
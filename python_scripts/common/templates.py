@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Message templates for Home Assistant automation scripts
+Templates are read from message_templates.yaml and compiled once into
+literal and field parts, so a message is rendered with a single join.
+Field values are escaped for Telegram Markdown, and long messages are split
+into ordered chunks below the Telegram size limit.
+"""
+import os
+import re
+import string
+import threading
+import time
+
+import yaml
+
+from .logger import get_logger
+
+# Set up logger
+logger = get_logger("templates")
+
+TEMPLATES_PATH = os.environ.get("AUTOMATION_MESSAGE_TEMPLATES", "/config/python_scripts/message_templates.yaml")
+
+# Seconds between checks of the file mtime, as for feature_flags.yaml
+RELOAD_CHECK_INTERVAL = 1.0
+
+# Telegram rejects longer messages
+TELEGRAM_MAX_LENGTH = 4096
+
+# Characters Telegram's Markdown parse mode treats as entity markers
+MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
+
+# Boundaries tried in order when a message has to be split
+SPLIT_SEPARATORS = ("\n\n", "\n", " ")
+
+# Templates used when message_templates.yaml is missing or lacks an entry
+DEFAULT_TEMPLATES = {
+    "grocy_chores": {
+        "markdown": True,
+        "empty": "✅ No chores scheduled for the next {days} days.",
+        "header": "📋 Upcoming chores for the next {days} days:",
+        "date": "*Data:* {date}",
+        "name": "*Chore name:* {name}",
+        "assigned_to": "*Assigned to:* {assigned_to}",
+        "location": "*Luogo di lavoro:* {location}",
+        "description": "*Description:* {description}",
+        "references": "*References:* {references}",
+        "equipment": "*Equipment:*\n{equipment}",
+        "equipment_none": "*Equipment:* None",
+        "section": "*{label}:* {content}",
+    },
+    "grocy_digest": {
+        "markdown": True,
+        "header": "🔄 Chore changes for the next {days} days:",
+        "added_header": "🆕 *New*",
+        "completed_header": "✅ *Done*",
+        "completed": "{name} ({date})",
+        "rescheduled_header": "📅 *Rescheduled*",
+        "rescheduled": "{name}: {old_date} → {date}",
+        "reassigned_header": "👤 *Reassigned*",
+        "reassigned": "{name}: {old_assigned_to} → {assigned_to}",
+        "removed_header": "🗑️ *No longer listed*",
+        "removed": "{name} ({date})",
+    },
+    "weather_forecast": {
+        "markdown": True,
+        "header": "{date}\n{days} Day ❄️ Low Temp Forecast",
+        "day": "{label}: {low}°C",
+    },
+    "shelly_caldaia": {
+        "markdown": True,
+        "title": "Caldaia Update",
+        "state_on": "Caldaia Shelly Relay - Now ON",
+        "state_off": "Caldaia Shelly Relay - Now OFF",
+        "burst": " ({summary})",
+    },
+}
+
+
+def escape_markdown(text):
+    """
+    Escape text for Telegram's Markdown parse mode
+
+    Args:
+        text: Plain text, e.g. a chore name
+
+    Returns:
+        str: Text that is shown as written instead of starting bold, italic, code or links
+    """
+    return MARKDOWN_SPECIAL.sub(r'\\\1', text)
+
+
+class MessageTemplate:
+    """A format string compiled into literal and field parts"""
+
+    _formatter = string.Formatter()
+
+    def __init__(self, source):
+        """
+        Compile a template
+
+        Args:
+            source: Format string with named fields, e.g. "*Chore name:* {name}"
+
+        Raises:
+            ValueError: If the template is malformed or uses positional fields
+        """
+        self.source = source
+        self._parts = []
+        for literal, field, spec, conversion in self._formatter.parse(source):
+            if field is not None and (not field or field.isdigit()):
+                raise ValueError(f"Template fields must be named: {source!r}")
+            self._parts.append((literal, field, spec, conversion))
+
+    def render(self, escape, values):
+        """
+        Fill in the fields
+
+        Args:
+            escape: Whether field values are escaped for Markdown
+            values: Dictionary of field values
+
+        Returns:
+            str: The rendered text
+        """
+        out = []
+        for literal, field, spec, conversion in self._parts:
+            out.append(literal)
+            if field is None:
+                continue
+            value = self._formatter.get_field(field, (), values)[0]
+            if conversion:
+                value = self._formatter.convert_field(value, conversion)
+            text = format(value, spec) if spec else str(value)
+            out.append(escape_markdown(text) if escape else text)
+        return "".join(out)
+
+
+class TemplateGroup:
+    """The compiled templates of one message type"""
+
+    def __init__(self, name, config):
+        """
+        Compile the templates of a group
+
+        Args:
+            name: Group name, e.g. "grocy_chores"
+            config: Template key -> format string, plus an optional "markdown" flag
+        """
+        self.name = name
+        self.markdown = bool(config.get("markdown", True))
+        self._templates = {}
+        defaults = DEFAULT_TEMPLATES.get(name, {})
+        for key, source in config.items():
+            if key == "markdown":
+                continue
+            try:
+                self._templates[key] = MessageTemplate(str(source))
+            except ValueError as e:
+                logger.error(f"Invalid template {name}.{key}, using the default: {str(e)}")
+                if key in defaults:
+                    self._templates[key] = MessageTemplate(defaults[key])
+
+    def render(self, key, **values):
+        """
+        Render one template of the group
+
+        Args:
+            key: Template key, e.g. "header"
+            **values: Field values
+
+        Returns:
+            str: The rendered text, with values escaped if the group uses Markdown
+        """
+        return self._templates[key].render(self.markdown, values)
+
+
+class MessageTemplates:
+    """Template groups from message_templates.yaml, reloaded when the file changes"""
+
+    def __init__(self, path=TEMPLATES_PATH):
+        """
+        Initialize the templates
+
+        Args:
+            path: Path to the templates YAML file
+        """
+        self.path = path
+        self._groups = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _file_mtime(self):
+        """Return the mtime of the templates file, or None if it is missing"""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self, mtime):
+        """Compile every group, file entries override the defaults per key"""
+        loaded = {}
+        if mtime is not None:
+            try:
+                with open(self.path, "r") as f:
+                    loaded = yaml.safe_load(f) or {}
+            except Exception as e:
+                logger.error(f"Error loading message templates: {str(e)}")
+
+        groups = {}
+        for name in set(DEFAULT_TEMPLATES) | set(loaded):
+            config = dict(DEFAULT_TEMPLATES.get(name, {}))
+            config.update(loaded.get(name) or {})
+            groups[name] = TemplateGroup(name, config)
+        self._groups = groups
+        self._mtime = mtime
+
+    def get(self, name):
+        """
+        Get the compiled templates of a message type
+
+        Args:
+            name: Group name, e.g. "grocy_chores"
+
+        Returns:
+            TemplateGroup: The compiled templates
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._groups is None or now >= self._next_check:
+                self._next_check = now + RELOAD_CHECK_INTERVAL
+                mtime = self._file_mtime()
+                if self._groups is None or mtime != self._mtime:
+                    self._load(mtime)
+            return self._groups[name]
+
+
+# Create a singleton instance
+message_templates = MessageTemplates()
+
+
+def get_templates(name):
+    """Convenience function to get a template group from the shared templates"""
+    return message_templates.get(name)
+
+
+def _split(text, limit, separators):
+    """Split text at the first separator that gives pieces within limit"""
+    if len(text) <= limit:
+        return [text]
+
+    if not separators:
+        # No boundary left, cut hard without separating an escape from its character
+        pieces = []
+        start = 0
+        while start < len(text):
+            end = min(start + limit, len(text))
+            if end < len(text) and text[end - 1] == "\\":
+                end -= 1
+            pieces.append(text[start:end])
+            start = end
+        return pieces
+
+    separator, rest = separators[0], separators[1:]
+    chunks = []
+    current = []
+    length = 0
+    for part in text.split(separator):
+        for piece in _split(part, limit, rest):
+            added = len(piece) + (len(separator) if current else 0)
+            if current and length + added > limit:
+                chunks.append(separator.join(current))
+                current = []
+                length = 0
+                added = len(piece)
+            current.append(piece)
+            length += added
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def split_message(message, limit=TELEGRAM_MAX_LENGTH):
+    """
+    Split a message into ordered chunks Telegram accepts
+
+    Messages are split between paragraphs where possible, then between
+    lines and words, so one chore or forecast day stays in one chunk.
+
+    Args:
+        message: Message text
+        limit: Maximum chunk length
+
+    Returns:
+        list: Chunks in sending order
+    """
+    return _split(message, limit, SPLIT_SEPARATORS)
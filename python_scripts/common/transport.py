@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP transport for Home Assistant automation scripts
+Keeps one pooled keep-alive session per base URL, retries transient failures
+with jittered backoff and counts latency and bytes per host
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config_manager import config_manager
+from .executor import check_cancelled
+from .logger import get_logger
+from .metrics import metrics
+
+# Set up logger
+logger = get_logger("transport")
+
+# Defaults used when feature_flags.yaml has no http section
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Connections kept open per base URL
+POOL_SIZE = 10
+
+# Responses worth retrying for idempotent requests
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class HostStats:
+    """Request counters for a single host"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self):
+        """Return the counters as a dictionary"""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "total_latency": round(self.total_latency, 3),
+            "max_latency": round(self.max_latency, 3),
+        }
+
+
+class HttpTransport:
+    """Pooled HTTP client shared by all service modules"""
+
+    def __init__(self):
+        """Initialize the transport with no open sessions"""
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _base_url(url):
+        """Return scheme://host[:port] for a URL"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, url):
+        """
+        Get the pooled session for the base URL of a request
+
+        Args:
+            url: Any URL on the target host
+
+        Returns:
+            requests.Session: Session with keep-alive connections to that host
+        """
+        base_url = self._base_url(url)
+        with self._lock:
+            session = self._sessions.get(base_url)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[base_url] = session
+                self._stats[base_url] = HostStats()
+                logger.debug("Opened pooled session for %s", base_url)
+            return session
+
+    def timeout_for(self, url):
+        """
+        Get the request timeout for a host
+
+        Per-host values come from http.host_timeouts in feature_flags.yaml,
+        keyed by "host:port" or "host"
+        """
+        parts = urlsplit(url)
+        host_timeouts = config_manager.get_config_value('http.host_timeouts', None) or {}
+        for key in (parts.netloc, parts.hostname):
+            if key in host_timeouts:
+                return host_timeouts[key]
+        return config_manager.get_config_value('http.timeout', DEFAULT_TIMEOUT)
+
+    @staticmethod
+    def _backoff(attempt):
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    def request(self, method, url, retries=None, idempotent=None, **kwargs):
+        """
+        Send a request through the pooled session for its host
+
+        Args:
+            method: HTTP method
+            url: Full request URL
+            retries: Retry budget for transient failures, defaults to http.retries
+            idempotent: Whether the request may be repeated after it reached the
+                        server. Defaults to True for GET/HEAD/OPTIONS/PUT/DELETE.
+                        Non-idempotent requests are only retried when the
+                        connection could not be established.
+            **kwargs: Passed on to requests (headers, json, params, timeout, ...)
+
+        Returns:
+            requests.Response: The final response
+
+        Raises:
+            requests.RequestException: If the last attempt failed
+            ModuleCancelled: If the calling module missed its deadline
+        """
+        method = method.upper()
+        if retries is None:
+            retries = config_manager.get_config_value('http.retries', DEFAULT_RETRIES)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout_for(url))
+
+        session = self.session(url)
+        stats = self._stats[self._base_url(url)]
+
+        attempt = 0
+        while True:
+            # Abandoned modules stop here instead of sending more requests
+            check_cancelled()
+            start = time.monotonic()
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self._record(stats, method, url, start, error=True)
+                retryable = isinstance(e, requests.ConnectTimeout) or (
+                    idempotent and isinstance(e, (requests.ConnectionError, requests.Timeout))
+                )
+                if not retryable or attempt >= retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("%s %s failed (%s), retrying in %.2fs", method, url, e.__class__.__name__, delay)
+            else:
+                self._record(stats, method, url, start, response=response)
+                if not (idempotent and response.status_code in RETRY_STATUS_CODES) or attempt >= retries:
+                    return response
+                delay = self._backoff(attempt)
+                logger.warning("%s %s returned %d, retrying in %.2fs", method, url, response.status_code, delay)
+
+            attempt += 1
+            with self._lock:
+                stats.retries += 1
+            time.sleep(delay)
+
+    def _record(self, stats, method, url, start, response=None, error=False):
+        """Update the counters and metrics for one attempt"""
+        latency = time.monotonic() - start
+        sent = 0
+        received = 0
+        if response is not None:
+            body = response.request.body if response.request is not None else None
+            sent = len(body) if body else 0
+            received = len(response.content)
+
+        with self._lock:
+            stats.requests += 1
+            stats.errors += 1 if error or (response is not None and response.status_code >= 400) else 0
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+        status = response.status_code if response is not None else "error"
+        metrics.record_request(urlsplit(url).netloc, method, status, latency, sent, received)
+
+    def get(self, url, **kwargs):
+        """Send a GET request"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request"""
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        """Return the counters per base URL"""
+        with self._lock:
+            return {base_url: stats.as_dict() for base_url, stats in self._stats.items()}
+
+    def log_stats(self):
+        """Log the counters per base URL"""
+        for base_url, stats in self.stats().items():
+            logger.info(
+                f"{base_url}: {stats['requests']} requests, {stats['errors']} errors, "
+                f"{stats['retries']} retries, {stats['bytes_sent']}B sent, "
+                f"{stats['bytes_received']}B received, {stats['total_latency']}s total latency"
+            )
+
+    def close(self):
+        """Close all pooled sessions"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# Create a singleton instance shared by all service modules
+transport = HttpTransport()
+
+
+def get(url, **kwargs):
+    """Convenience function to send a GET request through the shared transport"""
+    return transport.get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Convenience function to send a POST request through the shared transport"""
+    return transport.post(url, **kwargs)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Resident automation daemon for Home Assistant automation scripts
+Keeps the service modules loaded and runs jobs received over a Unix socket
+
+Only the standard library is imported here so that the thin client used by
+run.py can hand a job to the daemon without paying for requests/yaml imports.
+
+Protocol: one JSON object per line in each direction.
+    request:  {"mode": "grocy", "args": {...}}
+    response: {"success": true, "duration": 0.42}
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+
+DEFAULT_SOCKET_PATH = "/config/python_scripts/automation.sock"
+
+# Seconds to wait for the daemon to accept a connection before running locally
+CONNECT_TIMEOUT = 1.0
+
+# Seconds to wait for a job result once the daemon has accepted it
+RESPONSE_TIMEOUT = 300.0
+
+# Upper bound for a single request line
+MAX_REQUEST_SIZE = 1024 * 1024
+
+logger = logging.getLogger("daemon")
+
+
+def submit(job, socket_path=DEFAULT_SOCKET_PATH, connect_timeout=CONNECT_TIMEOUT,
+           timeout=RESPONSE_TIMEOUT):
+    """
+    Send a job to a running daemon and wait for its result
+
+    Args:
+        job: Job dictionary with "mode" and "args" keys
+        socket_path: Path of the daemon Unix socket
+        connect_timeout: Seconds to wait for the connection
+        timeout: Seconds to wait for the job result
+
+    Returns:
+        dict: Job result, or None if no daemon is listening
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(connect_timeout)
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            # Stale socket file or daemon not accepting, fall back to a local run
+            logger.info(f"Daemon not reachable at {socket_path}: {str(e)}")
+            return None
+
+        # From here on the job may already be running, so never fall back
+        try:
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps(job).encode("utf-8") + b"\n")
+
+            buffer = b""
+            while not buffer.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+
+            if not buffer:
+                return {"success": False, "error": "Daemon closed the connection without a result"}
+            return json.loads(buffer.decode("utf-8"))
+        except (OSError, ValueError) as e:
+            return {"success": False, "error": f"Error waiting for daemon result: {str(e)}"}
+    finally:
+        sock.close()
+
+
+class AutomationDaemon:
+    """Asyncio Unix socket server that dispatches jobs to a handler"""
+
+    def __init__(self, handler, socket_path=DEFAULT_SOCKET_PATH):
+        """
+        Initialize the daemon
+
+        Args:
+            handler: Callable taking a job dictionary and returning a result dictionary.
+                     It is run in the default executor so it may block.
+            socket_path: Path of the Unix socket to listen on
+        """
+        self.handler = handler
+        self.socket_path = socket_path
+        self.jobs_handled = 0
+        self.started = None
+        self._stop = None
+
+    async def _handle_connection(self, reader, writer):
+        """Read one job from a client, run it and write back the result"""
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+
+            try:
+                job = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                result = {"success": False, "error": f"Invalid job: {str(e)}"}
+            else:
+                result = await self._run_job(job)
+
+            writer.write(json.dumps(result).encode("utf-8") + b"\n")
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Error handling daemon connection: {str(e)}")
+        finally:
+            writer.close()
+
+    async def _run_job(self, job):
+        """Run a job in the executor and time it"""
+        mode = job.get("mode") if isinstance(job, dict) else None
+
+        if mode == "ping":
+            return {
+                "success": True,
+                "pid": os.getpid(),
+                "uptime": round(time.monotonic() - self.started, 3),
+                "jobs_handled": self.jobs_handled,
+            }
+
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(None, self.handler, job)
+        except Exception as e:
+            logger.error(f"Error running {mode} job: {str(e)}")
+            result = {"success": False, "error": str(e)}
+
+        self.jobs_handled += 1
+        result["duration"] = round(time.monotonic() - start, 3)
+        logger.info(f"Finished {mode} job in {result['duration']}s (success: {result.get('success')})")
+        return result
+
+    def _remove_socket(self):
+        """Remove the socket file if present"""
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    async def serve(self):
+        """Listen on the Unix socket until SIGTERM or SIGINT"""
+        # A previous daemon may have left its socket behind
+        if submit({"mode": "ping"}, self.socket_path) is not None:
+            raise RuntimeError(f"Another daemon is already listening on {self.socket_path}")
+        self._remove_socket()
+
+        self.started = time.monotonic()
+        self._stop = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._stop.set)
+
+        server = await asyncio.start_unix_server(
+            self._handle_connection, path=self.socket_path, limit=MAX_REQUEST_SIZE
+        )
+        # Jobs carry the Home Assistant token, keep the socket private
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Automation daemon listening on {self.socket_path} (pid {os.getpid()})")
+
+        try:
+            async with server:
+                await self._stop.wait()
+        finally:
+            self._remove_socket()
+            logger.info(f"Automation daemon stopped after {self.jobs_handled} jobs")
+
+
+def serve(handler, socket_path=DEFAULT_SOCKET_PATH):
+    """
+    Run the daemon in the foreground
+
+    Args:
+        handler: Callable taking a job dictionary and returning a result dictionary
+        socket_path: Path of the Unix socket to listen on
+    """
+    asyncio.run(AutomationDaemon(handler, socket_path).serve())
@@ -193,11 +193,44 @@ def list_weather_entities(hass_url, hass_token):
     except Exception as e:
         logger.error(f"Error listing weather entities: {str(e)}")
 
+def test_forecast_cache(hass_url, hass_token, entity_id="weather.openweathermap"):
+    """
+    Show the cached forecast and fetch one through the cache
+    
+    Uses the same cache as services/weather.py, so this does not call the
+    service again while the cached forecast is fresh.
+    
+    Args:
+        hass_url: Home Assistant URL
+        hass_token: Home Assistant long-lived access token
+        entity_id: Weather entity ID
+    """
+    logger.section("Testing forecast cache")
+    
+    try:
+        from services.weather import ForecastCache, forecast_cache, get_forecast_data
+        
+        cached, age = forecast_cache.get(ForecastCache.key(entity_id, "daily"))
+        if cached is None:
+            logger.info("No cached forecast")
+        else:
+            logger.info(f"Cached forecast is {age:.0f}s old")
+        
+        forecast_data = get_forecast_data(hass_url, hass_token, entity_id)
+        if forecast_data:
+            logger.info(f"✅ Got {len(forecast_data[entity_id]['forecast'])} forecast entries")
+        else:
+            logger.error("❌ No forecast available")
+            
+    except Exception as e:
+        logger.error(f"❌ Error testing forecast cache: {str(e)}")
+
+
 def main():
     """Main function to run tests based on command line arguments"""
     if len(sys.argv) < 2:
         print("Usage: weather_debug.py <hass_token> [entity_id] [test_type]")
-        print("  test_type: entity, service, list (default: all)")
+        print("  test_type: entity, service, cache, list (default: all)")
         return
     
     hass_token = sys.argv[1]
@@ -221,6 +254,9 @@ def main():
     if test_type == "service" or test_type == "all":
         test_forecast_service(hass_url, hass_token, entity_id)
         
+    if test_type == "cache" or test_type == "all":
+        test_forecast_cache(hass_url, hass_token, entity_id)
+        
     if test_type == "list" or test_type == "all":
         list_weather_entities(hass_url, hass_token)
         
@@ -7,7 +7,7 @@ import requests
 import datetime
 import sys
 import json
-import re
+from common.description_parser import parse_description
 
 # Set up basic debugging
 DEBUG = True
@@ -59,42 +59,8 @@ def send_notification(message, hass_url="http://localhost:8123", hass_token=None
 
 def extract_sections(description):
     """Extract sections from description using --- delimiters"""
-    if not description:
-        return {"main": "None", "references": "None", "equipment": "None"}
-    
-    sections = {"main": "None", "references": "None", "equipment": "None"}
-    
-    # Log the raw description for debugging
-    log_debug(f"Raw description:\n{description}")
-    
-    # Split by "---" lines to get the distinct sections
-    parts = re.split(r'\n\s*---\s*\n', description)
-    log_debug(f"Split description into {len(parts)} parts")
-    
-    # First section is the main description (it might have leading ---)
-    if len(parts) > 0:
-        main_desc = parts[0].strip()
-        if main_desc.startswith("---"):
-            main_desc = main_desc[3:].strip()
-        if main_desc:
-            sections["main"] = main_desc
-    
-    # Extract references section (second part, after "References:" label)
-    if len(parts) > 1 and "References:" in parts[1]:
-        references_part = parts[1].split("References:", 1)[1].strip()
-        sections["references"] = references_part if references_part else "None"
-    
-    # Extract equipment section (third part, after "Equipment:" label)
-    if len(parts) > 2:
-        if "Equipment:" in parts[2]:
-            equipment_part = parts[2].split("Equipment:", 1)[1].strip()
-            sections["equipment"] = equipment_part if equipment_part else "None"
-    
-    # Debug output for each section
-    for section_name, content in sections.items():
-        log_debug(f"Extracted {section_name} section: {content}")
-    
-    return sections
+    # Shared with services/grocy.py, unchanged descriptions come from the cache
+    return parse_description(description)
 
 def main():
     """Main function to fetch chores and send notifications"""
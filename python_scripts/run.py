@@ -5,16 +5,24 @@ Loads feature flags and runs enabled modules
 """
 import sys
 import argparse
+import importlib
+import time
 import traceback
 import os
 import logging
 
+# Reference point for --profile-startup
+PROCESS_START = time.perf_counter()
+
+LOG_DIR = os.environ.get("AUTOMATION_LOG_DIR", "/config/www/logs")
+MAIN_LOG = f"{LOG_DIR}/main.log"
+
 # Create logs directory if it doesn't exist
-os.makedirs("/config/www/logs", exist_ok=True)
+os.makedirs(LOG_DIR, exist_ok=True)
 
 # Configure basic logging first thing
 logging.basicConfig(
-    filename="/config/www/logs/main.log",
+    filename=MAIN_LOG,
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
@@ -31,37 +39,106 @@ if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
     logging.info(f"Added {current_dir} to sys.path")
 
-# Now import the modules
-try:
-    # First import the common modules
-    from common.logger import get_logger
-    from common.config_manager import config_manager
-    from common.notification import send_telegram
+import daemon
+
+# Common and service modules are imported on demand, only for the selected
+# mode, so that handing a job to a running daemon does not pay for them
+logger = None
+
+# Mode -> (module, entry point) of the service it runs
+SERVICE_ENTRY_POINTS = {
+    "grocy": ("services.grocy", "notify_chores"),
+    "weather": ("services.weather", "process_weather_data"),
+    "device": ("services.devices", "notify_shelly_caldaia_status"),
+    "monitor": ("services.device_monitor", "run_monitor"),
+}
+
+# Seconds spent importing or initialising each step, for --profile-startup
+startup_timings = {}
+
+
+def timed_step(name, func):
+    """Run func once and record how long it took under name"""
+    start = time.perf_counter()
+    value = func()
+    startup_timings.setdefault(name, time.perf_counter() - start)
+    return value
+
+def load_modules():
+    """Import the common modules needed to run jobs in-process"""
+    global logger, config_manager, executor, transport, run_state, metrics
+
+    if logger is not None:
+        return
+
+    try:
+        config_manager = timed_step("common.config_manager",
+                                    lambda: importlib.import_module("common.config_manager").config_manager)
+        logger_module = timed_step("common.logger", lambda: importlib.import_module("common.logger"))
+        get_logger = logger_module.get_logger
+        # From here on main.log is written by the background log writer
+        logger_module.route_root_logger(MAIN_LOG)
+        transport = timed_step("common.transport", lambda: importlib.import_module("common.transport").transport)
+        executor = timed_step("common.executor", lambda: importlib.import_module("common.executor"))
+        run_state = timed_step("common.run_state", lambda: importlib.import_module("common.run_state"))
+        metrics = timed_step("common.metrics", lambda: importlib.import_module("common.metrics").metrics)
+        
+        # Create logger for this module
+        run_logger = timed_step("run logger", lambda: get_logger("run"))
+        timed_step("run logger setup", lambda: run_logger.info("Successfully imported common modules"))
+        logger = run_logger
+    except ImportError as e:
+        logging.error(f"Import error: {str(e)}")
+        logging.error(f"Traceback: {traceback.format_exc()}")
+        raise
+
+def load_service(mode):
+    """
+    Import the service module for a mode
+    
+    Returns:
+        callable: The service entry point
+    """
+    module_name, entry_point = SERVICE_ENTRY_POINTS[mode]
+    module = timed_step(module_name, lambda: importlib.import_module(module_name))
+    return getattr(module, entry_point)
+
+def report_startup(print_report=False):
+    """
+    Log the time spent importing and initialising each step
+    
+    A warning is logged when the total exceeds runner.startup_budget seconds
     
-    # Create logger for this module
-    logger = get_logger("run")
+    Args:
+        print_report: Also print the report to stdout (--profile-startup)
+    """
+    total = sum(startup_timings.values())
+    lines = [f"  {name:<28} {duration * 1000:8.1f} ms" for name, duration in startup_timings.items()]
+    lines.append(f"  {'total':<28} {total * 1000:8.1f} ms")
+    report = "Startup profile:\n" + "\n".join(lines)
     
-    # Then import the service modules
-    from services.grocy import notify_chores
-    from services.weather import process_weather_data
-    from services.devices import monitor_device_change, notify_shelly_caldaia_status
+    if print_report:
+        print(report)
+        logger.info(report)
+    else:
+        logger.debug(report)
     
-    logger.info("Successfully imported all modules")
-except ImportError as e:
-    logging.error(f"Import error: {str(e)}")
-    logging.error(f"Traceback: {traceback.format_exc()}")
-    raise
+    budget = config_manager.get_config_value('runner.startup_budget', None)
+    if budget and total > budget:
+        logger.warning(f"Startup took {total:.3f}s, over the {budget}s budget")
 
-def parse_arguments():
+def parse_arguments(argv=None):
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description="Run Home Assistant automations")
     
     # Add the mode argument
-    parser.add_argument("--mode", choices=["grocy", "weather", "device", "all"],
-                        help="Automation mode to run", required=True)
+    parser.add_argument("--mode", choices=["grocy", "weather", "device", "all", "monitor", "serve"],
+                        help="Automation mode to run, 'monitor' to watch devices over the websocket API "
+                             "or 'serve' to start the resident daemon",
+                        required=True)
     
     # Common arguments
-    parser.add_argument("--hass-token", help="Home Assistant token", required=True)
+    parser.add_argument("--hass-token", help="Home Assistant token")
     parser.add_argument("--hass-url", help="Home Assistant URL", default="http://localhost:8123")
     
     # Grocy-specific arguments
@@ -75,7 +152,27 @@ def parse_arguments():
     parser.add_argument("--device-entity", help="Device entity ID")
     parser.add_argument("--device-state", help="Device state (on/off)")
     
-    return parser.parse_args()
+    # Deadline for each module in --mode all, overrides runner.deadlines
+    parser.add_argument("--deadline", type=float,
+                        help="Seconds each module may run in 'all' mode before it is cancelled")
+    
+    # Report import and initialisation time per module
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print the time spent importing and initialising each module")
+    
+    # Daemon arguments
+    parser.add_argument("--socket", help="Unix socket of the automation daemon",
+                        default=daemon.DEFAULT_SOCKET_PATH)
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Run in this process even if a daemon is listening")
+    
+    args = parser.parse_args(argv)
+    
+    # The daemon receives the token with each job
+    if args.mode != "serve" and not args.hass_token:
+        parser.error("--hass-token is required")
+    
+    return args
 
 def run_grocy(args):
     """Run the Grocy module"""
@@ -88,6 +185,7 @@ def run_grocy(args):
         return False
     
     logger.section("Running Grocy Module")
+    notify_chores = load_service("grocy")
     return notify_chores(args.grocy_url, args.grocy_api_key, args.hass_token, args.hass_url)
 
 def run_weather(args):
@@ -97,6 +195,7 @@ def run_weather(args):
         return False
     
     logger.section("Running Weather Module")
+    process_weather_data = load_service("weather")
     return process_weather_data(args.hass_url, args.hass_token, args.weather_entity)
 
 def run_device(args):
@@ -110,42 +209,178 @@ def run_device(args):
         return False
     
     logger.section("Running Device Module")
+    notify_shelly_caldaia_status = load_service("device")
+    
+    # The monitor already reacts to the same state change
+    if importlib.import_module("services.devices").monitor_connected():
+        logger.info("Device monitor is connected, leaving the notification to it")
+        return True
+    
     return notify_shelly_caldaia_status(args.hass_url, args.hass_token, args.device_entity, args.device_state)
 
+MODULE_RUNNERS = {
+    "grocy": ("grocy.enabled", run_grocy),
+    "weather": ("weather.enabled", run_weather),
+    "device": ("devices.enabled", run_device),
+}
+
+def run_all(args):
+    """
+    Run all enabled modules concurrently
+    
+    Each module gets its own deadline from --deadline or runner.deadlines in
+    feature_flags.yaml, so one slow server does not hold up the others.
+    
+    Returns:
+        RunResult: Per-module status and timings
+    """
+    # Import the enabled services up front so the threads do not race on imports
+    for name, (flag, _) in MODULE_RUNNERS.items():
+        if config_manager.is_enabled(flag):
+            load_service(name)
+    
+    modules = {}
+    for name, (flag, runner) in MODULE_RUNNERS.items():
+        # Disabled modules are reported as skipped
+        modules[name] = (lambda runner=runner: runner(args)) if config_manager.is_enabled(flag) else None
+    
+    default_deadline = config_manager.get_config_value('runner.default_deadline', executor.DEFAULT_DEADLINE)
+    deadlines = dict(config_manager.get_config_value('runner.deadlines', None) or {})
+    if args.deadline:
+        default_deadline = args.deadline
+        deadlines = {}
+    
+    return executor.run_concurrently(modules, deadlines, default_deadline)
+
+def run_mode(args):
+    """
+    Run the selected automation in this process
+    
+    Returns:
+        RunResult: Per-module status and timings
+    """
+    load_modules()
+    logger.info(f"Running in {args.mode} mode")
+    
+    # Run the selected mode
+    if args.mode in MODULE_RUNNERS:
+        _, runner = MODULE_RUNNERS[args.mode]
+        result = executor.run_inline(args.mode, lambda: runner(args))
+    elif args.mode == "all":
+        result = run_all(args)
+    else:
+        logger.error(f"Unknown mode: {args.mode}")
+        result = executor.RunResult()
+        result.add(executor.ModuleResult(args.mode, executor.STATUS_ERROR, error="Unknown mode"))
+    
+    report_startup(args.profile_startup)
+    transport.log_stats()
+    logger.info(f"Run summary:\n{result.summary()}")
+    run_state.record_run(result)
+    metrics.record_run(result)
+    metrics.export(args.hass_url, args.hass_token)
+    
+    if result.success:
+        logger.info(f"Successfully completed {args.mode} automation")
+    else:
+        logger.error(f"Failed to complete {args.mode} automation")
+    
+    return result
+
+def handle_job(job):
+    """
+    Run a job received by the daemon
+    
+    Args:
+        job: Dictionary with the "mode" and the remaining CLI arguments under "args"
+        
+    Returns:
+        dict: Result with the success status
+    """
+    job_args = dict(job.get("args") or {})
+    job_args["mode"] = job.get("mode")
+    
+    if job_args["mode"] not in ("grocy", "weather", "device", "all"):
+        return {"success": False, "error": f"Unknown mode: {job_args['mode']}"}
+    
+    # Start from the CLI defaults for anything the client did not send
+    args = parse_arguments(["--mode", "serve"])
+    for key, value in job_args.items():
+        if hasattr(args, key):
+            setattr(args, key, value)
+    
+    try:
+        return run_mode(args).as_dict()
+    except Exception as e:
+        logger.error(f"Error running {args.mode} job: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return {"success": False, "error": str(e)}
+
+def monitor(args):
+    """Watch devices over the Home Assistant websocket API until stopped"""
+    load_modules()
+    run_monitor = load_service("monitor")
+    report_startup(args.profile_startup)
+    return 0 if run_monitor(args.hass_url, args.hass_token, args.device_entity) else 1
+
+def serve(args):
+    """Start the resident daemon with the service modules preloaded"""
+    load_modules()
+    for mode in SERVICE_ENTRY_POINTS:
+        load_service(mode)
+    report_startup(args.profile_startup)
+    logger.section("Starting Automation Daemon")
+    daemon.serve(handle_job, args.socket)
+    return 0
+
+def submit_to_daemon(args):
+    """
+    Hand the job to a running daemon
+    
+    Returns:
+        dict: Job result, or None if the job must run in this process
+    """
+    if args.no_daemon:
+        return None
+    
+    job_args = {key: value for key, value in vars(args).items()
+                if key not in ("mode", "socket", "no_daemon", "profile_startup")}
+    result = daemon.submit({"mode": args.mode, "args": job_args}, args.socket)
+    
+    if result is not None:
+        logging.info(f"{args.mode} job handled by daemon: {result}")
+        if not result.get("success"):
+            print(f"Daemon job failed: {result.get('error', 'see daemon logs')}", file=sys.stderr)
+    return result
+
 def main():
     """Main function to run the selected automation"""
     try:
         # Parse arguments
         args = parse_arguments()
-        logger.info(f"Running in {args.mode} mode")
+        startup_timings["run.py bootstrap"] = time.perf_counter() - PROCESS_START
         
-        # Run the selected mode
-        if args.mode == "grocy":
-            success = run_grocy(args)
-        elif args.mode == "weather":
-            success = run_weather(args)
-        elif args.mode == "device":
-            success = run_device(args)
-        elif args.mode == "all":
-            # Run all enabled modules
-            grocy_success = run_grocy(args) if config_manager.is_enabled('grocy.enabled') else True
-            weather_success = run_weather(args) if config_manager.is_enabled('weather.enabled') else True
-            device_success = run_device(args) if config_manager.is_enabled('devices.enabled') else True
-            success = grocy_success and weather_success and device_success
-        else:
-            logger.error(f"Unknown mode: {args.mode}")
-            success = False
+        if args.mode == "serve":
+            return serve(args)
         
-        if success:
-            logger.info(f"Successfully completed {args.mode} automation")
-        else:
-            logger.error(f"Failed to complete {args.mode} automation")
+        # Long-running, so never handed to the daemon
+        if args.mode == "monitor":
+            return monitor(args)
         
-        return 0 if success else 1
+        # Prefer the resident daemon, it already has everything loaded
+        result = submit_to_daemon(args)
+        if result is not None:
+            return 0 if result.get("success") else 1
+        
+        return 0 if run_mode(args).success else 1
         
     except Exception as e:
-        logger.error(f"Error running automation: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        if logger is None:
+            logging.error(f"Error running automation: {str(e)}")
+            logging.error(f"Traceback: {traceback.format_exc()}")
+        else:
+            logger.error(f"Error running automation: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
         return 1
 
 if __name__ == "__main__":
@@ -32,6 +32,10 @@ elif [[ "$MODE" == "weather" ]]; then
   LOG_FILE="$LOG_DIR/weather_run.log"
 elif [[ "$MODE" == "device" ]]; then
   LOG_FILE="$LOG_DIR/device_run.log"
+elif [[ "$MODE" == "monitor" ]]; then
+  LOG_FILE="$LOG_DIR/device_monitor_run.log"
+elif [[ "$MODE" == "serve" ]]; then
+  LOG_FILE="$LOG_DIR/daemon.log"
 else
   LOG_FILE="$LOG_DIR/automation_run.log"
 fi
@@ -1,11 +1,33 @@
 """
 Service modules for Home Assistant automation
+Service modules are imported on first access, so running one mode does not
+load the others
 """
-# Import specific functions for easier access
-# Change from relative imports to absolute imports
-from common import get_logger, send_telegram, config_manager
-
-# Now import and expose the service functions
-from services.grocy import notify_chores
-from services.weather import process_weather_data
-from services.devices import monitor_device_change, notify_shelly_caldaia_status
\ No newline at end of file
+import importlib
+
+# Public name -> module that provides it
+_EXPORTS = {
+    "get_logger": "common",
+    "send_telegram": "common",
+    "config_manager": "common",
+    "notify_chores": "services.grocy",
+    "process_weather_data": "services.weather",
+    "monitor_device_change": "services.devices",
+    "notify_shelly_caldaia_status": "services.devices",
+    "run_monitor": "services.device_monitor",
+}
+
+
+def __getattr__(name):
+    """Import the module providing name on first access"""
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Change-aware chore digests for Grocy
+Keeps a compact snapshot of the chores in the last notification, keyed by
+chore id, and works out what was added, completed, rescheduled,
+reassigned or removed since then, so unchanged chore lists are not sent again
+"""
+import datetime
+import time
+from dataclasses import dataclass, field
+
+from common import get_logger, config_manager
+from common.storage import file_lock, load_json, save_json, state_path
+
+# Set up logger
+logger = get_logger("chore_digest")
+
+# Bump when the snapshot layout changes, older snapshots are then ignored
+SNAPSHOT_VERSION = 2
+
+# Days after which the full list is sent again even without changes
+DEFAULT_FULL_DIGEST_DAYS = 7
+
+
+def chore_key(chore):
+    """Snapshot key of a chore, its Grocy id or its name for chores without one"""
+    chore_id = chore.get("id")
+    return str(chore_id) if chore_id is not None else f"name:{chore.get('name')}"
+
+
+def snapshot_entry(chore):
+    """Compact form of a chore kept in the snapshot"""
+    return {
+        "name": chore["name"],
+        "due": chore["due"],
+        "assigned_to": chore["assigned_to"],
+        "last_tracked": chore.get("last_tracked"),
+    }
+
+
+def was_done(entry, chore, today):
+    """
+    Whether a chore still in the window was done since the snapshot
+
+    Recurring chores do not leave the window when done, Grocy moves their
+    due date forward instead.
+
+    Args:
+        entry: Snapshot entry of the chore
+        chore: Current chore dictionary
+        today: Current date
+
+    Returns:
+        bool: True if the chore was tracked since the last notification
+    """
+    if entry["last_tracked"] != chore["last_tracked"]:
+        return True
+    # Without a tracking time, a due date moved from today or earlier to a later day
+    return chore["last_tracked"] is None and entry["due"] <= today.isoformat() < chore["due"]
+
+
+@dataclass
+class ChoreChanges:
+    """Differences between the last notified chores and the current ones"""
+
+    # Chore dictionaries new in the window
+    added: list = field(default_factory=list)
+    # Snapshot entries of chores that were done, recurring ones stay in the window
+    completed: list = field(default_factory=list)
+    # (snapshot entry, chore) pairs whose due date moved
+    rescheduled: list = field(default_factory=list)
+    # (snapshot entry, chore) pairs with a new assignee
+    reassigned: list = field(default_factory=list)
+    # Snapshot entries of chores no longer listed, e.g. deleted, unassigned
+    # or moved out of the window, without a sign that they were done
+    removed: list = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.completed or self.rescheduled or self.reassigned or self.removed)
+
+    def counts(self):
+        """Number of changes of each kind"""
+        return {
+            "added": len(self.added),
+            "completed": len(self.completed),
+            "rescheduled": len(self.rescheduled),
+            "reassigned": len(self.reassigned),
+            "removed": len(self.removed),
+        }
+
+
+def diff_chores(previous, chores, today):
+    """
+    Compare the snapshot of the last notification with the current chores
+
+    Args:
+        previous: Snapshot entries keyed by chore_key()
+        chores: Chore dictionaries from get_upcoming_chores()
+        today: Current date, chores that fell due before it left the window
+               with time and are not reported as removed
+
+    Returns:
+        ChoreChanges: What changed
+    """
+    changes = ChoreChanges()
+    current_keys = set()
+    for chore in chores:
+        key = chore_key(chore)
+        current_keys.add(key)
+        entry = previous.get(key)
+        if entry is None:
+            changes.added.append(chore)
+            continue
+        if was_done(entry, chore, today):
+            changes.completed.append(entry)
+        elif entry["due"] != chore["due"]:
+            changes.rescheduled.append((entry, chore))
+        elif entry["assigned_to"] != chore["assigned_to"]:
+            changes.reassigned.append((entry, chore))
+
+    first_day = today.isoformat()
+    for key, entry in previous.items():
+        # Missing chores are not known to be done, only that they left the list
+        if key not in current_keys and entry["due"] >= first_day:
+            changes.removed.append(entry)
+    return changes
+
+
+class ChoreDigest:
+    """Snapshot of the last notified chores, persisted as JSON"""
+
+    def __init__(self, path=None):
+        """
+        Initialize the digest
+
+        Args:
+            path: JSON file the snapshot is kept in, defaults to the state directory
+        """
+        self._path = path
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = state_path("chore_digest.json")
+        return self._path
+
+    def lock(self):
+        """Hold the snapshot for a compare, send and save across processes"""
+        return file_lock(self.path)
+
+    def _load(self):
+        data = load_json(self.path)
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+            return None
+        return data
+
+    def changes(self, chores, today=None):
+        """
+        Work out what to send for the current chores
+
+        Args:
+            chores: Chore dictionaries from get_upcoming_chores()
+            today: Current date, defaults to today
+
+        Returns:
+            ChoreChanges: The changes to send (empty if nothing changed), or
+                          None if the full list should be sent
+        """
+        if not config_manager.is_enabled('grocy.change_digest'):
+            return None
+
+        snapshot = self._load()
+        if snapshot is None:
+            logger.info("No chore snapshot yet, sending the full list")
+            return None
+
+        full_days = config_manager.get_config_value('grocy.full_digest_days', DEFAULT_FULL_DIGEST_DAYS)
+        if full_days and time.time() - snapshot.get("full_sent", 0) >= full_days * 24 * 60 * 60:
+            logger.info(f"Full chore list last sent over {full_days} days ago, sending it again")
+            return None
+
+        changes = diff_chores(snapshot.get("chores", {}), chores, today or datetime.date.today())
+        logger.info(f"Chore changes since the last notification: {changes.counts()}")
+        return changes
+
+    def save(self, chores, full):
+        """
+        Remember the chores that were just notified
+
+        Args:
+            chores: Chore dictionaries that were sent
+            full: Whether the full list was sent
+        """
+        previous = self._load() or {}
+        try:
+            save_json(self.path, {
+                "version": SNAPSHOT_VERSION,
+                "sent": time.time(),
+                "full_sent": time.time() if full else previous.get("full_sent", 0),
+                "chores": {chore_key(chore): snapshot_entry(chore) for chore in chores},
+            })
+        except Exception as e:
+            logger.error(f"Error saving chore snapshot: {str(e)}")
+
+
+# Create a singleton instance
+chore_digest = ChoreDigest()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Event-stream device monitor for Home Assistant
+Keeps one websocket subscription to state_changed events open and passes
+changes of watched entities to their handler in the same process, instead
+of spawning run.py --mode device for every relay flip
+"""
+import asyncio
+import json
+import os
+import random
+import signal
+import sys
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    # Installed with Home Assistant, only needed by the monitor mode
+    aiohttp = None
+
+from common import get_logger, config_manager
+from common.storage import save_json, state_path
+from services.devices import (
+    MONITOR_HEARTBEAT_INTERVAL,
+    MONITOR_STATUS_FILE,
+    get_state_snapshot,
+    notify_shelly_caldaia_status,
+)
+
+# Set up logger
+logger = get_logger("device_monitor")
+
+# Reconnect backoff bounds in seconds
+RECONNECT_BASE = 1.0
+RECONNECT_MAX = 60.0
+
+# Seconds between websocket pings, so a dead connection is noticed
+HEARTBEAT = 30
+
+
+def handle_shelly_caldaia(hass_url, hass_token, entity_id, old_state, new_state):
+    """Notify about a Shelly Caldaia relay switching on or off"""
+    if new_state not in ("on", "off"):
+        logger.info(f"Ignoring {entity_id} state {new_state}")
+        return False
+    return notify_shelly_caldaia_status(hass_url, hass_token, entity_id, new_state)
+
+
+# Handler name -> callable (hass_url, hass_token, entity_id, old_state, new_state)
+HANDLERS = {
+    "shelly_caldaia": handle_shelly_caldaia,
+}
+
+
+def build_dispatch_table(extra_entities=None, snapshot=None):
+    """
+    Map watched entity ids to their handlers
+
+    Entities come from devices.monitor_entities in feature_flags.yaml
+    ({entity_id or pattern: handler name}) plus extra_entities. Patterns such
+    as "switch.shelly_*" are expanded against the state snapshot.
+
+    Args:
+        extra_entities: Optional dictionary of entity id to handler name
+        snapshot: StateSnapshot used to expand patterns and check entities
+
+    Returns:
+        dict: Entity id -> handler callable
+    """
+    configured = dict(config_manager.get_config_value('devices.monitor_entities', None) or {})
+    configured.update(extra_entities or {})
+
+    dispatch = {}
+    for pattern, handler_name in configured.items():
+        handler = HANDLERS.get(handler_name)
+        if handler is None:
+            logger.error(f"Unknown device handler {handler_name} for {pattern}")
+            continue
+
+        if snapshot is None:
+            entity_ids = [pattern]
+        else:
+            entity_ids = snapshot.match(pattern)
+            if not entity_ids:
+                logger.warning(f"No entities match {pattern}")
+
+        for entity_id in entity_ids:
+            dispatch[entity_id] = handler
+    return dispatch
+
+
+def websocket_url(hass_url):
+    """Websocket API URL for a Home Assistant URL"""
+    if hass_url.startswith("https://"):
+        return "wss://" + hass_url[len("https://"):].rstrip("/") + "/api/websocket"
+    return "ws://" + hass_url[len("http://"):].rstrip("/") + "/api/websocket"
+
+
+class DeviceMonitor:
+    """Websocket client that dispatches state changes to device handlers"""
+
+    def __init__(self, hass_url, hass_token, dispatch, extra_entities=None):
+        """
+        Initialize the monitor
+
+        Args:
+            hass_url: Home Assistant URL
+            hass_token: Home Assistant long-lived access token
+            dispatch: Entity id -> handler, from build_dispatch_table()
+            extra_entities: Extra entities passed to build_dispatch_table() on reconnects
+        """
+        self.hass_url = hass_url
+        self.hass_token = hass_token
+        self.dispatch = dispatch
+        self.extra_entities = extra_entities
+        self.events_seen = 0
+        self.events_handled = 0
+        self._message_id = 0
+
+    def _write_status(self, connected):
+        """Tell one-shot device runs whether state changes are handled here"""
+        try:
+            save_json(state_path(MONITOR_STATUS_FILE),
+                      {"pid": os.getpid(), "connected": connected, "heartbeat": time.time()})
+        except Exception as e:
+            logger.error(f"Error writing monitor status: {str(e)}")
+
+    async def _heartbeat(self):
+        """Keep the connected status fresh while subscribed"""
+        while True:
+            self._write_status(True)
+            await asyncio.sleep(MONITOR_HEARTBEAT_INTERVAL)
+
+    def _refresh_dispatch(self):
+        """Expand the entity patterns again, so entities added meanwhile are watched"""
+        snapshot = get_state_snapshot(self.hass_url, self.hass_token, max_age=0)
+        if snapshot is None:
+            logger.warning("Could not fetch states, keeping the watched entities")
+            return
+        dispatch = build_dispatch_table(self.extra_entities, snapshot)
+        if dispatch:
+            self.dispatch = dispatch
+
+    def _next_id(self):
+        self._message_id += 1
+        return self._message_id
+
+    @staticmethod
+    async def _receive_json(ws):
+        """
+        Receive a JSON message during the handshake
+
+        Raises:
+            ConnectionError: If the connection closed instead, e.g. when Home Assistant restarts
+        """
+        msg = await ws.receive()
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            raise ConnectionError(f"Websocket {msg.type.name.lower()} during the handshake")
+        return json.loads(msg.data)
+
+    async def _authenticate(self, ws):
+        """Run the websocket auth handshake"""
+        message = await self._receive_json(ws)
+        if message.get("type") != "auth_required":
+            raise ConnectionError(f"Unexpected first message: {message.get('type')}")
+
+        await ws.send_json({"type": "auth", "access_token": self.hass_token})
+        message = await self._receive_json(ws)
+        if message.get("type") != "auth_ok":
+            # A bad token will not get better by retrying
+            raise PermissionError(f"Authentication failed: {message.get('message', message.get('type'))}")
+        logger.info(f"Authenticated with Home Assistant {message.get('ha_version', '')}")
+
+    async def _subscribe(self, ws):
+        """Subscribe to state_changed events"""
+        request_id = self._next_id()
+        await ws.send_json({"id": request_id, "type": "subscribe_events", "event_type": "state_changed"})
+        message = await self._receive_json(ws)
+        if not message.get("success"):
+            raise ConnectionError(f"Subscription failed: {message.get('error')}")
+        logger.info(f"Watching {len(self.dispatch)} entities: {', '.join(sorted(self.dispatch))}")
+
+    def _on_event(self, event):
+        """
+        Pick out state changes of watched entities
+
+        Returns:
+            tuple: (handler, entity_id, old_state, new_state), or None to ignore the event
+        """
+        data = event.get("data") or {}
+        handler = self.dispatch.get(data.get("entity_id"))
+        if handler is None:
+            return None
+
+        old_state = (data.get("old_state") or {}).get("state")
+        new_state = (data.get("new_state") or {}).get("state")
+        # Attribute-only updates keep the same state
+        if old_state == new_state:
+            return None
+        return handler, data["entity_id"], old_state, new_state
+
+    async def _listen(self, ws):
+        """Dispatch events until the connection closes"""
+        loop = asyncio.get_running_loop()
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                if msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+                continue
+
+            message = json.loads(msg.data)
+            if message.get("type") != "event":
+                continue
+
+            self.events_seen += 1
+            change = self._on_event(message.get("event") or {})
+            if change is None:
+                continue
+
+            handler, entity_id, old_state, new_state = change
+            logger.info(f"{entity_id} changed from {old_state} to {new_state}")
+            self.events_handled += 1
+            # Handlers use blocking HTTP, keep them off the event loop
+            loop.run_in_executor(None, self._run_handler, handler, entity_id, old_state, new_state)
+
+    def _run_handler(self, handler, entity_id, old_state, new_state):
+        try:
+            handler(self.hass_url, self.hass_token, entity_id, old_state, new_state)
+        except Exception as e:
+            logger.error(f"Handler for {entity_id} raised: {str(e)}")
+
+    async def run(self):
+        """Stay subscribed, reconnecting with backoff, until cancelled"""
+        attempt = 0
+        reconnect = False
+        loop = asyncio.get_running_loop()
+        async with aiohttp.ClientSession() as session:
+            while True:
+                if reconnect:
+                    # Blocking HTTP, keep it off the event loop
+                    await loop.run_in_executor(None, self._refresh_dispatch)
+                reconnect = True
+                try:
+                    async with session.ws_connect(websocket_url(self.hass_url), heartbeat=HEARTBEAT) as ws:
+                        await self._authenticate(ws)
+                        await self._subscribe(ws)
+                        attempt = 0
+                        heartbeat = asyncio.create_task(self._heartbeat())
+                        try:
+                            await self._listen(ws)
+                        finally:
+                            # One-shot runs notify again until the subscription is back
+                            heartbeat.cancel()
+                            self._write_status(False)
+                    logger.warning("Websocket closed by Home Assistant")
+                except PermissionError:
+                    raise
+                except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning(f"Websocket error: {str(e)}")
+
+                delay = random.uniform(0, min(RECONNECT_MAX, RECONNECT_BASE * (2 ** attempt)))
+                attempt += 1
+                logger.info(f"Reconnecting in {delay:.1f}s ({self.events_handled}/{self.events_seen} events handled so far)")
+                await asyncio.sleep(delay)
+
+
+async def _run_until_stopped(monitor):
+    """Run the monitor until SIGTERM or SIGINT"""
+    task = asyncio.create_task(monitor.run())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def run_monitor(hass_url, hass_token, device_entity=None):
+    """
+    Run the device monitor in the foreground until interrupted
+
+    Args:
+        hass_url: Home Assistant URL
+        hass_token: Home Assistant long-lived access token
+        device_entity: Optional Shelly Caldaia entity id to watch in addition to the configured ones
+
+    Returns:
+        bool: False if the monitor could not run
+    """
+    if not config_manager.is_enabled('devices.enabled'):
+        logger.info("Device monitoring is disabled in configuration")
+        return False
+
+    if aiohttp is None:
+        logger.error("The device monitor needs aiohttp, which is not installed")
+        return False
+
+    # One request to expand patterns and check that the entities exist
+    snapshot = get_state_snapshot(hass_url, hass_token)
+    extra_entities = {device_entity: "shelly_caldaia"} if device_entity else None
+    dispatch = build_dispatch_table(extra_entities, snapshot)
+    if not dispatch:
+        logger.error("No entities to monitor, set devices.monitor_entities or --device-entity")
+        return False
+
+    logger.section("Device Monitor")
+    status_path = state_path(MONITOR_STATUS_FILE)
+
+    try:
+        asyncio.run(_run_until_stopped(DeviceMonitor(hass_url, hass_token, dispatch, extra_entities)))
+        logger.info("Device monitor stopped")
+    except PermissionError as e:
+        logger.error(str(e))
+        return False
+    finally:
+        try:
+            os.unlink(status_path)
+        except OSError:
+            pass
+    return True
+
+
+def main():
+    """Main function when run as a script"""
+    if len(sys.argv) < 2:
+        error_msg = "⚠️ Not enough arguments. Usage: device_monitor.py <hass_token> [entity_id]"
+        logger.error(error_msg)
+        print(error_msg)
+        return
+
+    hass_token = sys.argv[1]
+    device_entity = sys.argv[2] if len(sys.argv) > 2 else None
+    run_monitor("http://localhost:8123", hass_token, device_entity)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,207 @@
 Devices monitoring service for Home Assistant
 Currently handles Shelly relay status notifications
 """
-import requests
+import fnmatch
+import os
 import sys
+import threading
+import time
 from common import get_logger, send_telegram, config_manager
+from common.executor import report
+from common.storage import file_lock, load_json, save_json, state_path
+from common.templates import get_templates
+from common.transport import transport
 
 # Set up logger
 logger = get_logger("devices")
 
+# Written by the device monitor (services/device_monitor.py) while it runs
+MONITOR_STATUS_FILE = "device_monitor.json"
+
+# Seconds between status updates of a connected monitor
+MONITOR_HEARTBEAT_INTERVAL = 15
+
+# Older status means the monitor is stuck, e.g. killed without cleaning up
+MONITOR_HEARTBEAT_MAX_AGE = 3 * MONITOR_HEARTBEAT_INTERVAL
+
+
+def monitor_connected():
+    """
+    Check whether the websocket device monitor is subscribed to state changes
+    
+    A monitor that is running but reconnecting does not count, state changes
+    in that window would otherwise not be notified at all.
+    
+    Returns:
+        bool: True if another live process reported a connected monitor recently
+    """
+    status = load_json(state_path(MONITOR_STATUS_FILE))
+    if not isinstance(status, dict) or not status.get("connected"):
+        return False
+    if time.time() - status.get("heartbeat", 0) > MONITOR_HEARTBEAT_MAX_AGE:
+        return False
+    try:
+        pid = int(status.get("pid"))
+        os.kill(pid, 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return pid != os.getpid()
+
+
+# Defaults used when feature_flags.yaml has no snapshot settings
+DEFAULT_SNAPSHOT_TTL = 10
+
+# Defaults used when feature_flags.yaml has no debounce settings
+DEFAULT_DEBOUNCE_QUIET = 5
+DEFAULT_DEBOUNCE_MAX_WINDOW = 60
+
+# Characters that make an entity id a glob pattern
+GLOB_CHARS = "*?["
+
+
+class StateSnapshot:
+    """All entity states from one /api/states call, indexed by entity id and domain"""
+    
+    def __init__(self, states):
+        """
+        Build the index
+        
+        Args:
+            states: List of state objects from /api/states
+        """
+        self.fetched = time.monotonic()
+        self.by_id = {}
+        self.by_domain = {}
+        for state in states:
+            entity_id = state.get("entity_id")
+            if not entity_id:
+                continue
+            self.by_id[entity_id] = state
+            self.by_domain.setdefault(entity_id.split(".", 1)[0], []).append(entity_id)
+    
+    @property
+    def age(self):
+        """Seconds since the snapshot was fetched"""
+        return time.monotonic() - self.fetched
+    
+    def get(self, entity_id):
+        """Full state object of an entity, or None"""
+        return self.by_id.get(entity_id)
+    
+    def state(self, entity_id):
+        """State string of an entity, or None"""
+        state = self.by_id.get(entity_id)
+        return state.get("state") if state else None
+    
+    def domain(self, domain):
+        """Entity ids of a domain"""
+        return list(self.by_domain.get(domain, ()))
+    
+    def match(self, pattern):
+        """
+        Entity ids matching an exact id, a prefix ending in "*" or a glob
+        
+        Only the domain named in the pattern is scanned, so "switch.shelly_*"
+        never looks at sensors.
+        
+        Args:
+            pattern: e.g. "switch.shelly_caldaia", "switch.shelly_*" or "*.shelly_?"
+            
+        Returns:
+            list: Matching entity ids
+        """
+        if not any(char in pattern for char in GLOB_CHARS):
+            return [pattern] if pattern in self.by_id else []
+        
+        domain, _, rest = pattern.partition(".")
+        if any(char in domain for char in GLOB_CHARS):
+            candidates = self.by_id
+        else:
+            candidates = self.by_domain.get(domain, ())
+        
+        # Plain prefixes are the common case and need no pattern matching
+        prefix = pattern[:-1]
+        if pattern.endswith("*") and not any(char in prefix for char in GLOB_CHARS):
+            return [entity_id for entity_id in candidates if entity_id.startswith(prefix)]
+        return fnmatch.filter(candidates, pattern)
+    
+    def states(self, patterns):
+        """
+        States of every entity matching any of the patterns
+        
+        Returns:
+            dict: Entity id -> state string
+        """
+        result = {}
+        for pattern in patterns:
+            for entity_id in self.match(pattern):
+                result[entity_id] = self.by_id[entity_id].get("state")
+        return result
+
+
+# Snapshot of the current run, reused while younger than devices.snapshot_ttl
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_state_snapshot(hass_url, hass_token, max_age=None):
+    """
+    Get every entity state with a single request
+    
+    Args:
+        hass_url: Home Assistant URL
+        hass_token: Home Assistant long-lived access token
+        max_age: Seconds a previous snapshot may be reused, defaults to devices.snapshot_ttl
+        
+    Returns:
+        StateSnapshot: The snapshot, or None on failure
+    """
+    global _snapshot
+    if max_age is None:
+        max_age = config_manager.get_config_value('devices.snapshot_ttl', DEFAULT_SNAPSHOT_TTL)
+    
+    with _snapshot_lock:
+        if _snapshot is not None and _snapshot.age < max_age:
+            return _snapshot
+        
+        try:
+            url = f"{hass_url}/api/states"
+            headers = {
+                "Authorization": f"Bearer {hass_token}",
+                "Content-Type": "application/json"
+            }
+            
+            response = transport.get(url, headers=headers)
+            if response.status_code != 200:
+                logger.error(f"Error fetching states: {response.status_code} - {response.text}")
+                return None
+            
+            _snapshot = StateSnapshot(response.json())
+            logger.info(f"Fetched states of {len(_snapshot.by_id)} entities")
+            return _snapshot
+            
+        except Exception as e:
+            logger.error(f"Exception getting states: {str(e)}")
+            return None
+
+
+def get_device_states(hass_url, hass_token, patterns):
+    """
+    Get the states of many devices with one request
+    
+    Args:
+        hass_url: Home Assistant URL
+        hass_token: Home Assistant long-lived access token
+        patterns: Entity ids, prefixes ending in "*" or globs
+        
+    Returns:
+        dict: Entity id -> state, empty on failure
+    """
+    snapshot = get_state_snapshot(hass_url, hass_token)
+    if snapshot is None:
+        return {}
+    return snapshot.states(patterns)
+
 
 def get_device_state(hass_url, hass_token, entity_id):
     """
@@ -23,6 +217,14 @@ def get_device_state(hass_url, hass_token, entity_id):
     Returns:
         str: Current state or None on failure
     """
+    # A fresh snapshot from this run already has it
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.age < config_manager.get_config_value('devices.snapshot_ttl', DEFAULT_SNAPSHOT_TTL):
+        state = snapshot.state(entity_id)
+        if state is not None:
+            logger.info(f"Device {entity_id} is {state}")
+            return state
+    
     try:
         url = f"{hass_url}/api/states/{entity_id}"
         headers = {
@@ -30,8 +232,8 @@ def get_device_state(hass_url, hass_token, entity_id):
             "Content-Type": "application/json"
         }
         
-        logger.debug(f"Fetching state for {entity_id}")
-        response = requests.get(url, headers=headers, timeout=10)
+        logger.debug("Fetching state for %s", entity_id)
+        response = transport.get(url, headers=headers)
         
         if response.status_code == 200:
             state_data = response.json()
@@ -47,6 +249,131 @@ def get_device_state(hass_url, hass_token, entity_id):
         return None
 
 
+class SettledChange:
+    """Outcome of a debounced burst of state changes for one entity"""
+    
+    def __init__(self, entity_id, state, transitions, duration):
+        self.entity_id = entity_id
+        self.state = state
+        self.transitions = transitions
+        self.duration = duration
+    
+    def summary(self):
+        """Short note on the burst, empty for a single change"""
+        if self.transitions <= 1:
+            return ""
+        return f"{self.transitions} changes in {self.duration:.0f}s"
+
+
+class DeviceDebouncer:
+    """
+    Per-entity debounce and coalescing of state changes
+    
+    Each change is recorded in a state file shared by every process, then the
+    caller waits for the quiet period. Only the caller holding the latest
+    change reports the burst, with its final state and number of changes,
+    and only if the final state differs from the last notified one, so
+    on->off->on within the window sends nothing. A burst longer than the
+    maximum window is reported anyway, so a device that never settles is
+    not silenced.
+    """
+    
+    def __init__(self, path=None):
+        """
+        Initialize the debouncer
+        
+        Args:
+            path: JSON file with the per-entity state, defaults to the state directory
+        """
+        self.path = path
+    
+    def _file(self):
+        if self.path is None:
+            self.path = state_path("device_debounce.json")
+        return self.path
+    
+    def record(self, entity_id, state):
+        """
+        Record a state change
+        
+        Returns:
+            int: Sequence number of this change, used by settle()
+        """
+        path = self._file()
+        now = time.time()
+        with file_lock(path):
+            entities = load_json(path, {})
+            entry = entities.setdefault(entity_id, {"notified_state": None, "sequence": 0})
+            if not entry.get("pending_since"):
+                entry["pending_since"] = now
+                entry["transitions"] = 0
+            entry["sequence"] += 1
+            entry["transitions"] += 1
+            entry["pending_state"] = state
+            entry["changed_at"] = now
+            save_json(path, entities)
+            return entry["sequence"]
+    
+    def settle(self, entity_id, sequence, force=False):
+        """
+        Close the burst if this change is still the latest one
+        
+        Args:
+            entity_id: Entity ID
+            sequence: Value returned by record()
+            force: Close the burst even if a later change exists
+            
+        Returns:
+            SettledChange: The change to notify about, or None if there is nothing to send
+        """
+        path = self._file()
+        now = time.time()
+        with file_lock(path):
+            entities = load_json(path, {})
+            entry = entities.get(entity_id)
+            if not entry or not entry.get("pending_since"):
+                return None
+            
+            max_window = config_manager.get_config_value('devices.debounce_max_window', DEFAULT_DEBOUNCE_MAX_WINDOW)
+            superseded = entry["sequence"] != sequence
+            if superseded and not force and now - entry["pending_since"] < max_window:
+                # The caller holding the later change reports the burst
+                return None
+            
+            change = SettledChange(entity_id, entry["pending_state"], entry["transitions"],
+                                   entry["changed_at"] - entry["pending_since"])
+            previous = entry.get("notified_state")
+            entry["pending_since"] = None
+            entry["transitions"] = 0
+            if change.state == previous:
+                save_json(path, entities)
+                logger.info(f"{entity_id} is back to {previous} after {change.transitions} changes, not notifying")
+                return None
+            
+            entry["notified_state"] = change.state
+            entry["notified_at"] = now
+            save_json(path, entities)
+            return change
+    
+    def debounce(self, entity_id, state):
+        """
+        Record a change, wait for the quiet period and settle
+        
+        Returns:
+            SettledChange: The change to notify about, or None
+        """
+        quiet = config_manager.get_config_value('devices.debounce_quiet', DEFAULT_DEBOUNCE_QUIET)
+        sequence = self.record(entity_id, state)
+        if quiet:
+            logger.info(f"Waiting {quiet}s for {entity_id} to settle")
+            time.sleep(quiet)
+        return self.settle(entity_id, sequence)
+
+
+# Create a singleton instance
+debouncer = DeviceDebouncer()
+
+
 def notify_shelly_caldaia_status(hass_url, hass_token, entity_id, state=None):
     """
     Send notification about Shelly Caldaia relay status
@@ -75,15 +402,24 @@ def notify_shelly_caldaia_status(hass_url, hass_token, entity_id, state=None):
             logger.error(f"Unable to determine state for {entity_id}")
             return False
         
+        # Coalesce a chattering relay into one notification
+        change = debouncer.debounce(entity_id, state)
+        if change is None:
+            logger.info(f"No notification needed for {entity_id}")
+            return True
+        state = change.state
+        report(state=state, transitions=change.transitions)
+        
         # Format message based on state
-        title = "Caldaia Update"
-        if state == "on":
-            message = "Caldaia Shelly Relay - Now ON"
-        else:
-            message = "Caldaia Shelly Relay - Now OFF"
+        templates = get_templates("shelly_caldaia")
+        parts = [templates.render("state_on" if state == "on" else "state_off")]
+        if change.summary():
+            parts.append(templates.render("burst", summary=change.summary()))
+        message = "".join(parts)
         
         # Send notification
-        success = send_telegram(message, hass_token, title=title)
+        success = send_telegram(message, hass_token, markdown=templates.markdown,
+                                title=templates.render("title"), hass_url=hass_url)
         
         if success:
             logger.info(f"Sent Shelly Caldaia status notification: {message}")
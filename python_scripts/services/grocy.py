@@ -3,63 +3,200 @@
 Grocy integration module for Home Assistant
 Fetches chores and sends notifications
 """
-import requests
 import datetime
 import json
-import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from common import get_logger, send_telegram, config_manager
+from common.description_parser import DescriptionSections, description_cache, parse_description
+from common.executor import in_current_module, report
+from common.metrics import metrics
+from common.templates import get_templates
+from services.chore_digest import chore_digest
+from common.transport import transport
 
 # Set up logger
 logger = get_logger("grocy")
 
 
-def extract_sections(description):
+def window_filters(today, future_date):
     """
-    Extract sections from description using --- delimiters
+    Grocy query filters selecting chores due between today and future_date
     
     Args:
-        description: Raw description text with sections
+        today: First day of the range
+        future_date: Last day of the range
         
     Returns:
-        dict: Dictionary with extracted sections
+        list: Values for the query[] parameter of /api/chores
     """
-    if not description:
-        return {"main": "None", "references": "None", "equipment": "None"}
-    
-    sections = {"main": "None", "references": "None", "equipment": "None"}
-    
-    # Log the raw description for debugging
-    logger.debug(f"Raw description:\n{description}")
-    
-    # Split by "---" lines to get the distinct sections
-    parts = re.split(r'\n\s*---\s*\n', description)
-    logger.debug(f"Split description into {len(parts)} parts")
-    
-    # First section is the main description (it might have leading ---)
-    if len(parts) > 0:
-        main_desc = parts[0].strip()
-        if main_desc.startswith("---"):
-            main_desc = main_desc[3:].strip()
-        if main_desc:
-            sections["main"] = main_desc
-    
-    # Extract references section (second part, after "References:" label)
-    if len(parts) > 1 and "References:" in parts[1]:
-        references_part = parts[1].split("References:", 1)[1].strip()
-        sections["references"] = references_part if references_part else "None"
-    
-    # Extract equipment section (third part, after "Equipment:" label)
-    if len(parts) > 2:
-        if "Equipment:" in parts[2]:
-            equipment_part = parts[2].split("Equipment:", 1)[1].strip()
-            sections["equipment"] = equipment_part if equipment_part else "None"
-    
-    # Debug output for each section
-    for section_name, content in sections.items():
-        logger.debug(f"Extracted {section_name} section: {content}")
-    
-    return sections
+    # The >= condition is broken before Grocy 3.3.1, so use > against the end of the previous day
+    day_before = today - datetime.timedelta(days=1)
+    day_after = future_date + datetime.timedelta(days=1)
+    return [
+        f"next_estimated_execution_time>{day_before} 23:59:59",
+        f"next_estimated_execution_time<{day_after}",
+    ]
+
+
+def filter_window(chores_data, today, future_date):
+    """
+    Keep the chores due between today and future_date
+    
+    Grocy dates start with YYYY-MM-DD whether they use a space or a "T"
+    before the time, so the date prefix is compared as a string and no
+    row is parsed. This is the fallback for servers that ignore query
+    filters and is cheap enough to also run on already filtered data.
+    
+    Args:
+        chores_data: Items from /api/chores
+        today: First day of the range
+        future_date: Last day of the range
+        
+    Returns:
+        list: Chores due in the range, in their original order
+    """
+    first = today.isoformat()
+    last = future_date.isoformat()
+    return [
+        chore for chore in chores_data or []
+        if first <= (chore.get("next_estimated_execution_time") or "")[:10] <= last
+    ]
+
+
+def format_due_date(due):
+    """Readable due date used in messages, e.g. Sunday, Oct 18"""
+    return due.strftime("%A, %b %d")
+
+
+def join_chores(chores_data, objects_data, today, future_date):
+    """
+    Join the chore overview with the chore objects in a single pass
+    
+    The objects are indexed by id once, so each upcoming chore finds its
+    details with a dictionary lookup. Dates and descriptions are only parsed
+    for chores that fall within the date range.
+    
+    Args:
+        chores_data: Items from /api/chores (next execution and assignee)
+        objects_data: Items from /api/objects/chores (description and userfields)
+        today: First day of the range
+        future_date: Last day of the range
+        
+    Returns:
+        list: Upcoming chores with details, in overview order
+    """
+    # Grocy returns ids as numbers or strings depending on the version
+    details_by_id = {str(chore.get("id")): chore for chore in objects_data or []}
+    
+    upcoming_chores = []
+    for chore in filter_window(chores_data, today, future_date):
+        try:
+            chore_date = datetime.date.fromisoformat(chore["next_estimated_execution_time"][:10])
+        except Exception as e:
+            logger.error(f"Error processing chore date for {chore.get('chore_name', 'Unknown')}: {str(e)}")
+            continue
+        
+        logger.info(f"Found upcoming chore: {chore.get('chore_name', 'Unknown')}")
+        
+        # Extract assigned user
+        assigned_to = chore.get("next_execution_assigned_user", {})
+        assigned_name = assigned_to.get("display_name", "Unassigned") if isinstance(assigned_to, dict) else "Unassigned"
+        
+        upcoming = {
+            "id": chore.get("chore_id"),
+            "name": chore.get("chore_name", "Unknown chore"),
+            "due": chore_date.isoformat(),
+            # Format due date to be more readable
+            "date": format_due_date(chore_date),
+            "assigned_to": assigned_name,
+            "last_tracked": chore.get("last_tracked_time") or None,
+            "description": "",
+            "userfields": None,
+            "sections": DescriptionSections()
+        }
+        
+        details = details_by_id.get(str(chore.get("chore_id")))
+        if details is not None:
+            sections = parse_description(details.get("description", ""))
+            # For the message, use only the main section
+            upcoming["description"] = sections.main
+            upcoming["userfields"] = details.get("userfields")
+            upcoming["sections"] = sections
+            logger.debug("Added details for chore %s", upcoming['name'])
+        
+        upcoming_chores.append(upcoming)
+    
+    return upcoming_chores
+
+
+def _fetch_json(url, headers, query_filters=None):
+    """
+    Fetch a Grocy endpoint
+    
+    Args:
+        url: Endpoint URL
+        headers: Request headers
+        query_filters: Optional values for the query[] parameter
+        
+    Returns:
+        list: Decoded response, or None if the request failed
+    """
+    logger.info(f"Fetching chores from: {url}")
+    params = {"query[]": query_filters} if query_filters else None
+    response = transport.get(url, headers=headers, params=params)
+    
+    if response.status_code != 200:
+        logger.error(f"Error fetching {url}: {response.status_code} - {response.text}")
+        return None
+    
+    data = response.json()
+    logger.info(f"Found {len(data)} items from {url}")
+    return data
+
+
+def _fetch_filtered(base_url, headers, today, future_date):
+    """
+    Fetch only the chores due in the window and their objects
+    
+    Returns:
+        tuple: (chores_data, objects_data), or None if Grocy rejected the filters
+    """
+    chores_data = _fetch_json(f"{base_url}/api/chores", headers, window_filters(today, future_date))
+    if chores_data is None:
+        return None
+    
+    # Servers that ignore the filters return every chore, so filter here too
+    chores_data = filter_window(chores_data, today, future_date)
+    ids = sorted({str(chore["chore_id"]) for chore in chores_data if chore.get("chore_id") is not None})
+    if not ids:
+        return chores_data, []
+    
+    objects_data = _fetch_json(f"{base_url}/api/objects/chores", headers, [f"id§^({'|'.join(ids)})$"])
+    return chores_data, objects_data
+
+
+def _fetch_all(base_url, headers):
+    """
+    Fetch every chore and every chore object in parallel
+    
+    Returns:
+        tuple: (chores_data, objects_data)
+    """
+    # The chore base data is fetched on a second thread while the
+    # overview with next execution dates is fetched here
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        objects_future = pool.submit(
+            in_current_module(_fetch_json), f"{base_url}/api/objects/chores", headers
+        )
+        chores_data = _fetch_json(f"{base_url}/api/chores", headers)
+        try:
+            objects_data = objects_future.result()
+        except Exception as e:
+            # Chores are still reported without their details
+            logger.error(f"Error fetching chore details: {str(e)}")
+            objects_data = None
+    return chores_data, objects_data
 
 
 def get_upcoming_chores(grocy_url, grocy_api_key, days_ahead=14):
@@ -72,7 +209,7 @@ def get_upcoming_chores(grocy_url, grocy_api_key, days_ahead=14):
         days_ahead: Number of days to look ahead
         
     Returns:
-        list: List of upcoming chores with details
+        list: List of upcoming chores with details, or None if Grocy could not be read
     """
     logger.section("Fetching Grocy Chores")
     
@@ -91,208 +228,184 @@ def get_upcoming_chores(grocy_url, grocy_api_key, days_ahead=14):
             base_url = grocy_url
             
         logger.info(f"Base URL: {base_url}")
-            
-        # Try both endpoints
-        endpoints = [
-            f"{base_url}/api/chores",           # This endpoint gives the chore overview with next execution dates
-            f"{base_url}/api/objects/chores"    # This endpoint gives the chore base data
-        ]
         
         headers = {
             "GROCY-API-KEY": grocy_api_key,
             "Content-Type": "application/json"
         }
         
-        # Store chore details separately
-        chore_details = {}
+        # Set up dates
+        today = datetime.datetime.now().date()
+        future_date = today + datetime.timedelta(days=days_ahead)
         
-        # Get all upcoming chores
-        upcoming_chores = []
+        logger.info(f"Today: {today}, Looking ahead to: {future_date}")
         
-        for endpoint in endpoints:
-            logger.info(f"Fetching chores from: {endpoint}")
-            response = requests.get(endpoint, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                logger.info(f"Successfully retrieved data from {endpoint}")
-                chores_data = response.json()
-                logger.info(f"Found {len(chores_data)} items from {endpoint}")
-                
-                # Set up dates
-                today = datetime.datetime.now().date()
-                future_date = today + datetime.timedelta(days=days_ahead)
-                
-                logger.info(f"Today: {today}, Looking ahead to: {future_date}")
-                
-                # Process the data differently depending on the endpoint
-                if chores_data and isinstance(chores_data, list) and len(chores_data) > 0:
-                    if "chore_name" in chores_data[0]:
-                        # This is the /api/chores endpoint
-                        logger.info("Processing data from /api/chores endpoint")
-                        
-                        for chore in chores_data:
-                            if "next_estimated_execution_time" in chore and chore["next_estimated_execution_time"]:
-                                # Extract the date part (remove time)
-                                date_str = chore["next_estimated_execution_time"]
-                                # Handle different date formats
-                                if "T" in date_str:
-                                    chore_date_str = date_str.split("T")[0]
-                                else:
-                                    chore_date_str = date_str.split(" ")[0]
-                                    
-                                try:
-                                    chore_date = datetime.datetime.strptime(chore_date_str, "%Y-%m-%d").date()
-                                    
-                                    logger.debug(f"Chore: {chore.get('chore_name', 'Unknown')}, Due: {chore_date}")
-                                    
-                                    # Check if chore is within our date range
-                                    if today <= chore_date <= future_date:
-                                        logger.info(f"Found upcoming chore: {chore.get('chore_name', 'Unknown')}")
-                                        
-                                        # Format due date to be more readable
-                                        due_date = chore_date.strftime("%A, %b %d")
-                                        
-                                        # Extract assigned user
-                                        assigned_to = chore.get("next_execution_assigned_user", {})
-                                        assigned_name = assigned_to.get("display_name", "Unassigned") if isinstance(assigned_to, dict) else "Unassigned"
-                                        
-                                        # Add to upcoming chores list
-                                        upcoming_chores.append({
-                                            "name": chore.get("chore_name", "Unknown chore"),
-                                            "date": due_date,
-                                            "assigned_to": assigned_name,
-                                            "description": "",  # We'll get this from objects/chores if needed
-                                            "userfields": None,  # We'll get this from objects/chores if needed
-                                            "sections": {}      # We'll extract sections from the description
-                                        })
-                                except Exception as e:
-                                    logger.error(f"Error processing chore date for {chore.get('chore_name', 'Unknown')}: {str(e)}")
-                    
-                    elif "name" in chores_data[0]:
-                        # This is the /api/objects/chores endpoint
-                        logger.info("Processing data from /api/objects/chores endpoint")
-                        
-                        # Store all chore details for future reference
-                        for chore in chores_data:
-                            chore_name = chore.get("name", "")
-                            description = chore.get("description", "")
-                            
-                            # Extract sections from description
-                            sections = extract_sections(description)
-                            
-                            chore_details[chore_name] = {
-                                "full_description": description,
-                                "userfields": chore.get("userfields", None),
-                                "sections": sections
-                            }
-                            
-                            # Log the userfields for debugging
-                            logger.debug(f"Chore {chore_name} userfields: {chore.get('userfields')}")
-                            
-                            # We also use this to add details to chores we already found
-                            for upcoming in upcoming_chores:
-                                if upcoming["name"] == chore_name:
-                                    # For the message, use only the main section
-                                    main_desc = sections.get("main", "None")
-                                    upcoming["description"] = main_desc
-                                    upcoming["userfields"] = chore.get("userfields")
-                                    upcoming["sections"] = sections
-                                    logger.debug(f"Added details for chore {upcoming['name']}")
+        # Ask Grocy for the date window only, older servers get everything
+        with metrics.timer("grocy_fetch"):
+            fetched = _fetch_filtered(base_url, headers, today, future_date)
+            if fetched is None:
+                logger.warning("Grocy rejected query filters, fetching all chores")
+                fetched = _fetch_all(base_url, headers)
         
-        # Add details for chores if we didn't get them yet
-        if upcoming_chores:
-            for chore in upcoming_chores:
-                if (chore["description"] == "" or chore["userfields"] is None or not chore["sections"]) and chore["name"] in chore_details:
-                    details = chore_details[chore["name"]]
-                    
-                    if chore["description"] == "" and details["sections"].get("main"):
-                        chore["description"] = details["sections"].get("main", "None")
-                    
-                    if chore["userfields"] is None and "userfields" in details:
-                        chore["userfields"] = details["userfields"]
-                        
-                    if not chore["sections"] and "sections" in details:
-                        chore["sections"] = details["sections"]
-                        
-                    logger.debug(f"Added cached details for {chore['name']}")
+        chores_data, objects_data = fetched
+        if chores_data is None:
+            return None
+        
+        with metrics.timer("grocy_join"):
+            upcoming_chores = join_chores(chores_data, objects_data, today, future_date)
+        
+        # Keep newly parsed descriptions for the next run
+        description_cache.save()
                     
         logger.info(f"Found {len(upcoming_chores)} upcoming chores in the next {days_ahead} days")
         return upcoming_chores
         
     except Exception as e:
         logger.error(f"Error fetching chores: {str(e)}")
-        return []
+        return None
 
 
-def format_chores_message(chores):
+def _chore_location(userfields_data):
+    """
+    Get the work location from the chore userfields
+    
+    Args:
+        userfields_data: Userfields as a dictionary or JSON string
+        
+    Returns:
+        str: The location, or None if the chore has none
+    """
+    # Try to parse as JSON if it's a string
+    if isinstance(userfields_data, str) and userfields_data.strip():
+        try:
+            userfields_data = json.loads(userfields_data)
+        except ValueError:
+            # If it's not valid JSON, just use as is
+            pass
+    
+    if not isinstance(userfields_data, dict):
+        return None
+    
+    # Look for any field that might represent location
+    location_keys = ["Luogo_di_lavoro", "Luogodilavoro", "location", "Location"]
+    for key in location_keys:
+        if key in userfields_data and userfields_data[key]:
+            return userfields_data[key]
+    return None
+
+
+def format_chores_message(chores, days_ahead=14):
     """
     Format the chores list into a notification message
     
     Args:
         chores: List of chore dictionaries
+        days_ahead: Look-ahead window the chores were fetched for
         
     Returns:
         str: Formatted message
     """
+    templates = get_templates("grocy_chores")
     if not chores:
-        return "✅ No chores scheduled for the next 14 days."
+        return templates.render("empty", days=days_ahead)
     
-    message = "📋 Upcoming chores for the next 14 days:\n\n"
+    blocks = [templates.render("header", days=days_ahead)]
+    blocks.extend(format_chore(templates, chore) for chore in chores)
     
-    for chore in chores:
-        message += f"*Data:* {chore['date']}\n"
-        message += f"*Chore name:* {chore['name']}\n"
-        message += f"*Assigned to:* {chore['assigned_to']}\n"
-        
-        # Add location from userfields if available
-        if chore["userfields"]:
-            try:
-                # Try to parse as JSON if it's a string
-                userfields_data = chore["userfields"]
-                if isinstance(userfields_data, str) and userfields_data.strip():
-                    try:
-                        userfields_data = json.loads(userfields_data)
-                    except:
-                        # If it's not valid JSON, just use as is
-                        pass
-                
-                # Extract location field specifically
-                if isinstance(userfields_data, dict):
-                    # Look for any field that might represent location
-                    location_keys = ["Luogo_di_lavoro", "Luogodilavoro", "location", "Location"]
-                    location = None
-                    
-                    for key in location_keys:
-                        if key in userfields_data and userfields_data[key]:
-                            location = userfields_data[key]
-                            break
-                    
-                    if location:
-                        message += f"*Luogo di lavoro:* {location}\n"
-            except Exception as e:
-                logger.error(f"Error processing userfields: {str(e)}")
-        
-        # Add main description
-        if chore['description']:
-            message += f"*Description:* {chore['description']}\n"
-        
-        # Add references section if available and not "None"
-        references = chore["sections"].get("references", "None")
-        if references and references != "None":
-            message += f"*References:* {references}\n"
-        else:
-            message += "*References:* None\n"
+    # One chore per paragraph, so long lists are split between chores
+    return "\n\n".join(blocks)
+
+
+def format_chore(templates, chore):
+    """
+    Format the details of one chore
+    
+    Args:
+        templates: The grocy_chores template group
+        chore: Chore dictionary from get_upcoming_chores()
         
-        # Add equipment section if available and not "None"
-        equipment = chore["sections"].get("equipment", "None")
-        if equipment and equipment != "None":
-            message += f"*Equipment:*\n{equipment}\n"
-        else:
-            message += "*Equipment:* None\n"
+    Returns:
+        str: The chore's lines
+    """
+    lines = [
+        templates.render("date", date=chore['date']),
+        templates.render("name", name=chore['name']),
+        templates.render("assigned_to", assigned_to=chore['assigned_to']),
+    ]
+    
+    # Add location from userfields if available
+    if chore["userfields"]:
+        try:
+            location = _chore_location(chore["userfields"])
+            if location:
+                lines.append(templates.render("location", location=location))
+        except Exception as e:
+            logger.error(f"Error processing userfields: {str(e)}")
+    
+    # Add main description
+    if chore['description']:
+        lines.append(templates.render("description", description=chore['description']))
+    
+    # References and equipment are always listed, "None" when missing
+    sections = chore["sections"]
+    lines.append(templates.render("references", references=sections.references or "None"))
+    if sections.equipment and sections.equipment != "None":
+        lines.append(templates.render("equipment", equipment=sections.equipment))
+    else:
+        lines.append(templates.render("equipment_none"))
+    
+    # Add any other labelled sections
+    for label, content in sections.extra.items():
+        lines.append(templates.render("section", label=label, content=content))
+    
+    return "\n".join(lines)
+
+
+def format_changes_message(changes, days_ahead=14):
+    """
+    Format the chores that changed since the last notification
+    
+    Args:
+        changes: ChoreChanges from chore_digest.changes()
+        days_ahead: Look-ahead window the chores were fetched for
         
-        message += "\n"
+    Returns:
+        str: Formatted message
+    """
+    templates = get_templates("grocy_digest")
+    chore_templates = get_templates("grocy_chores")
+    
+    def due(entry):
+        return format_due_date(datetime.date.fromisoformat(entry["due"]))
+    
+    blocks = [templates.render("header", days=days_ahead)]
+    if changes.added:
+        # New chores get their full details, the others one line each
+        blocks.append(templates.render("added_header"))
+        blocks.extend(format_chore(chore_templates, chore) for chore in changes.added)
+    if changes.completed:
+        lines = [templates.render("completed_header")]
+        lines.extend(templates.render("completed", name=entry["name"], date=due(entry))
+                     for entry in changes.completed)
+        blocks.append("\n".join(lines))
+    if changes.rescheduled:
+        lines = [templates.render("rescheduled_header")]
+        lines.extend(templates.render("rescheduled", name=chore["name"], old_date=due(entry), date=chore["date"])
+                     for entry, chore in changes.rescheduled)
+        blocks.append("\n".join(lines))
+    if changes.reassigned:
+        lines = [templates.render("reassigned_header")]
+        lines.extend(templates.render("reassigned", name=chore["name"], old_assigned_to=entry["assigned_to"],
+                                      assigned_to=chore["assigned_to"])
+                     for entry, chore in changes.reassigned)
+        blocks.append("\n".join(lines))
+    if changes.removed:
+        lines = [templates.render("removed_header")]
+        lines.extend(templates.render("removed", name=entry["name"], date=due(entry))
+                     for entry in changes.removed)
+        blocks.append("\n".join(lines))
     
-    return message
+    return "\n\n".join(blocks)
 
 
 def notify_chores(grocy_url, grocy_api_key, hass_token, hass_url="http://localhost:8123", days_ahead=14):
@@ -318,17 +431,37 @@ def notify_chores(grocy_url, grocy_api_key, hass_token, hass_url="http://localho
     try:
         # Get upcoming chores
         chores = get_upcoming_chores(grocy_url, grocy_api_key, days_ahead)
+        if chores is None:
+            # Not an empty list, the snapshot is kept for the next run
+            logger.error("Could not fetch chores, skipping the notification")
+            return False
+        report(chores=len(chores))
         
-        # Format the message
-        message = format_chores_message(chores)
-        
-        # Send the notification
-        success = send_telegram(message, hass_token, markdown=True)
-        
-        if success:
-            logger.info(f"Sent notification with {len(chores)} chores")
-        else:
-            logger.error("Failed to send notification")
+        # Compare, send and save under one lock, so overlapping runs do not send the same changes
+        with chore_digest.lock():
+            changes = chore_digest.changes(chores)
+            if changes is not None and not changes:
+                logger.info("No chore changes since the last notification")
+                report(changes=0)
+                return True
+            
+            # Format the message, only the changed chores unless the full list is due
+            with metrics.timer("grocy_format"):
+                if changes is None:
+                    message = format_chores_message(chores, days_ahead)
+                else:
+                    report(changes=sum(changes.counts().values()))
+                    message = format_changes_message(changes, days_ahead)
+            
+            # Send the notification
+            success = send_telegram(message, hass_token, markdown=get_templates("grocy_chores").markdown,
+                                    hass_url=hass_url)
+            
+            if success:
+                chore_digest.save(chores, full=changes is None)
+                logger.info(f"Sent notification with {len(chores)} chores")
+            else:
+                logger.error("Failed to send notification")
         
         return success
         
@@ -336,7 +469,7 @@ def notify_chores(grocy_url, grocy_api_key, hass_token, hass_url="http://localho
         error_msg = f"⚠️ Error checking chores: {str(e)}"
         logger.error(error_msg)
         try:
-            send_telegram(error_msg, hass_token)
+            send_telegram(error_msg, hass_token, hass_url=hass_url)
         except:
             logger.error("Failed to send error notification")
         return False
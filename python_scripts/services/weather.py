@@ -3,30 +3,184 @@
 Weather service module for Home Assistant
 Extracts and processes weather data from OpenWeatherMap integration
 """
-import requests
+import atexit
 import datetime
 import sys
 import json
+import threading
+import time
 from common import get_logger, send_telegram, config_manager
+from common.metrics import metrics
+from common.storage import file_lock, load_json, save_json, state_path
+from common.templates import get_templates
+from common.transport import transport
+from services.weather_rules import ForecastColumns, evaluate_rules, forecast_days
 
 # Set up logger
 logger = get_logger("weather")
 
 
-def get_forecast_data(hass_url, hass_token, entity_id="weather.openweathermap"):
+# Defaults used when feature_flags.yaml has no forecast cache settings
+DEFAULT_CACHE_TTL = 30 * 60
+DEFAULT_MAX_STALE = 6 * 60 * 60
+DEFAULT_REVALIDATE_WAIT = 3.0
+DEFAULT_EXIT_WAIT = 10.0
+
+# Names of the first forecast days, later days use the weekday name
+DAY_LABELS = ["Today", "Tomorrow", "Day After Tomorrow"]
+
+
+class ForecastCache:
     """
-    Get forecast data from Home Assistant weather entity
+    Forecasts keyed by entity id and forecast type, shared between processes
+    
+    Entries younger than the TTL are served as is. Older entries, up to the
+    maximum staleness, are revalidated in the background: the caller waits a
+    few seconds for the fresh forecast and otherwise gets the stale one while
+    the refresh finishes and updates the cache for the next caller. A one-shot
+    run waits for the refresh before it exits.
+    """
+    
+    def __init__(self, path=None):
+        """
+        Initialize the cache
+        
+        Args:
+            path: JSON file the cache is kept in, defaults to the state directory
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._refreshing = {}
+        self._exit_wait_registered = False
+    
+    @staticmethod
+    def key(entity_id, forecast_type):
+        """Cache key for a forecast"""
+        return f"{entity_id}|{forecast_type}"
+    
+    def _file(self):
+        if self.path is None:
+            self.path = state_path("forecast_cache.json")
+        return self.path
+    
+    def get(self, key):
+        """
+        Get a cached forecast
+        
+        Returns:
+            tuple: (forecast_data, age in seconds), or (None, None) if not cached
+        """
+        with self._lock, file_lock(self._file()):
+            entry = load_json(self._file(), {}).get(key)
+        if not entry:
+            return None, None
+        return entry["data"], time.time() - entry["fetched"]
+    
+    def put(self, key, forecast_data):
+        """Store a forecast"""
+        # Other processes update the same file, so read, modify and write it under the file lock
+        with self._lock, file_lock(self._file()):
+            entries = load_json(self._file(), {})
+            entries[key] = {"fetched": time.time(), "data": forecast_data}
+            try:
+                save_json(self._file(), entries)
+            except Exception as e:
+                logger.error(f"Error saving forecast cache: {str(e)}")
+    
+    def fetch(self, key, loader, ttl, max_stale, revalidate_wait):
+        """
+        Get a forecast through the cache
+        
+        Args:
+            key: Cache key from key()
+            loader: Callable returning a fresh forecast, or None on failure
+            ttl: Seconds a forecast is served without revalidation
+            max_stale: Seconds a stale forecast may still be served
+            revalidate_wait: Seconds to wait for a revalidation before serving stale data
+            
+        Returns:
+            dict: Forecast data, or None if there is neither a usable cached nor a fresh one
+        """
+        cached, age = self.get(key)
+        if cached is not None and age < ttl:
+            logger.info(f"Using cached forecast for {key} ({age:.0f}s old)")
+            return cached
+        
+        if cached is None or age >= max_stale:
+            forecast_data = loader()
+            if forecast_data is not None:
+                self.put(key, forecast_data)
+            return forecast_data
+        
+        # Stale: refresh in the background and wait only a little for it
+        refresh = self._revalidate(key, loader)
+        refresh.join(revalidate_wait)
+        if not refresh.is_alive() and refresh.result is not None:
+            return refresh.result
+        
+        logger.warning(f"Serving stale forecast for {key} ({age:.0f}s old) while Home Assistant responds")
+        return cached
+    
+    def _revalidate(self, key, loader):
+        """Start a background refresh for key, or join the one already running"""
+        with self._lock:
+            refresh = self._refreshing.get(key)
+            if refresh is not None and refresh.is_alive():
+                return refresh
+            
+            def run():
+                try:
+                    refresh.result = loader()
+                    if refresh.result is not None:
+                        self.put(key, refresh.result)
+                finally:
+                    with self._lock:
+                        self._refreshing.pop(key, None)
+            
+            refresh = threading.Thread(target=run, name=f"forecast-refresh-{key}", daemon=True)
+            refresh.result = None
+            self._refreshing[key] = refresh
+            refresh.start()
+            if not self._exit_wait_registered:
+                atexit.register(self.wait)
+                self._exit_wait_registered = True
+            return refresh
+    
+    def wait(self, timeout=None):
+        """
+        Wait for the running refreshes, so they still update the cache before the process exits
+        
+        Args:
+            timeout: Seconds to wait at most, defaults to weather.forecast_exit_wait
+        """
+        if timeout is None:
+            timeout = config_manager.get_config_value('weather.forecast_exit_wait', DEFAULT_EXIT_WAIT)
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            refreshes = list(self._refreshing.values())
+        for refresh in refreshes:
+            refresh.join(max(0.0, deadline - time.monotonic()))
+            if refresh.is_alive():
+                logger.warning(f"Forecast refresh {refresh.name} did not finish before exit")
+
+
+# Create a singleton instance shared by every caller in the process
+forecast_cache = ForecastCache()
+
+
+def fetch_forecast(hass_url, hass_token, entity_id="weather.openweathermap", forecast_type="daily"):
+    """
+    Call the get_forecasts service, bypassing the cache
     
     Args:
         hass_url: Home Assistant URL
         hass_token: Home Assistant long-lived access token
         entity_id: Weather entity ID
+        forecast_type: "daily", "hourly" or "twice_daily"
         
     Returns:
         dict: Weather forecast data or None on failure
     """
-    logger.section("Getting Weather Forecast")
-    
     try:
         # Call the get_forecasts service WITH return_response parameter
         url = f"{hass_url}/api/services/weather/get_forecasts?return_response"
@@ -36,12 +190,14 @@ def get_forecast_data(hass_url, hass_token, entity_id="weather.openweathermap"):
         }
         
         data = {
-            "type": "daily",
+            "type": forecast_type,
             "entity_id": entity_id
         }
         
         logger.info(f"Fetching forecast data for {entity_id}")
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        # Reading a forecast has no side effects, so it is safe to retry
+        with metrics.timer("forecast_fetch"):
+            response = transport.post(url, headers=headers, json=data, idempotent=True)
         
         if response.status_code == 200:
             response_data = response.json()
@@ -77,6 +233,60 @@ def get_forecast_data(hass_url, hass_token, entity_id="weather.openweathermap"):
         return None
 
 
+def get_forecast_data(hass_url, hass_token, entity_id="weather.openweathermap", forecast_type="daily"):
+    """
+    Get forecast data from Home Assistant weather entity
+    
+    Forecasts are cached for weather.forecast_cache_ttl seconds and shared
+    between processes, see ForecastCache.
+    
+    Args:
+        hass_url: Home Assistant URL
+        hass_token: Home Assistant long-lived access token
+        entity_id: Weather entity ID
+        forecast_type: "daily", "hourly" or "twice_daily"
+        
+    Returns:
+        dict: Weather forecast data or None on failure
+    """
+    logger.section("Getting Weather Forecast")
+    
+    def loader():
+        return fetch_forecast(hass_url, hass_token, entity_id, forecast_type)
+    
+    ttl = config_manager.get_config_value('weather.forecast_cache_ttl', DEFAULT_CACHE_TTL)
+    if not ttl:
+        return loader()
+    
+    try:
+        return forecast_cache.fetch(
+            ForecastCache.key(entity_id, forecast_type),
+            loader,
+            ttl=ttl,
+            max_stale=config_manager.get_config_value('weather.forecast_max_stale', DEFAULT_MAX_STALE),
+            revalidate_wait=config_manager.get_config_value('weather.forecast_revalidate_wait', DEFAULT_REVALIDATE_WAIT),
+        )
+    except Exception as e:
+        logger.error(f"Exception getting weather forecast: {str(e)}")
+        return None
+
+
+def day_label(today, offset):
+    """
+    Name of a forecast day relative to today
+    
+    Args:
+        today: Current datetime
+        offset: Days from today
+        
+    Returns:
+        str: "Today", "Tomorrow", "Day After Tomorrow" or the weekday name
+    """
+    if offset < len(DAY_LABELS):
+        return DAY_LABELS[offset]
+    return (today + datetime.timedelta(days=offset)).strftime("%A")
+
+
 def send_temperature_forecast(hass_url, hass_token, forecast_data, entity_id="weather.openweathermap"):
     """
     Process and send a temperature forecast notification
@@ -95,30 +305,22 @@ def send_temperature_forecast(hass_url, hass_token, forecast_data, entity_id="we
         return False
     
     try:
-        # Extract data for the next 3 days
-        forecast = forecast_data[entity_id]["forecast"]
-        day_1 = forecast[0]
-        day_2 = forecast[1]
-        day_3 = forecast[2]
-        
-        # Extract temperatures
-        today_high = round(day_1.get("temperature", 0), 1)
-        today_low = round(day_1.get("templow", 0), 1)
-        tomorrow_high = round(day_2.get("temperature", 0), 1)
-        tomorrow_low = round(day_2.get("templow", 0), 1)
-        day_after_tomorrow_high = round(day_3.get("temperature", 0), 1)
-        day_after_tomorrow_low = round(day_3.get("templow", 0), 1)
+        # Low temperatures for the configured number of days
+        columns = ForecastColumns(forecast_data[entity_id]["forecast"], forecast_days())
+        lows = columns.column("templow")
         
         # Format the message
-        today_date = datetime.datetime.now().strftime('%Y-%m-%d')
-        message = f"{today_date}\n"
-        message += "3 Day ❄️ Low Temp Forecast\n"
-        message += f"Today: {today_low}°C\n"
-        message += f"Tomorrow: {tomorrow_low}°C\n"
-        message += f"Day After Tomorrow: {day_after_tomorrow_low}°C"
+        templates = get_templates("weather_forecast")
+        today = datetime.datetime.now()
+        lines = [templates.render("header", date=today.strftime('%Y-%m-%d'), days=columns.days)]
+        lines.extend(
+            templates.render("day", label=day_label(today, offset), low=round(low, 1))
+            for offset, low in enumerate(lows)
+        )
+        message = "\n".join(lines)
         
         # Send the notification
-        success = send_telegram(message, hass_token)
+        success = send_telegram(message, hass_token, markdown=templates.markdown, hass_url=hass_url)
         
         if success:
             logger.info("Sent temperature forecast notification")
@@ -148,47 +350,12 @@ def send_extreme_weather_alert(hass_url, hass_token, forecast_data, entity_id="w
         return False
     
     try:
-        # Extract data for the next 3 days
-        forecast = forecast_data[entity_id]["forecast"]
-        day_1 = forecast[0]
-        day_2 = forecast[1]
-        day_3 = forecast[2]
-        
-        # Check for rain
-        rain = (
-            (day_1.get("precipitation", 0) > 0) or
-            (day_2.get("precipitation", 0) > 0) or
-            (day_3.get("precipitation", 0) > 0)
-        )
-        
-        # Check for wind
-        wind = (
-            (day_1.get("wind_speed", 0) > 10) or
-            (day_2.get("wind_speed", 0) > 10) or
-            (day_3.get("wind_speed", 0) > 10)
-        )
-        
-        # Check for snow
-        snow = (
-            (day_1.get("condition", "") == "snowy") or
-            (day_2.get("condition", "") == "snowy") or
-            (day_3.get("condition", "") == "snowy")
-        )
-        
-        # Construct message
-        if rain or wind or snow:
-            message = ""
-            if rain:
-                message += "☔ There will be rain in the next 3 days.\n"
-            if wind:
-                message += "🍃 There will be notable wind in the next 3 days.\n"
-            if snow:
-                message += "❄️ Snow is expected in the next 3 days.\n"
-        else:
-            message = "🌤️ Weather is normal."
+        # One combined message for the rules in weather.alert_rules
+        with metrics.timer("weather_rules"):
+            message = evaluate_rules(forecast_data[entity_id]["forecast"])
         
         # Send the notification
-        success = send_telegram(message, hass_token)
+        success = send_telegram(message, hass_token, hass_url=hass_url)
         
         if success:
             logger.info("Sent extreme weather alert notification")
@@ -225,7 +392,7 @@ def process_weather_data(hass_url, hass_token, entity_id="weather.openweathermap
         if not forecast_data:
             error_msg = "⚠️ Failed to fetch sufficient daily forecast data from OpenWeatherMap."
             logger.error(error_msg)
-            send_telegram(error_msg, hass_token)
+            send_telegram(error_msg, hass_token, hass_url=hass_url)
             return False
         
         # Process temperature forecast
@@ -239,7 +406,7 @@ def process_weather_data(hass_url, hass_token, entity_id="weather.openweathermap
     except Exception as e:
         error_msg = f"⚠️ Error processing weather data: {str(e)}"
         logger.error(error_msg)
-        send_telegram(error_msg, hass_token)
+        send_telegram(error_msg, hass_token, hass_url=hass_url)
         return False
 
 
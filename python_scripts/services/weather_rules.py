@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Weather alert rules for Home Assistant
+Evaluates the alert rules from feature_flags.yaml over an N-day forecast
+held in columns, one array per forecast field
+"""
+import operator
+from array import array
+from itertools import repeat
+
+from common import get_logger, config_manager
+from common.executor import report
+
+# Set up logger
+logger = get_logger("weather_rules")
+
+DEFAULT_FORECAST_DAYS = 3
+
+# Rules used when feature_flags.yaml has no weather.alert_rules
+DEFAULT_RULES = [
+    {"name": "rain", "field": "precipitation", "op": ">", "value": 0,
+     "message": "☔ There will be rain in the next {days} days."},
+    {"name": "wind", "field": "wind_speed", "op": ">", "value": 10,
+     "message": "🍃 There will be notable wind in the next {days} days."},
+    {"name": "snow", "field": "condition", "op": "==", "value": "snowy",
+     "message": "❄️ Snow is expected in the next {days} days."},
+]
+DEFAULT_NORMAL_MESSAGE = "🌤️ Weather is normal."
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# Forecast fields rules can look at, text fields are compared as strings
+TEXT_FIELDS = {"condition", "datetime"}
+NUMERIC_FIELDS = {
+    "apparent_temperature",
+    "cloud_coverage",
+    "dew_point",
+    "humidity",
+    "precipitation",
+    "precipitation_probability",
+    "pressure",
+    "temperature",
+    "templow",
+    "uv_index",
+    "wind_bearing",
+    "wind_gust_speed",
+    "wind_speed",
+}
+
+
+class ForecastColumns:
+    """Forecast days stored column-wise, numeric fields as arrays of doubles"""
+
+    def __init__(self, forecast, days):
+        """
+        Initialize the columns
+
+        Args:
+            forecast: List of forecast entries from get_forecasts
+            days: Number of days to keep
+        """
+        self.rows = forecast[:days]
+        self.days = len(self.rows)
+        self._columns = {}
+
+    def column(self, field):
+        """Get the values of one field for every day, built on first use"""
+        values = self._columns.get(field)
+        if values is None:
+            if field in TEXT_FIELDS:
+                values = [row.get(field) or "" for row in self.rows]
+            else:
+                # Missing values count as 0, as the old day-by-day checks did
+                values = array("d", (row.get(field) or 0 for row in self.rows))
+            self._columns[field] = values
+        return values
+
+
+class WeatherRule:
+    """A single compiled alert rule"""
+
+    def __init__(self, name, field, op, value, message, match="any"):
+        """
+        Initialize the rule
+
+        Args:
+            name: Rule name, used in logs
+            field: Forecast field the rule looks at
+            op: Comparison operator, one of OPERATORS
+            value: Threshold compared against each day
+            message: Message line, may use {days}, {threshold}, {max} and {min}
+            match: "any" to fire if one day matches, "all" if every day must
+        """
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator {op!r} in weather rule {name}")
+        if match not in ("any", "all"):
+            raise ValueError(f"Unknown match {match!r} in weather rule {name}")
+        if field not in TEXT_FIELDS and field not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown forecast field {field!r} in weather rule {name}")
+        self.name = name
+        self.field = field
+        self.compare = OPERATORS[op]
+        self.value = str(value) if field in TEXT_FIELDS else float(value)
+        self.message = message
+        self.match = any if match == "any" else all
+
+    def evaluate(self, columns):
+        """
+        Evaluate the rule over the forecast
+
+        Returns:
+            str: The message line if the rule fires, otherwise None
+        """
+        values = columns.column(self.field)
+        if not self.match(map(self.compare, values, repeat(self.value))):
+            return None
+        return self.message.format(
+            days=columns.days,
+            threshold=self.value,
+            max=max(values) if values else None,
+            min=min(values) if values else None,
+        )
+
+
+# Rules compiled from the config they were built from, rebuilt on config reload
+_compiled = (None, [])
+
+
+def get_rules():
+    """
+    Get the compiled alert rules from weather.alert_rules
+
+    Returns:
+        list: WeatherRule objects in configuration order
+    """
+    global _compiled
+    rules_config = config_manager.get_config_value('weather.alert_rules', None) or DEFAULT_RULES
+    if _compiled[0] is not rules_config:
+        rules = []
+        for rule in rules_config:
+            try:
+                rules.append(WeatherRule(
+                    name=rule.get("name", rule.get("field")),
+                    field=rule["field"],
+                    op=rule.get("op", ">"),
+                    value=rule.get("value", 0),
+                    message=rule["message"],
+                    match=rule.get("match", "any"),
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Skipping invalid weather rule {rule}: {str(e)}")
+        _compiled = (rules_config, rules)
+    return _compiled[1]
+
+
+def forecast_days():
+    """Number of forecast days the rules and the temperature forecast look at"""
+    return config_manager.get_config_value('weather.forecast_days', DEFAULT_FORECAST_DAYS)
+
+
+def evaluate_rules(forecast, days=None):
+    """
+    Evaluate every alert rule over the forecast
+
+    Args:
+        forecast: List of forecast entries from get_forecasts
+        days: Forecast horizon, defaults to weather.forecast_days
+
+    Returns:
+        str: One combined message for the rules that fired, or the normal weather message
+    """
+    columns = ForecastColumns(forecast, days or forecast_days())
+    lines = []
+    for rule in get_rules():
+        try:
+            line = rule.evaluate(columns)
+        except (TypeError, ValueError) as e:
+            # e.g. a text value in a numeric field, the other rules still run
+            logger.error(f"Error evaluating weather rule {rule.name}: {str(e)}")
+            continue
+        if line is not None:
+            logger.info(f"Weather rule {rule.name} fired")
+            lines.append(line)
+    report(alerts=len(lines), forecast_days=columns.days)
+
+    if not lines:
+        return config_manager.get_config_value('weather.normal_message', DEFAULT_NORMAL_MESSAGE)
+    return "\n".join(lines) + "\n"
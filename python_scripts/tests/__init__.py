@@ -0,0 +1,3 @@
+"""
+Tests for Home Assistant automation scripts
+"""
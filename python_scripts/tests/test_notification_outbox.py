@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the notification outbox dedupe
+
+Usage: python3 -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# Keep state, logs and flags out of /config
+_tmp = tempfile.mkdtemp(prefix="outbox-test-")
+os.environ.setdefault("AUTOMATION_STATE_DIR", _tmp)
+os.environ.setdefault("AUTOMATION_LOG_DIR", _tmp)
+os.environ.setdefault("AUTOMATION_FEATURE_FLAGS", os.path.join(_tmp, "feature_flags.yaml"))
+
+# Add parent directory to path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from common.notification import NotificationOutbox
+
+CHAT = "kermode"
+HASS_URL = "http://localhost:8123"
+
+
+class NotificationOutboxDedupeTest(unittest.TestCase):
+    """Only a repeat of the last message for a chat is dropped"""
+
+    def setUp(self):
+        self.sent = []
+        self.db_dir = tempfile.mkdtemp(prefix="outbox-", dir=_tmp)
+        self.outbox = NotificationOutbox(self._sender, db_path=os.path.join(self.db_dir, "outbox.db"))
+        # Deliver only through drain() so the test does not race the background thread
+        self.outbox._start = lambda: None
+
+    def _sender(self, hass_url, hass_token, chat, message, markdown):
+        self.sent.append(message)
+        return True
+
+    def _enqueue(self, message):
+        self.assertTrue(self.outbox.enqueue(CHAT, message, False, HASS_URL, "token"))
+
+    def _delivered(self):
+        self.assertTrue(self.outbox.drain(timeout=5))
+        return [part for message in self.sent for part in message.split("\n\n")]
+
+    def test_state_changes_are_all_delivered(self):
+        for message in ("Now ON", "Now OFF", "Now ON"):
+            self._enqueue(message)
+        self.assertEqual(self._delivered(), ["Now ON", "Now OFF", "Now ON"])
+
+    def test_state_changes_after_delivery_are_delivered(self):
+        self._enqueue("Now ON")
+        self._delivered()
+        self._enqueue("Now OFF")
+        self._enqueue("Now ON")
+        self.assertEqual(self._delivered(), ["Now ON", "Now OFF", "Now ON"])
+
+    def test_repeat_of_last_message_is_dropped(self):
+        self._enqueue("Now ON")
+        self._enqueue("Now ON")
+        self.assertEqual(self._delivered(), ["Now ON"])
+
+    def test_repeat_in_another_chat_is_delivered(self):
+        self._enqueue("Now ON")
+        self.assertTrue(self.outbox.enqueue("other", "Now ON", False, HASS_URL, "token"))
+        self.assertEqual(self._delivered(), ["Now ON", "Now ON"])
+
+
+if __name__ == "__main__":
+    unittest.main()